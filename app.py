@@ -1,14 +1,32 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, g, abort
 from functools import wraps
 import database as db
 import auth
+import images
+import instrumentation
+import metrics
+from photo_worker import PhotoWorkerPool
+from config import QUERY_LOG_CONFIG, METRICS_CONFIG, PHOTO_WORKER_CONFIG, UPLOADS_CONFIG
 import json
+import mimetypes
 import os
-from werkzeug.utils import secure_filename
+from werkzeug.utils import secure_filename, send_from_directory
+from werkzeug.security import safe_join
 import secrets
 import string
-from itertools import groupby
+import csv
+import io
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+from datetime import datetime, date, timedelta
+
+try:
+    from openpyxl import Workbook # requirements.txt; só é necessário para exportar em Excel
+except ImportError:
+    Workbook = None
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'uma-chave-secreta-muito-dificil-de-adivinhar'
@@ -21,9 +39,137 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# O código depende do esquema mais recente: a aplicação não sobe com migrações pendentes
+# (aplicadas pelo operador com 'python manutencao.py migrar')
+db.check_schema()
+
+# Threads que processam as fotos fora da requisição (ver photo_worker.py). Sem o Pillow, ou com
+# workers = 0, não há o que processar em segundo plano, mas a varredura (que também apaga as
+# fotos sem referências) roda sempre.
+photo_worker = PhotoWorkerPool(UPLOAD_FOLDER, **PHOTO_WORKER_CONFIG)
+photo_worker.start(process=images.enabled())
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_uploaded_photo(file, component_id, rt_id):
+    """
+    Grava uma foto enviada e retorna o nome com que ela fica em FotosResposta (None se o arquivo
+    não é permitido). O nome vem do hash do conteúdo: um arquivo já enviado antes não é gravado
+    de novo. O arquivo é gravado como chegou e a redução e as miniaturas (images.py) ficam para
+    as threads de photo_worker; até lá, /uploads entrega o arquivo recebido.
+    """
+    labels = (('endpoint', request.endpoint),)
+    if not file: return None
+    if not allowed_file(file.filename):
+        metrics.registry.inc('checklist_upload_rejected_total', labels)
+        return None
+    filename = secure_filename(file.filename)
+    folder = app.config['UPLOAD_FOLDER']
+    received = images.received_name(f"{session['user_id']}_{component_id}_{rt_id}_{secrets.token_hex(4)}_{filename}")
+    digest, size = images.save_received(file, os.path.join(folder, received))
+    stored_name = images.stored_name(digest, filename)
+    metrics.registry.inc('checklist_upload_files_total', labels)
+    metrics.registry.inc('checklist_upload_bytes_total', labels, size)
+    stored_path = os.path.join(folder, stored_name)
+    if os.path.exists(stored_path) and db.touch_photo_file(stored_name) and os.path.exists(stored_path):
+        # O mesmo conteúdo já está gravado: a nova referência aponta para o arquivo existente,
+        # agora protegido da varredura das fotos sem referências (que pode tê-lo apagado no meio)
+        os.remove(os.path.join(folder, received))
+        metrics.registry.inc('checklist_upload_deduplicated_total', labels)
+        return stored_name
+    if not images.enabled():
+        return images.store_received(folder, received, stored_name)  # sem o Pillow a foto fica como chegou
+    if not (photo_worker.workers and photo_worker.enqueue(stored_name, received)):
+        # Sem threads de fundo (ou sem como registrar o job), processa aqui mesmo
+        stored_name = images.process_upload(folder, received, stored_name)
+    return stored_name
+
+# --- MÉTRICAS (/metrics) ---
+metrics.registry.describe('checklist_http_request_duration_seconds', 'histogram', "Tempo de resposta das requisições, por rota.")
+metrics.registry.describe('checklist_http_requests_total', 'counter', "Requisições atendidas, por rota e código HTTP.")
+metrics.registry.describe('checklist_db_queries_total', 'counter', "Consultas ao banco feitas pelas requisições, por rota.")
+metrics.registry.describe('checklist_db_query_seconds_total', 'counter', "Tempo gasto no banco pelas requisições, por rota.")
+metrics.registry.describe('checklist_upload_files_total', 'counter', "Fotos gravadas, por rota.")
+metrics.registry.describe('checklist_upload_bytes_total', 'counter', "Bytes de fotos gravados, por rota.")
+metrics.registry.describe('checklist_upload_deduplicated_total', 'counter', "Fotos enviadas com o conteúdo de uma foto já gravada (não gravadas de novo), por rota.")
+metrics.registry.describe('checklist_upload_rejected_total', 'counter', "Arquivos recusados por extensão não permitida, por rota.")
+metrics.registry.describe('checklist_db_connections_total', 'counter', "Conexões pedidas a get_connection, por resultado (nova, reaproveitada, falha, tempo esgotado).")
+metrics.registry.describe('checklist_db_connections', 'gauge', "Conexões do pool, por estado.")
+metrics.registry.describe('checklist_db_pool_waits_total', 'counter', "Vezes em que um pedido esperou por uma conexão livre.")
+metrics.registry.describe('checklist_db_health_check_failures_total', 'counter', "Conexões descartadas por falhar no teste de saúde.")
+metrics.registry.describe('checklist_cache_requests_total', 'counter', "Leituras dos caches em memória, por cache e resultado.")
+metrics.registry.describe('checklist_cache_hit_ratio', 'gauge', "Fração das leituras atendidas pelo cache.")
+metrics.registry.describe('checklist_cache_entries', 'gauge', "Entradas guardadas no cache.")
+metrics.registry.describe('checklist_photo_jobs_total', 'counter', "Jobs de processamento de fotos terminados neste processo, por resultado.")
+metrics.registry.describe('checklist_photo_jobs_queued', 'gauge', "Jobs de fotos na fila em memória das threads de processamento.")
+metrics.registry.describe('checklist_photo_jobs_running', 'gauge', "Jobs de fotos sendo processados agora.")
+metrics.registry.describe('checklist_photo_files_deleted_total', 'counter', "Arquivos de fotos apagados por terem ficado sem referências.")
+
+def collect_db_metrics():
+    # Valores já contados pelo pool e pelo cache; lidos só quando /metrics é consultado
+    pool = db.get_pool_stats()
+    samples = [('checklist_db_connections_total', (('result', result),), pool[key])
+               for result, key in [('opened', 'created'), ('reused', 'reused'), ('failed', 'failed'), ('timeout', 'timeouts')]]
+    samples += [('checklist_db_connections', (('state', state),), pool[state]) for state in ['open', 'idle', 'in_use', 'max_size']]
+    samples += [('checklist_db_pool_waits_total', (), pool['waits']),
+                ('checklist_db_health_check_failures_total', (), pool['health_check_failures'])]
+    for cache_name, stats in [('checklists', db.get_checklist_cache_stats()), ('report_filters', db.get_report_filters_cache_stats())]:
+        labels = (('cache', cache_name),)
+        samples += [('checklist_cache_requests_total', labels + (('result', 'hit'),), stats['hits']),
+                    ('checklist_cache_requests_total', labels + (('result', 'miss'),), stats['misses']),
+                    ('checklist_cache_hit_ratio', labels, stats['hit_ratio']),
+                    ('checklist_cache_entries', labels, stats['size'])]
+    photos = photo_worker.stats()
+    samples += [('checklist_photo_jobs_total', (('result', result),), photos[key])
+                for result, key in [('done', 'processed'), ('retried', 'retried'), ('failed', 'failed')]]
+    samples += [('checklist_photo_jobs_queued', (), photos['queued']), ('checklist_photo_jobs_running', (), photos['busy']),
+                ('checklist_photo_files_deleted_total', (), photos['deleted_files'])]
+    return samples
+
+metrics.registry.register_collector(collect_db_metrics)
+
+def metrics_allowed():
+    """O coletor, pelo token de METRICS_CONFIG (e, se houver a lista, pelo IP), ou um usuário logado."""
+    token = METRICS_CONFIG.get('token')
+    if token and secrets.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+        allowed_ips = METRICS_CONFIG.get('allowed_ips')
+        return not allowed_ips or request.remote_addr in allowed_ips
+    return 'user_id' in session
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not METRICS_CONFIG.get('enabled') or not metrics_allowed():
+        abort(404)
+    return Response(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- INSTRUMENTAÇÃO DAS REQUISIÇÕES ---
+@app.before_request
+def start_request_stats():
+    g.request_started = time.perf_counter()
+    instrumentation.start_request(request.endpoint, f"{request.method} {request.path}")
+
+@app.after_request
+def finish_request_stats(response):
+    stats = instrumentation.finish_request()
+    endpoint = request.endpoint or 'nao_encontrado'
+    labels = (('endpoint', endpoint), ('method', request.method))
+    if 'request_started' in g:
+        metrics.registry.observe('checklist_http_request_duration_seconds', labels, time.perf_counter() - g.request_started)
+    metrics.registry.inc('checklist_http_requests_total', labels + (('status', str(response.status_code)),))
+    if stats is not None:
+        metrics.registry.inc('checklist_db_queries_total', (('endpoint', endpoint),), stats.queries)
+        metrics.registry.inc('checklist_db_query_seconds_total', (('endpoint', endpoint),), stats.seconds)
+        if QUERY_LOG_CONFIG.get('request_header'):
+            response.headers['Server-Timing'] = f'db;dur={stats.milliseconds:.1f};desc="{stats.queries} consultas"'
+            response.headers['X-DB-Queries'] = str(stats.queries)
+    return response
+
+@app.teardown_request
+def clear_query_stats(exc):
+    # Se a requisição falhou antes do after_request, não deixa a contagem presa à thread
+    instrumentation.finish_request()
+
 # --- DECORATORS ---
 def login_required(f):
     @wraps(f)
@@ -48,47 +194,18 @@ def role_required(role):
 
 # --- FUNÇÕES AUXILIARES ---
 
-# Em app.py, substitua a função calculate_audit_score
-
-def calculate_audit_score(submission_items):
+def rescore_response_type_in_background(type_id):
     """
-    Calcula o placar de conformidade, separando itens aplicáveis de não aplicáveis.
+    Recalcula, numa thread, o placar das submissões que usam o tipo de resposta: podem ser
+    quase todas, então vai em lotes curtos fora da requisição. Se o processo cair no meio,
+    'python manutencao.py backfill-placar --todas' conclui o recálculo.
     """
-    # Define quais respostas contam para o placar e quais são neutras
-    auditable_answers = ['Conforme', 'Não Conforme', 'Bom', 'Ruim']
-    neutral_answers = ['Não se Aplica', 'N/A']
-    
-    auditable_items = []
-    not_applicable_items = 0
-
-    for item in submission_items:
-        answer_value = item.get('valor')
-        # Se a resposta for de auditoria (Conforme/Não Conforme), adiciona à lista de cálculo
-        if answer_value in auditable_answers and item.get('is_conforme') is not None:
-            auditable_items.append(item)
-        # Se a resposta for neutra, apenas incrementa o contador
-        elif answer_value in neutral_answers:
-            not_applicable_items += 1
-
-    total_auditable = len(auditable_items)
-    
-    # Se não houver itens de auditoria, mas houver itens "N/A", retorna um placar zerado
-    if total_auditable == 0:
-        if not_applicable_items > 0:
-             return {'total': 0, 'compliant': 0, 'flagged': 0, 'percentage': 100, 'not_applicable': not_applicable_items}
-        else:
-            return None # Não há nada para pontuar
-
-    compliant_items = sum(1 for item in auditable_items if item.get('is_conforme'))
-    
-    score = {
-        'total': total_auditable,
-        'compliant': compliant_items,
-        'flagged': total_auditable - compliant_items,
-        'percentage': (compliant_items / total_auditable) * 100 if total_auditable > 0 else 0,
-        'not_applicable': not_applicable_items # Nova informação
-    }
-    return score
+    def run():
+        try:
+            for _ in db.rescore_submissions_with_type(type_id): pass
+        except Exception as e:
+            print(f"Erro ao recalcular o placar do tipo de resposta {type_id}: {e}")
+    threading.Thread(target=run, name=f"placar-tipo-{type_id}", daemon=True).start()
 
 def convert_checklist_to_dict(checklist_data):
     if not checklist_data: return None
@@ -141,15 +258,13 @@ def dashboard():
                                collaborators=db.get_collaborators_for_coordinator(user_id), 
                                sectors=db.get_sectors_for_coordinator(user_id))
     elif role == 'COLABORADOR':
-        # NOVA LÓGICA DE PAGINAÇÃO
+        # NOVA LÓGICA DE PAGINAÇÃO (feita no banco: só a página atual é carregada)
         page = request.args.get('page', 1, type=int)
+        after_id = request.args.get('after', type=int) # Paginação por chave ao avançar
         per_page = 5 # Mostra apenas 5 submissões/rascunhos por página
         
-        all_submitted = db.get_submissions_for_collaborator(user_id)
-        total_pages = (len(all_submitted) + per_page - 1) // per_page
-        start = (page - 1) * per_page
-        end = start + per_page
-        submitted_paginated = all_submitted[start:end]
+        submitted_paginated, total = db.get_submissions_for_collaborator_page(user_id, page, per_page, after_id)
+        total_pages = (total + per_page - 1) // per_page
         
         return render_template('colaborador_dashboard.html', 
                                checklists=db.get_checklists_for_collaborator(user_id), 
@@ -159,10 +274,66 @@ def dashboard():
         flash("Papel de usuário não reconhecido.", "danger")
         return redirect(url_for('login'))
 
+def send_upload(relative, immutable=True):
+    """
+    Entrega um arquivo da pasta de uploads, com ETag e Range. immutable=True (foto ou miniatura
+    gravada, cujo conteúdo nunca muda) deixa o navegador guardá-la por UPLOADS_CONFIG['max_age'];
+    as respostas provisórias (o arquivo como chegou, a foto no lugar da miniatura) são revalidadas.
+    Com UPLOADS_CONFIG['offload'], quem lê o arquivo é o proxy da frente (nginx ou Apache).
+    """
+    folder = app.config['UPLOAD_FOLDER']
+    offload = UPLOADS_CONFIG.get('offload')
+    if offload == 'x-accel-redirect':
+        path = safe_join(folder, relative)
+        if path is None or not os.path.isfile(path): abort(404)
+        # O nginx cuida de ETag, Range e 304; daqui vão o tipo e o cache
+        response = app.response_class()
+        response.headers['X-Accel-Redirect'] = UPLOADS_CONFIG.get('accel_prefix', '/_uploads/').rstrip('/') + '/' + quote(relative)
+        response.mimetype = mimetypes.guess_type(relative)[0] or 'application/octet-stream'
+    else:
+        response = send_from_directory(folder, relative, request.environ, response_class=app.response_class,
+                                       use_x_sendfile=offload == 'x-sendfile', conditional=True, etag=True, max_age=0)
+    # As fotos só saem com login: caches compartilhados (proxies) não devem guardá-las
+    response.cache_control.public = False
+    response.cache_control.private = True
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = UPLOADS_CONFIG.get('max_age', 365 * 24 * 3600)
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = None
+    response.headers.pop('Expires', None)  # o Cache-Control manda; o Expires do send_file seria o horário atual
+    return response
+
+def serve_photo(filename, immutable=True):
+    folder = app.config['UPLOAD_FOLDER']
+    if not os.path.exists(os.path.join(folder, filename)) and safe_join(folder, filename):
+        # Foto ainda na fila de processamento (ou que falhou): entrega o arquivo como chegou
+        job = db.get_photo_job(filename)
+        if job: return send_upload(job.CaminhoRecebido, immutable=False)
+    return send_upload(filename, immutable)
+
 @app.route('/uploads/<path:filename>')
 @login_required
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return serve_photo(filename)
+
+@app.route('/photo_variants/<variant>/<path:filename>')
+@login_required
+def photo_variant(variant, filename):
+    if variant not in images.VARIANTS or safe_join(app.config['UPLOAD_FOLDER'], filename) is None:
+        abort(404)
+    # Fotos antigas ganham a miniatura no primeiro acesso; sem o Pillow vai a foto original
+    variant_path = images.ensure_variant(app.config['UPLOAD_FOLDER'], filename, variant)
+    if not variant_path: return serve_photo(filename, immutable=False)
+    return send_upload(variant_path)
+
+@app.template_global()
+def photo_url(photo, variant=None):
+    """URL de uma foto enviada; com variant ('mini', 'medio'...), a da miniatura de tamanho fixo."""
+    if variant: return url_for('photo_variant', variant=variant, filename=photo)
+    return url_for('uploaded_file', filename=photo)
 
 # --- ROTAS DE GERENCIAMENTO (COORDENADOR/GESTOR) ---
 @app.route('/create_user', methods=['GET', 'POST'])
@@ -277,10 +448,8 @@ def manage_checklists():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    all_checklists = db.get_checklists_for_coordinator(session['user_id'])
-    total_pages = (len(all_checklists) + per_page - 1) // per_page if all_checklists else 1
-    start = (page - 1) * per_page
-    checklists_paginated = all_checklists[start:start + per_page]
+    checklists_paginated, total = db.get_checklists_for_coordinator_page(session['user_id'], page, per_page)
+    total_pages = (total + per_page - 1) // per_page if total else 1
     
     return render_template('manage_checklists.html', checklists=checklists_paginated, page=page, total_pages=total_pages)
 
@@ -297,20 +466,16 @@ def delete_checklist(checklist_id):
 @role_required(['COORDENADOR', 'GESTOR'])
 def view_responses():
     page = request.args.get('page', 1, type=int)
-    search = request.args.get('search', '').lower()
+    after_id = request.args.get('after', type=int) # Paginação por chave ao avançar
+    search = request.args.get('search', '').strip()
+    order = request.args.get('order', 'data') # 'data' (mais recentes) ou 'conformidade' (piores primeiro)
     per_page = 10
     
-    all_submissions = db.get_submissions_for_coordinator(session['user_id'])
+    # O filtro de pesquisa rápida é aplicado no próprio banco, junto com a paginação
+    submissions_paginated, total = db.get_submissions_for_coordinator_page(session['user_id'], page, per_page, after_id, search or None, order)
+    total_pages = (total + per_page - 1) // per_page if total else 1
     
-    # Lógica do Filtro de Pesquisa Rápida
-    if search:
-        all_submissions = [s for s in all_submissions if search in str(s.ID) or search in (s.Titulo or '').lower() or search in (s.NomeUsuario or '').lower()]
-        
-    total_pages = (len(all_submissions) + per_page - 1) // per_page if all_submissions else 1
-    start = (page - 1) * per_page
-    submissions_paginated = all_submissions[start:start + per_page]
-    
-    return render_template('view_responses.html', submissions=submissions_paginated, page=page, total_pages=total_pages, search=search)
+    return render_template('view_responses.html', submissions=submissions_paginated, page=page, total_pages=total_pages, search=search, order=order)
 
 @app.route('/delete_submission/<int:submission_id>', methods=['POST'])
 @login_required
@@ -348,10 +513,23 @@ def submission_details(submission_id):
     if not is_coordinator and not is_author:
         flash("Você não tem permissão para visualizar esta resposta.", "danger")
         return redirect(url_for('dashboard'))
-    all_answers = [ans for comp in submission_data['details'] for ans in comp['answers']]
-    for comp in submission_data['details']:
-        for child in comp['children']: all_answers.extend(child['answers'])
-    return render_template('submission_details.html', submission=submission_data, audit_score=calculate_audit_score(all_answers))
+    header = submission_data['header']
+    if header.TotalAuditavel is not None:
+        # Placar gravado na submissão quando ela foi salva
+        audit_score = db.score_from_submission(header)
+    else:
+        # Submissão antiga, ainda sem placar gravado (veja 'python manutencao.py backfill-placar')
+        audit_score = db.get_submission_score(submission_id)
+    return render_template('submission_details.html', submission=submission_data, audit_score=audit_score,
+                           photo_status=db.get_submission_photo_status(submission_id))
+
+@app.route('/submission/<int:submission_id>/photo_status')
+@login_required
+def submission_photo_status(submission_id):
+    """Situação do processamento das fotos da submissão (consultada pela tela de detalhes)."""
+    status = db.get_submission_photo_status(submission_id)
+    return jsonify({'pendentes': status.get('Pendente', 0) + status.get('Processando', 0),
+                    'falharam': status.get('Falhou', 0)})
 
 @app.route('/reports', methods=['GET', 'POST'])
 @login_required
@@ -359,42 +537,145 @@ def submission_details(submission_id):
 def reports():
     # Inicializa o report_data como None para não mostrar a tabela vazia ao abrir a página
     coordinator_id, report_data, filters, report_scores = session['user_id'], None, {}, {}
+    page, total_pages, total_rows = 1, 1, 0
     
     if request.method == 'POST':
-        filters = {k: request.form.get(k) for k in ['checklist_id', 'user_id', 'start_date', 'end_date', 'question', 'answer']}
-        report_data_db = db.get_filtered_submissions(coordinator_id, **{k: v or None for k, v in filters.items()})
+        filters = {k: request.form.get(k) for k in REPORT_FILTERS}
+        db_filters = {k: v or None for k, v in filters.items()}
+        page = request.form.get('page', 1, type=int)
         
-        report_data = [] # Inicia como lista vazia se for POST
+        # Só a página exibida é carregada; o placar de cada submissão vem agregado do banco
+        report_data, total_rows = db.get_filtered_submissions_page(coordinator_id, page, REPORT_PAGE_SIZE, **db_filters)
+        total_pages = (total_rows + REPORT_PAGE_SIZE - 1) // REPORT_PAGE_SIZE if total_rows else 1
+        for row in report_data:
+            row['photo_list'] = row['CaminhosFotos'].split(',') if row.get('CaminhosFotos') else []
         
-        if report_data_db:
-            report_data = [dict(row) for row in report_data_db]
-            for row in report_data:
-                row['photo_list'] = row['CaminhosFotos'].split(',') if row.get('CaminhosFotos') else []
-                
-                # TRUQUE: Adaptar os dados da base de dados para a função de Score funcionar
-                row['valor'] = row.get('Resposta')
-                if row['valor'] in ['Conforme', 'Bom']:
-                    row['is_conforme'] = True
-                elif row['valor'] in ['Não Conforme', 'Ruim']:
-                    row['is_conforme'] = False
-                else:
-                    row['is_conforme'] = None
-            
-            # Ordenar primeiro os dados por SubmissaoID para o groupby funcionar corretamente
-            report_data_sorted = sorted(report_data, key=lambda x: x['SubmissaoID'])
-            
-            for sub_id, group in groupby(report_data_sorted, key=lambda x: x['SubmissaoID']):
-                score = calculate_audit_score(list(group))
-                if score is not None: # Apenas guarda se o score for válido
-                    report_scores[sub_id] = score
+        report_scores = db.get_submission_scores(coordinator_id, **db_filters)
                     
+    # As listas dos filtros vêm do cache por coordenador (ver database.get_report_filter_options)
+    filter_options = db.get_report_filter_options(coordinator_id)
     return render_template('reports.html', 
-                           checklists=db.get_checklists_for_coordinator(coordinator_id), 
-                           users=db.get_manageable_users(coordinator_id), 
-                           questions=db.get_all_distinct_questions(coordinator_id), 
+                           checklists=filter_options['checklists'], 
+                           users=filter_options['users'], 
+                           questions=filter_options['questions'], 
                            report_data=report_data, 
                            filters=filters, 
-                           report_scores=report_scores)
+                           report_scores=report_scores,
+                           page=page, total_pages=total_pages, total_rows=total_rows)
+
+# --- TENDÊNCIA DE CONFORMIDADE ---
+TREND_PERIODS = {'dia': 'Diário', 'semana': 'Semanal', 'mes': 'Mensal'}
+# Rótulos, na tela, dos agrupamentos aceitos por db.get_compliance_trend (db.TREND_GROUP_BY)
+TREND_GROUP_LABELS = {'setor': 'Setor', 'checklist': 'Checklist', 'colaborador': 'Colaborador'}
+
+def trend_bucket(day, period):
+    """Primeiro dia do período (dia, semana ou mês) a que a data pertence."""
+    if period == 'semana':
+        return day - timedelta(days=day.weekday())
+    if period == 'mes':
+        return day.replace(day=1)
+    return day
+
+@app.route('/trends')
+@login_required
+@role_required(['COORDENADOR', 'GESTOR'])
+def trends():
+    today = date.today()
+    period = request.args.get('period', 'semana')
+    group_by = request.args.get('group_by', 'setor')
+    if period not in TREND_PERIODS: period = 'semana'
+    if group_by not in db.TREND_GROUP_BY: group_by = 'setor'
+    try:
+        start_date = date.fromisoformat(request.args.get('start_date', ''))
+    except ValueError:
+        start_date = today - timedelta(days=90)
+    try:
+        end_date = date.fromisoformat(request.args.get('end_date', ''))
+    except ValueError:
+        end_date = today
+
+    # Lê só o resumo diário (uma linha por dia × grupo) e agrega por período aqui
+    buckets, series = set(), {}
+    for row in db.get_compliance_trend(session['user_id'], start_date, end_date, group_by):
+        bucket = trend_bucket(row.Dia, period)
+        buckets.add(bucket)
+        totals = series.setdefault(row.Grupo, {}).setdefault(bucket, [0, 0, 0])
+        totals[0] += row.TotalSubmissoes
+        totals[1] += row.TotalAuditavel
+        totals[2] += row.TotalConforme
+    buckets = sorted(buckets)
+
+    trend_series = []
+    for group_name in sorted(series):
+        points = []
+        for bucket in buckets:
+            submissions, auditable, compliant = series[group_name].get(bucket, (0, 0, 0))
+            points.append({'submissions': submissions,
+                           'percentage': round(compliant / auditable * 100, 1) if auditable else None})
+        trend_series.append({'name': group_name, 'points': points})
+
+    return render_template('trends.html',
+                           labels=[b.strftime('%m/%Y' if period == 'mes' else '%d/%m/%Y') for b in buckets],
+                           series=trend_series,
+                           period=period, group_by=group_by, periods=TREND_PERIODS, groups={group: TREND_GROUP_LABELS.get(group, group.title()) for group in db.TREND_GROUP_BY},
+                           start_date=start_date.isoformat(), end_date=end_date.isoformat())
+
+# --- EXPORTAÇÃO DE RELATÓRIOS ---
+REPORT_FILTERS = ['checklist_id', 'user_id', 'start_date', 'end_date', 'question', 'answer']
+REPORT_PAGE_SIZE = 100 # Linhas de detalhe por página na tela de relatórios
+REPORT_EXPORT_HEADERS = ['ID', 'Data', 'Checklist', 'Colaborador', 'Pergunta / Item', 'Tipo de Resposta', 'Resposta', 'Observação', 'Conforme', 'Fotos']
+EXPORT_FLUSH_ROWS = 500 # Linhas acumuladas antes de enviar um pedaço do CSV ao cliente
+
+def report_export_values(row):
+    conforme = '' if row['IsConforme'] is None else ('Sim' if row['IsConforme'] else 'Não')
+    return [row['SubmissaoID'], row['DataSubmissao'].strftime('%d/%m/%Y %H:%M') if row['DataSubmissao'] else '',
+            row['ChecklistTitulo'], row['NomeUsuario'], row['TextoComponente'], row['TipoRespostaNome'] or '',
+            row['Resposta'] or '', row['Observacao'] or '', conforme, row['CaminhosFotos'] or '']
+
+def stream_report_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(REPORT_EXPORT_HEADERS)
+    # O cabeçalho sai antes de a consulta começar; o BOM faz o Excel reconhecer o UTF-8
+    yield '\ufeff' + buffer.getvalue()
+    buffer.seek(0); buffer.truncate(0)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(report_export_values(row))
+        if count % EXPORT_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0); buffer.truncate(0)
+    yield buffer.getvalue()
+
+def stream_report_xlsx(rows):
+    # Modo write_only: as linhas vão direto para o arquivo temporário, sem ficar em memória
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Relatório')
+    sheet.append(REPORT_EXPORT_HEADERS)
+    for row in rows:
+        sheet.append(report_export_values(row))
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while chunk := tmp.read(64 * 1024):
+            yield chunk
+
+@app.route('/reports/export', methods=['GET', 'POST'])
+@login_required
+@role_required(['COORDENADOR', 'GESTOR'])
+def export_report():
+    filters = {k: request.values.get(k) or None for k in REPORT_FILTERS}
+    export_format = request.values.get('format', 'csv')
+    rows = db.iter_filtered_submissions(session['user_id'], **filters)
+    filename = f"relatorio_{datetime.now().strftime('%Y%m%d_%H%M')}"
+    
+    if export_format == 'xlsx':
+        if Workbook is None:
+            flash("A exportação em Excel requer o pacote 'openpyxl'. Use a exportação em CSV.", "warning")
+            return redirect(url_for('reports'))
+        return Response(stream_report_xlsx(rows), mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.xlsx'})
+    return Response(stream_report_csv(rows), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
 
 @app.route('/manage_sectors', methods=['GET', 'POST'])
 @login_required
@@ -429,10 +710,8 @@ def manage_response_types():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    all_types = db.get_all_response_types()
-    total_pages = (len(all_types) + per_page - 1) // per_page if all_types else 1
-    start = (page - 1) * per_page
-    types_paginated = all_types[start:start + per_page]
+    types_paginated, total = db.get_response_types_page(page, per_page)
+    total_pages = (total + per_page - 1) // per_page if total else 1
     
     return render_template('manage_response_types.html', response_types=types_paginated, page=page, total_pages=total_pages)
 @app.route('/create_response_type', methods=['POST'])
@@ -472,7 +751,8 @@ def edit_response_type(type_id):
         if not name or len(options) < 2: flash("O nome e pelo menos duas opções são obrigatórios.", "danger")
         else:
             if db.update_response_type(type_id, name, options):
-                flash("Tipo de resposta atualizado com sucesso!", "success")
+                rescore_response_type_in_background(type_id)
+                flash("Tipo de resposta atualizado com sucesso! O placar das respostas já enviadas está sendo recalculado.", "success")
                 return redirect(url_for('manage_response_types'))
             else: flash("Erro ao atualizar o tipo de resposta.", "danger")
         return redirect(url_for('edit_response_type', type_id=type_id))
@@ -508,17 +788,17 @@ def fill_checklist(checklist_id):
                 if not files_list or not files_list[0].filename: continue
                 parts = key.split('_'); component_id, rt_id = int(parts[1]), int(parts[2])
                 ensure_comp_struct(component_id)
-                photo_paths = []
-                for file in files_list:
-                    if file and allowed_file(file.filename):
-                        filename = secure_filename(file.filename)
-                        unique_filename = f"{session['user_id']}_{component_id}_{rt_id}_{secrets.token_hex(4)}_{filename}"
-                        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                        file.save(file_path); photo_paths.append(unique_filename)
+                photo_paths = [name for name in (save_uploaded_photo(file, component_id, rt_id) for file in files_list) if name]
                 if photo_paths: answers[component_id]['responses'][rt_id] = photo_paths
         
-        # Passamos as respostas, participantes e o NOVO status
-        if db.save_flexible_checklist_response(checklist_id, session['user_id'], answers, participants, status):
+        # Se o autosave já criou um rascunho, as respostas vão para ele em vez de uma submissão nova
+        draft = db.get_draft_submission(request.form.get('draft_id', type=int), session['user_id']) if request.form.get('draft_id') else None
+        if draft and draft.ChecklistID == checklist_id:
+            saved = db.update_submission_answers(draft.ID, session['user_id'], answers, participants, status)
+        else:
+            # Passamos as respostas, participantes e o NOVO status
+            saved = db.save_flexible_checklist_response(checklist_id, session['user_id'], answers, participants, status)
+        if saved:
             if status == 'Rascunho':
                 flash("Progresso guardado! Pode continuar o preenchimento mais tarde.", "info")
             else:
@@ -532,7 +812,7 @@ def fill_checklist(checklist_id):
     if not checklist_data:
         flash("Checklist não encontrado.", "danger")
         return redirect(url_for('dashboard'))
-    return render_template('fill_checklist.html', checklist=checklist_data)
+    return render_template('fill_checklist.html', checklist=checklist_data, autosave=True)
 
 @app.route('/resubmit_checklist/<int:submission_id>', methods=['GET'])
 @login_required
@@ -541,7 +821,10 @@ def resubmit_checklist(submission_id):
     if not checklist_structure:
         flash("Checklist para reenvio não encontrado.", "danger")
         return redirect(url_for('dashboard'))
-    return render_template('fill_checklist.html', checklist=checklist_structure, existing_answers=existing_answers, is_resubmit=True, submission_id=submission_id)
+    # Só rascunhos são gravados por autosave; uma submissão ativa em edição só muda ao salvar
+    draft = db.get_draft_submission(submission_id, session['user_id'])
+    return render_template('fill_checklist.html', checklist=checklist_structure, existing_answers=existing_answers, is_resubmit=True, submission_id=submission_id,
+                           autosave=draft is not None, draft_id=submission_id if draft else None)
 
 @app.route('/save_resubmission/<int:submission_id>', methods=['POST'])
 @login_required
@@ -566,13 +849,7 @@ def save_resubmission(submission_id):
             if not files_list or not files_list[0].filename: continue
             parts = key.split('_'); component_id, rt_id = int(parts[1]), int(parts[2])
             ensure_comp_struct(component_id)
-            photo_paths = []
-            for file in files_list:
-                if file and allowed_file(file.filename):
-                    filename = secure_filename(file.filename)
-                    unique_filename = f"{session['user_id']}_{component_id}_{rt_id}_{secrets.token_hex(4)}_{filename}"
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                    file.save(file_path); photo_paths.append(unique_filename)
+            photo_paths = [name for name in (save_uploaded_photo(file, component_id, rt_id) for file in files_list) if name]
             if photo_paths: answers[component_id]['responses'][rt_id] = photo_paths
             
     # Atualiza o rascunho sem criar um histórico novo caso ainda seja rascunho
@@ -586,6 +863,66 @@ def save_resubmission(submission_id):
         flash("Erro ao guardar as alterações do checklist.", "danger")
         return redirect(url_for('resubmit_checklist', submission_id=submission_id))
 
+# --- AUTOSAVE DE RASCUNHOS (JSON) ---
+def component_response_types(checklist_data, component_id):
+    """IDs dos tipos de resposta ligados a um componente do checklist, ou None se o componente não é dele."""
+    pending = list(checklist_data['Componentes']) if checklist_data else []
+    while pending:
+        comp = pending.pop()
+        if comp['data'].ID == component_id:
+            return {rt['details'].ID for rt in comp['response_types']}
+        pending.extend(comp['children'])
+    return None
+
+@app.route('/drafts', methods=['POST'])
+@login_required
+@role_required('COLABORADOR')
+def create_draft():
+    """Cria um rascunho vazio para o autosave de um checklist ainda não gravado."""
+    data = request.get_json(silent=True) or {}
+    try:
+        checklist_id = int(data.get('checklist_id'))
+    except (TypeError, ValueError):
+        return jsonify({'ok': False, 'erro': "checklist_id inválido."}), 400
+    if not db.get_flexible_checklist_for_filling(checklist_id):
+        return jsonify({'ok': False, 'erro': "Checklist não encontrado."}), 404
+    participants = {'worker_name': data.get('worker_name') or None, 'area_manager_name': data.get('area_manager_name') or None}
+    draft_id = db.save_flexible_checklist_response(checklist_id, session['user_id'], {}, participants, 'Rascunho')
+    if not draft_id:
+        return jsonify({'ok': False, 'erro': "Não foi possível criar o rascunho."}), 503
+    return jsonify({'ok': True, 'submission_id': draft_id}), 201
+
+@app.route('/drafts/<int:submission_id>/autosave', methods=['POST'])
+@login_required
+def autosave_draft(submission_id):
+    """
+    Grava um componente do rascunho: {"component_id": 12, "responses": {"3": "Conforme"}, "observation": "..."}.
+    Fotos continuam sendo enviadas pelo formulário.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        component_id = int(data.get('component_id'))
+        responses = {int(rt_id): str(value).strip() for rt_id, value in (data.get('responses') or {}).items()}
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({'ok': False, 'erro': "Dados do componente inválidos."}), 400
+    observation = data.get('observation')
+    observation = str(observation).strip() if observation is not None else None
+
+    # Só componentes do checklist do rascunho, com os tipos de resposta ligados a eles
+    draft = db.get_draft_submission(submission_id, session['user_id'])
+    if not draft:
+        return jsonify({'ok': False, 'erro': "Esta submissão não é um rascunho seu."}), 409
+    allowed_types = component_response_types(db.get_flexible_checklist_for_filling(draft.ChecklistID), component_id)
+    if allowed_types is None or not set(responses) <= allowed_types:
+        return jsonify({'ok': False, 'erro': "Componente ou tipo de resposta não pertence a este checklist."}), 400
+
+    result = db.save_draft_component(submission_id, session['user_id'], component_id, responses, observation)
+    if result is None:
+        return jsonify({'ok': False, 'erro': "Esta submissão não é um rascunho seu."}), 409
+    if not result:
+        return jsonify({'ok': False, 'erro': "Não foi possível guardar o rascunho."}), 503
+    return jsonify({'ok': True})
+
 # --- PWA CONFIG ---
 @app.route('/manifest.json')
 def manifest():
@@ -0,0 +1,253 @@
+# backends.py
+# Bancos suportados por database.py, escolhidos por config.DB_BACKEND:
+#   - 'sqlserver': o banco de produção, via pyodbc (config.DB_CONFIG).
+#   - 'sqlite': um arquivo local com o mesmo esquema, para rodar benchmarks e testes de carga
+#     fora da rede da empresa. As consultas de database.py continuam escritas em T-SQL; a
+#     conexão SQLite traduz as construções usadas (SCOPE_IDENTITY, OUTPUT INSERTED, OFFSET/FETCH,
+#     TOP, STRING_AGG, DATEADD, CAST AS DATE...) e imita a API do pyodbc (row.Coluna,
+#     execute(sql, *params), autocommit). O esquema é criado pelas migrações (migrations.py).
+import functools
+import operator
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+
+
+class SQLServerBackend:
+    name = 'sqlserver'
+
+    def __init__(self, config):
+        import pyodbc  # Só é necessário quando o SQL Server é usado
+        self._pyodbc = pyodbc
+        self._conn_str = ';'.join([f'{k}={v}' for k, v in config.items()])
+        self.Error = pyodbc.Error
+        self.IntegrityError = pyodbc.IntegrityError
+
+    def connect(self):
+        return self._pyodbc.connect(self._conn_str)
+
+
+# --- Tradução T-SQL -> SQLite ---
+_TSQL_RULES = [
+    (re.compile(r"\bSET\s+NOCOUNT\s+ON\s*;", re.I), ""),
+    (re.compile(r"\bSET\s+IDENTITY_INSERT\s+\w+\s+(?:ON|OFF)\s*;?", re.I), ""),
+    (re.compile(r"\bSCOPE_IDENTITY\(\)", re.I), "last_insert_rowid()"),
+    (re.compile(r"\bSTRING_AGG\(", re.I), "GROUP_CONCAT("),
+    (re.compile(r"\bWITH\s*\(\s*(?:HOLDLOCK|NOLOCK|UPDLOCK|ROWLOCK)\s*\)", re.I), ""),
+    (re.compile(r"\bCAST\(\s*([\w.]+)\s+AS\s+DATE\s*\)", re.I), r"date(\1)"),
+    (re.compile(r"\bDATEADD\(\s*day\s*,\s*(-?\d+)\s*,\s*([^()]+?)\s*\)", re.I), r"datetime(\2, '\1 days')"),
+    (re.compile(r"\bGETDATE\(\)", re.I), "datetime('now', 'localtime')"),
+    (re.compile(r"\bISNULL\(", re.I), "IFNULL("),
+    (re.compile(r"\bLEN\(", re.I), "LENGTH("),
+    (re.compile(r"\bOFFSET\s+(\S+)\s+ROWS\s+FETCH\s+NEXT\s+(\S+)\s+ROWS\s+ONLY", re.I), r"LIMIT \1, \2"),
+]
+_OUTPUT_INSERTED = re.compile(r"\bOUTPUT\s+((?:INSERTED\.\w+\s*,?\s*)+)(?=VALUES\b|SELECT\b)", re.I)
+_WRITE_STATEMENT = re.compile(r"\s*(?:INSERT|UPDATE|DELETE|REPLACE|CREATE|ALTER|DROP)\b", re.I)
+_TOP = re.compile(r"^(\s*SELECT\s+)TOP\s*\(?\s*(\d+)\s*\)?\s+", re.I)
+_CREATE_TRIGGER = re.compile(r"\s*CREATE\s+TRIGGER\b", re.I)
+_TRIGGER_END = re.compile(r"\bEND\s*$", re.I)
+
+
+def _split_statements(sql):
+    """
+    Separa um lote em comandos pelos ';' fora de aspas (e fora do corpo BEGIN ... END de um
+    CREATE TRIGGER). Retorna [(comando, nº de '?')].
+    """
+    statements, current, placeholders, quote, comment = [], [], 0, None, False
+    for char in sql:
+        if comment:
+            comment = char != '\n'
+        elif quote:
+            if char == quote: quote = None
+        elif char == '-' and current and current[-1] == '-':
+            comment = True
+        elif char in ("'", '"'):
+            quote = char
+        elif char == '?':
+            placeholders += 1
+        elif char == ';' and not (_CREATE_TRIGGER.match(''.join(current[:64]))
+                                  and not _TRIGGER_END.search(_strip_comments(''.join(current)))):
+            statements.append((''.join(current), placeholders))
+            current, placeholders = [], 0
+            continue
+        current.append(char)
+    statements.append((''.join(current), placeholders))
+    return [(text.strip(), count) for text, count in statements if _strip_comments(text)]
+
+
+def _strip_comments(text):
+    return re.sub(r"--[^\n]*", "", text).strip()
+
+
+@functools.lru_cache(maxsize=2048)
+def translate(sql):
+    """Converte um lote T-SQL em [(comando SQLite, nº de parâmetros)]."""
+    for pattern, replacement in _TSQL_RULES:
+        sql = pattern.sub(replacement, sql)
+    statements = []
+    for text, placeholders in _split_statements(sql):
+        output = _OUTPUT_INSERTED.search(text)
+        if output:
+            # INSERT ... OUTPUT INSERTED.a VALUES (...)  ->  INSERT ... VALUES (...) RETURNING a
+            columns = re.sub(r"INSERTED\.", "", output.group(1), flags=re.I).strip().rstrip(',')
+            text = text[:output.start()] + text[output.end():] + f" RETURNING {columns}"
+        top = _TOP.match(text)
+        if top:
+            text = top.group(1) + text[top.end():] + f" LIMIT {top.group(2)}"
+        statements.append((text, placeholders))
+    return statements
+
+
+# --- Conexão compatível com pyodbc ---
+@functools.lru_cache(maxsize=512)
+def _row_class(columns):
+    """Classe de linha acessível por posição ou por nome de coluna (row.ID), como pyodbc.Row."""
+    # Uma propriedade por coluna, lida por itemgetter (em C): o acesso por nome custa o mesmo que no pyodbc
+    attributes = {name: property(operator.itemgetter(i)) for i, name in enumerate(columns) if name.isidentifier()}
+    return type('Row', (tuple,), {'__slots__': (), 'cursor_description': columns, **attributes})
+
+
+class SQLiteCursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._raw = None
+        self._buffer = None
+        self._row = None
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)): params = params[0]
+        params = list(params)
+        self._raw, self._buffer, self.description, self.rowcount = None, None, None, -1
+        statements = translate(sql)
+        for position, (text, count) in enumerate(statements):
+            args, params = params[:count], params[count:]
+            self._connection._begin_if_writing(text)
+            raw = self._connection._raw.execute(text, args)
+            if raw.description is None:
+                if raw.rowcount != -1: self.rowcount = raw.rowcount
+                continue
+            self.description = raw.description
+            self._row = _row_class(tuple(column[0] for column in raw.description))
+            if position == len(statements) - 1:
+                self._raw, self._buffer = raw, None
+            else:
+                # Um SELECT no meio do lote: guarda as linhas, o próximo comando reutilizaria o cursor
+                self._raw, self._buffer = None, raw.fetchall()
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        statements = translate(sql)
+        if len(statements) == 1 and _WRITE_STATEMENT.match(statements[0][0]):
+            # Um único INSERT/UPDATE/DELETE: o laço fica dentro do sqlite3 (como o fast_executemany do pyodbc)
+            text = statements[0][0]
+            self._connection._begin_if_writing(text)
+            self._raw, self._buffer, self.description = None, None, None
+            self.rowcount = self._connection._raw.executemany(text, seq_of_params).rowcount
+            return
+        for params in seq_of_params:
+            self.execute(sql, params)
+
+    def _take(self, size=None):
+        if self._buffer is not None:
+            rows = self._buffer if size is None else self._buffer[:size]
+            self._buffer = [] if size is None else self._buffer[size:]
+        elif self._raw is not None:
+            rows = self._raw.fetchall() if size is None else self._raw.fetchmany(size)
+        else:
+            raise sqlite3.ProgrammingError("Nenhum resultado: o último comando não retornou linhas.")
+        return [self._row(row) for row in rows]
+
+    def fetchone(self):
+        rows = self._take(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        return self._take(size)
+
+    def fetchall(self):
+        return self._take()
+
+    def fetchval(self):
+        row = self.fetchone()
+        return row[0] if row else None
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._raw = self._buffer = None
+
+
+class SQLiteConnection:
+    """Conexão SQLite com a interface usada por database.py (a mesma do pyodbc)."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.autocommit = False
+
+    def _begin_if_writing(self, statement):
+        # Com autocommit desligado, a transação começa no primeiro comando que escreve, já com
+        # o lock de escrita (IMMEDIATE): duas transações que leem e depois escrevem não entram
+        # em impasse. As leituras anteriores veem dados confirmados, como no READ COMMITTED.
+        if not self.autocommit and not self._raw.in_transaction and _WRITE_STATEMENT.match(statement):
+            self._raw.execute("BEGIN IMMEDIATE")
+
+    def cursor(self):
+        return SQLiteCursor(self)
+
+    def execute(self, sql, *params):
+        return self.cursor().execute(sql, *params)
+
+    def commit(self):
+        if self._raw.in_transaction: self._raw.commit()
+
+    def rollback(self):
+        if self._raw.in_transaction: self._raw.rollback()
+
+    def close(self):
+        self._raw.close()
+
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('DATE', lambda value: date.fromisoformat(value.decode()[:10]))
+
+
+class SQLiteBackend:
+    name = 'sqlite'
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, config):
+        self.path = config.get('path', 'checklist_local.db')
+        self.busy_timeout = config.get('busy_timeout', 10)
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        raw = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        raw.execute("PRAGMA foreign_keys = ON")
+        raw.execute("PRAGMA journal_mode = WAL")  # leitores não bloqueiam o escritor
+        conn = SQLiteConnection(raw)
+        if not self._schema_ready:
+            # Cria/atualiza o esquema local na primeira conexão do processo
+            import migrations
+            with self._schema_lock:
+                if not self._schema_ready:
+                    migrations.migrate(conn, dialect=self.name, log=lambda message: None)
+                    conn.autocommit = False
+                    self._schema_ready = True
+        return conn
+
+
+def get_backend(name, sqlserver_config, sqlite_config):
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_config)
+    if name == 'sqlserver':
+        return SQLServerBackend(sqlserver_config)
+    raise ValueError(f"DB_BACKEND desconhecido: {name!r} (use 'sqlserver' ou 'sqlite').")
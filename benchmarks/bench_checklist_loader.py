@@ -0,0 +1,69 @@
+# benchmarks/bench_checklist_loader.py
+# Compara o carregamento antigo (uma consulta por componente e por tipo de resposta)
+# com o carregamento em lote de db._load_flexible_checklist (sem passar pelo cache).
+#   python benchmarks/bench_checklist_loader.py [tamanhos...]
+import sys
+
+from common import cleanup, create_checklist, create_response_types, measure, print_table
+import database as db
+
+
+def legacy_get_flexible_checklist_for_filling(checklist_id):
+    """Cópia da implementação anterior (N×M+1 consultas), mantida apenas para comparação."""
+    conn = db.get_connection()
+    cursor_title = conn.cursor()
+    cursor_title.execute("SELECT Titulo, SetorID FROM Checklists WHERE ID = ?", checklist_id)
+    checklist_row = cursor_title.fetchone()
+    checklist_data = {'ID': checklist_id, 'Titulo': checklist_row.Titulo, 'Componentes': []}
+    cursor_comps = conn.cursor()
+    cursor_comps.execute("SELECT ID, ParentID, TextoComponente, TipoComponente, Instrucao FROM ComponentesChecklist WHERE ChecklistID = ? ORDER BY Ordem, ParentID, ID", checklist_id)
+    component_map = {}
+    for comp in cursor_comps.fetchall():
+        cursor_rt = conn.cursor()
+        cursor_rt.execute("SELECT tr.ID, tr.Nome, tr.TipoInput FROM TiposResposta tr JOIN Componente_TiposResposta ctr ON tr.ID = ctr.TipoRespostaID WHERE ctr.ComponenteID = ? ORDER BY tr.ID", comp.ID)
+        response_types_with_options = []
+        for rt in cursor_rt.fetchall():
+            options = []
+            if rt.TipoInput == 'radio':
+                cursor_options = conn.cursor()
+                cursor_options.execute("SELECT TextoOpcao FROM OpcoesResposta WHERE TipoRespostaID = ?", rt.ID)
+                options = [row.TextoOpcao for row in cursor_options.fetchall()]
+            response_types_with_options.append({'details': rt, 'options': options})
+        component_map[comp.ID] = {'data': comp, 'children': [], 'response_types': response_types_with_options}
+    for comp_data in list(component_map.values()):
+        parent_id = comp_data['data'].ParentID
+        if parent_id and parent_id in component_map:
+            component_map[parent_id]['children'].append(comp_data)
+        else:
+            checklist_data['Componentes'].append(comp_data)
+    conn.close()
+    return checklist_data
+
+
+def _shape(checklist):
+    """Reduz a árvore a tuplas comparáveis (IDs, tipos e opções)."""
+    def node(c):
+        return (c['data'].ID, tuple((rt['details'].ID, tuple(rt['options'])) for rt in c['response_types']),
+                tuple(node(child) for child in c['children']))
+    return tuple(node(c) for c in checklist['Componentes'])
+
+
+def main(sizes):
+    radio_id, text_id = create_response_types()
+    checklist_ids, rows = [], []
+    try:
+        for size in sizes:
+            checklist_id = create_checklist(size, [radio_id, text_id])
+            checklist_ids.append(checklist_id)
+            assert _shape(legacy_get_flexible_checklist_for_filling(checklist_id)) == _shape(db._load_flexible_checklist(checklist_id))
+            old_ms, old_p95, old_q = measure(lambda: legacy_get_flexible_checklist_for_filling(checklist_id))
+            new_ms, new_p95, new_q = measure(lambda: db._load_flexible_checklist(checklist_id))
+            rows.append((size, f"{old_q:.0f}", f"{new_q:.0f}", f"{old_ms:.1f}", f"{new_ms:.1f}", f"{old_p95:.1f}", f"{new_p95:.1f}"))
+    finally:
+        cleanup(checklist_ids, [radio_id, text_id])
+    print_table(['itens', 'consultas(antes)', 'consultas(depois)', 'mediana ms(antes)', 'mediana ms(depois)',
+                 'p95 ms(antes)', 'p95 ms(depois)'], rows)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 30, 120, 300])
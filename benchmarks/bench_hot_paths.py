@@ -0,0 +1,211 @@
+# benchmarks/bench_hot_paths.py
+# Suíte de benchmarks dos caminhos mais usados de database.py, em vários tamanhos de dados.
+# Para cada função e tamanho registra a latência (p50/p95/p99), as idas ao banco por chamada
+# e o pico de memória alocada numa chamada. Grava tudo num JSON e, com --comparar, aponta as
+# regressões em relação a um JSON gravado antes (o código de saída é 1 se houver alguma).
+#   python benchmarks/bench_hot_paths.py --salvar base.json
+#   python benchmarks/bench_hot_paths.py --comparar base.json
+#   python benchmarks/bench_hot_paths.py --funcoes get_submission_details --respostas 50 500
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from common import (build_answers, cleanup, count_queries, create_checklist, create_response_types,
+                    create_submission, get_or_create_coordinator, get_or_create_user, percentile, print_table)
+import database as db
+
+PARTICIPANTS = {'worker_name': 'Benchmark', 'area_manager_name': 'Benchmark'}
+
+# Diferenças menores que estas são ruído de medição, mesmo acima da tolerância percentual
+MIN_DELTA_MS = 1.0
+MIN_DELTA_KB = 64
+
+
+def _edited(answers, fraction=0.1):
+    """Cópia das respostas com `fraction` das respostas de múltipla escolha trocadas, como numa edição real."""
+    edited = {}
+    for position, (component_id, data) in enumerate(answers.items()):
+        responses = dict(data['responses'])
+        if position % round(1 / fraction) == 0:
+            responses = {rt_id: ('Não Conforme' if value == 'Conforme' else value) for rt_id, value in responses.items()}
+        edited[component_id] = {**data, 'responses': responses}
+    return edited
+
+
+def answer_cases(size, radio_id, text_id, user_id, checklist_ids):
+    """Funções cujo custo depende do número de respostas de uma submissão (`size` respostas)."""
+    checklist_id = create_checklist(max(1, size // 2), [radio_id, text_id])
+    checklist_ids.append(checklist_id)
+    answers = build_answers(db.get_flexible_checklist_for_filling(checklist_id), radio_id, text_id, photo_every=10)
+    versions = [answers, _edited(answers)]
+    submission_id = create_submission(checklist_id, answers, user_id)
+    state = {'update': 0, 'latest': create_submission(checklist_id, answers, user_id)}
+
+    def update():
+        # Alterna entre duas versões que diferem em 10% das respostas
+        state['update'] += 1
+        db.update_submission_answers(submission_id, user_id, versions[state['update'] % 2], PARTICIPANTS)
+
+    def replicate():
+        state['latest'] = db.replicate_submission_for_editing(state['latest'], user_id)
+
+    return [
+        ('get_flexible_checklist_for_filling', lambda: db.get_flexible_checklist_for_filling(checklist_id), db._checklist_cache.clear),
+        ('save_flexible_checklist_response', lambda: db.save_flexible_checklist_response(checklist_id, user_id, answers, PARTICIPANTS), None),
+        ('update_submission_answers', update, None),
+        ('replicate_submission_for_editing', replicate, None),
+        ('get_submission_details', lambda: db.get_submission_details(submission_id), None),
+    ]
+
+
+def coordinator_cases(size, radio_id, text_id, user_id, coordinator_id, checklist_ids):
+    """
+    Funções cujo custo depende do número de submissões do coordenador (`size` submissões de 20
+    respostas), chamadas como as telas de submissões e de relatórios as chamam. As variantes de
+    uma mesma função levam o nome dela seguido de ':' (ex.: --funcoes get_submissions_for_coordinator_page:busca).
+    """
+    if not checklist_ids:
+        checklist_ids.append(create_checklist(10, [radio_id, text_id]))
+    checklist_id = checklist_ids[0]
+    answers = build_answers(db.get_flexible_checklist_for_filling(checklist_id), radio_id, text_id, photo_every=10)
+    existing = db.get_submissions_for_coordinator_page(coordinator_id, 1, 1)[1]
+    for _ in range(size - existing):
+        db.save_flexible_checklist_response(checklist_id, user_id, answers, PARTICIPANTS)
+    # Última submissão da primeira página: a chave da página seguinte
+    after_id = db.get_submissions_for_coordinator_page(coordinator_id, 1, 10)[0][-1].ID
+    return [
+        ('get_submissions_for_coordinator_page', lambda: db.get_submissions_for_coordinator_page(coordinator_id, 1, 10), None),
+        ('get_submissions_for_coordinator_page:seguinte',
+         lambda: db.get_submissions_for_coordinator_page(coordinator_id, 2, 10, after_id), None),
+        # 'bench' casa com o título dos checklists e com o nome do colaborador de benchmark
+        ('get_submissions_for_coordinator_page:busca',
+         lambda: db.get_submissions_for_coordinator_page(coordinator_id, 1, 10, search='bench'), None),
+        ('get_submissions_for_coordinator_page:conformidade',
+         lambda: db.get_submissions_for_coordinator_page(coordinator_id, 1, 10, order='conformidade'), None),
+        ('get_filtered_submissions_page', lambda: db.get_filtered_submissions_page(coordinator_id, 1, 100), None),
+        ('get_submission_scores', lambda: db.get_submission_scores(coordinator_id), None),
+    ]
+
+
+def run_case(call, setup, repeat):
+    """Mede uma função: latências (ms), idas ao banco por chamada e pico de memória (KB) de uma chamada."""
+    if setup: setup()
+    call()  # aquecimento: pool de conexões, caches de plano
+    timings = []
+    with count_queries() as counter:
+        for _ in range(repeat):
+            if setup: setup()
+            start = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - start) * 1000)
+    # A memória é medida à parte: o tracemalloc deixa as chamadas bem mais lentas
+    if setup: setup()
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'p50_ms': round(percentile(timings, 0.50), 3), 'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3), 'consultas': round(counter.count / repeat, 2),
+            'memoria_pico_kb': round(peak / 1024, 1)}
+
+
+def compare(results, baseline, tolerance):
+    """Lista as regressões [(função, tamanho, métrica, antes, depois)] em relação ao baseline."""
+    regressions = []
+    for name, sizes in results.items():
+        for size, now in sizes.items():
+            before = baseline.get(name, {}).get(size)
+            if not before: continue
+            for metric in ('p50_ms', 'p95_ms'):
+                if now[metric] > before[metric] * (1 + tolerance) and now[metric] - before[metric] >= MIN_DELTA_MS:
+                    regressions.append((name, size, metric, before[metric], now[metric]))
+            if now['consultas'] > before['consultas']:
+                regressions.append((name, size, 'consultas', before['consultas'], now['consultas']))
+            if (now['memoria_pico_kb'] > before['memoria_pico_kb'] * (1 + tolerance)
+                    and now['memoria_pico_kb'] - before['memoria_pico_kb'] >= MIN_DELTA_KB):
+                regressions.append((name, size, 'memoria_pico_kb', before['memoria_pico_kb'], now['memoria_pico_kb']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos mais usados de database.py.")
+    parser.add_argument('--repeticoes', type=int, default=20, help="Chamadas medidas por função e tamanho (padrão: 20).")
+    parser.add_argument('--respostas', type=int, nargs='+', default=[20, 100, 400],
+                        help="Respostas por submissão, para as funções de uma submissão (padrão: 20 100 400).")
+    parser.add_argument('--submissoes', type=int, nargs='+', default=[100, 500, 2000],
+                        help="Submissões do coordenador, para as listagens e o relatório (padrão: 100 500 2000).")
+    parser.add_argument('--funcoes', nargs='+', help="Mede só estas funções.")
+    parser.add_argument('--salvar', help="Grava os resultados neste arquivo JSON.")
+    parser.add_argument('--comparar', help="Compara com um JSON gravado antes por --salvar.")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Aumento relativo de latência ou memória tolerado antes de apontar regressão (padrão: 0.25).")
+    args = parser.parse_args()
+
+    radio_id, text_id = create_response_types()
+    user_id = get_or_create_user()
+    coordinator_id = get_or_create_coordinator(user_id)
+    results, checklist_ids = {}, []
+
+    def measure_all(cases, size):
+        for name, call, setup in cases:
+            if args.funcoes and name not in args.funcoes: continue
+            results.setdefault(name, {})[str(size)] = result = run_case(call, setup, args.repeticoes)
+            print(f"  {name} [{size}]: p50 {result['p50_ms']:.2f} ms, {result['consultas']:g} consultas")
+
+    try:
+        # As listagens do coordenador primeiro, enquanto o setor de benchmark só tem as submissões delas
+        coordinator_checklists = []
+        for size in sorted(args.submissoes):
+            print(f"--- {size} submissões no coordenador ---")
+            measure_all(coordinator_cases(size, radio_id, text_id, user_id, coordinator_id, coordinator_checklists), size)
+        checklist_ids.extend(coordinator_checklists)
+        for size in sorted(args.respostas):
+            print(f"--- {size} respostas por submissão ---")
+            measure_all(answer_cases(size, radio_id, text_id, user_id, checklist_ids), size)
+    finally:
+        cleanup(checklist_ids, [radio_id, text_id])
+
+    baseline = {}
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved['resultados']
+        if saved['meta']['backend'] != db.BACKEND:
+            print(f"Aviso: o baseline foi medido em '{saved['meta']['backend']}' e esta execução em '{db.BACKEND}'.")
+
+    rows = []
+    for name, sizes in results.items():
+        for size, result in sizes.items():
+            before = baseline.get(name, {}).get(size, {}).get('p50_ms')
+            change = f"{(result['p50_ms'] - before) / before * 100:+.0f}%" if before else '-'
+            rows.append((name, size, f"{result['p50_ms']:.2f}", f"{result['p95_ms']:.2f}", f"{result['p99_ms']:.2f}",
+                         f"{result['consultas']:g}", f"{result['memoria_pico_kb']:.0f}", before if before is not None else '-', change))
+    print()
+    print_table(['função', 'tamanho', 'p50 ms', 'p95 ms', 'p99 ms', 'consultas', 'memória KB', 'p50 antes', 'variação'], rows)
+
+    if args.salvar:
+        meta = {'backend': db.BACKEND, 'data': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(), 'repeticoes': args.repeticoes}
+        with open(args.salvar, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'resultados': results}, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados salvos em {args.salvar}.")
+
+    if args.comparar:
+        regressions = compare(results, baseline, args.tolerancia)
+        if not regressions:
+            print("\nNenhuma regressão em relação ao baseline.")
+            return 0
+        print(f"\n{len(regressions)} regressão(ões) em relação ao baseline:")
+        print_table(['função', 'tamanho', 'métrica', 'antes', 'depois'], regressions)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
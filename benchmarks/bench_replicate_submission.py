@@ -0,0 +1,85 @@
+# benchmarks/bench_replicate_submission.py
+# Compara a cópia resposta a resposta de replicate_submission_for_editing com a cópia
+# em conjunto (MERGE + OUTPUT), medindo round trips e o tempo em que a transação
+# retém locks de escrita (do primeiro comando de escrita até o commit).
+#   python benchmarks/bench_replicate_submission.py [respostas...]
+import statistics
+import sys
+
+from common import (build_answers, cleanup, count_queries, create_checklist, create_response_types,
+                    create_submission, get_or_create_user, percentile, print_table)
+import database as db
+
+
+def legacy_replicate_submission_for_editing(old_submission_id, user_id):
+    """Cópia da implementação anterior (2 a 3 round trips por resposta), mantida apenas para comparação."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT ChecklistID, UsuarioID FROM Submissoes WHERE ID = ?", old_submission_id)
+        original_sub = cursor.fetchone()
+        cursor.execute("SET NOCOUNT ON; INSERT INTO Submissoes (ChecklistID, UsuarioID, Status) VALUES (?, ?, 'Ativa'); SELECT SCOPE_IDENTITY();", original_sub.ChecklistID, user_id)
+        new_submission_id = cursor.fetchone()[0]
+        cursor.execute("UPDATE Submissoes SET Status = 'Arquivada', SubstituidaPorID = ? WHERE ID = ?", new_submission_id, old_submission_id)
+        cursor.execute("SELECT ComponenteID, TipoRespostaID, Resposta, Observacao FROM Respostas WHERE SubmissaoID = ?", old_submission_id)
+        for answer in cursor.fetchall():
+            cursor.execute("SET NOCOUNT ON; INSERT INTO Respostas (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao) VALUES (?, ?, ?, ?, ?); SELECT SCOPE_IDENTITY();", new_submission_id, answer.ComponenteID, answer.TipoRespostaID, answer.Resposta, answer.Observacao)
+            new_answer_id = cursor.fetchone()[0]
+            cursor.execute("SELECT CaminhoFoto FROM FotosResposta WHERE RespostaID = (SELECT ID FROM Respostas WHERE SubmissaoID = ? AND ComponenteID = ? AND TipoRespostaID = ?)", old_submission_id, answer.ComponenteID, answer.TipoRespostaID)
+            for photo in cursor.fetchall():
+                cursor.execute("INSERT INTO FotosResposta (RespostaID, CaminhoFoto) VALUES (?, ?)", new_answer_id, photo.CaminhoFoto)
+        conn.commit()
+        return new_submission_id
+    finally:
+        conn.close()
+
+
+def _snapshot(submission_id):
+    """Respostas e fotos de uma submissão, sem IDs, para comparar as duas cópias."""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT r.ComponenteID, r.TipoRespostaID, r.Resposta, r.Observacao, f.CaminhoFoto
+        FROM Respostas r LEFT JOIN FotosResposta f ON f.RespostaID = r.ID
+        WHERE r.SubmissaoID = ?
+    """, submission_id)
+    rows = sorted(tuple('' if v is None else v for v in row) for row in cursor.fetchall())
+    conn.close()
+    return rows
+
+
+def _run(replicate, submission_id, user_id, repeat):
+    """Replica a submissão `repeat` vezes em cadeia; retorna (id final, consultas/chamada, tempos de lock)."""
+    with count_queries() as counter:
+        for _ in range(repeat):
+            submission_id = replicate(submission_id, user_id)
+    return submission_id, counter.count / repeat, counter.lock_hold_ms
+
+
+def main(sizes, repeat=5):
+    radio_id, text_id = create_response_types()
+    user_id = get_or_create_user()
+    checklist_ids, rows = [], []
+    try:
+        for size in sizes:
+            # Cada item recebe duas respostas (múltipla escolha + texto/fotos)
+            checklist_id = create_checklist(max(1, size // 2), [radio_id, text_id])
+            checklist_ids.append(checklist_id)
+            answers = build_answers(db.get_flexible_checklist_for_filling(checklist_id), radio_id, text_id, photo_every=10)
+            original_id = create_submission(checklist_id, answers, user_id)
+
+            legacy_id, old_q, old_hold = _run(legacy_replicate_submission_for_editing, original_id, user_id, repeat)
+            new_id, new_q, new_hold = _run(db.replicate_submission_for_editing, legacy_id, user_id, repeat)
+            assert _snapshot(original_id) == _snapshot(legacy_id) == _snapshot(new_id)
+
+            rows.append((size, f"{old_q:.0f}", f"{new_q:.0f}",
+                         f"{statistics.median(old_hold):.1f}", f"{statistics.median(new_hold):.1f}",
+                         f"{percentile(old_hold, 0.95):.1f}", f"{percentile(new_hold, 0.95):.1f}"))
+    finally:
+        cleanup(checklist_ids, [radio_id, text_id])
+    print_table(['respostas', 'consultas(antes)', 'consultas(depois)', 'lock mediana ms(antes)',
+                 'lock mediana ms(depois)', 'lock p95 ms(antes)', 'lock p95 ms(depois)'], rows)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [50, 200, 1000])
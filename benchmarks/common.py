@@ -0,0 +1,224 @@
+# benchmarks/common.py
+# Utilitários compartilhados pelos benchmarks. Rode os scripts a partir da raiz do projeto:
+#   python benchmarks/bench_checklist_loader.py
+import os
+import statistics
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+
+_WRITE_KEYWORDS = ('INSERT', 'UPDATE', 'DELETE', 'MERGE')
+
+
+class QueryCounter:
+    """
+    Conta os round trips (cursor.execute) feitos enquanto está ativo e mede, para cada
+    transação, o tempo entre o primeiro comando de escrita e o commit/rollback
+    (aproximação do tempo em que os locks de escrita ficam retidos).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock_hold_ms = []
+        self._write_started = None
+
+    def on_execute(self, sql):
+        self.count += 1
+        if self._write_started is None and any(k in sql.upper() for k in _WRITE_KEYWORDS):
+            self._write_started = time.perf_counter()
+
+    def on_transaction_end(self):
+        if self._write_started is not None:
+            self.lock_hold_ms.append((time.perf_counter() - self._write_started) * 1000)
+            self._write_started = None
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor, self._counter = cursor, counter
+
+    def execute(self, sql, *args, **kwargs):
+        self._counter.on_execute(sql)
+        return self._cursor.execute(sql, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn, self._counter = conn, counter
+
+    def cursor(self):
+        return _CountingCursor(self._conn.cursor(), self._counter)
+
+    def commit(self):
+        self._conn.commit()
+        self._counter.on_transaction_end()
+
+    def rollback(self):
+        self._conn.rollback()
+        self._counter.on_transaction_end()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        if name in ('_conn', '_counter'): object.__setattr__(self, name, value)
+        else: setattr(self._conn, name, value)
+
+
+@contextmanager
+def count_queries():
+    """Substitui db.get_connection por uma versão que conta cada cursor.execute."""
+    counter = QueryCounter()
+    original = db.get_connection
+
+    def counting_get_connection():
+        conn = original()
+        return _CountingConnection(conn, counter) if conn else None
+
+    db.get_connection = counting_get_connection
+    try:
+        yield counter
+    finally:
+        db.get_connection = original
+
+
+def measure(func, repeat=20):
+    """Executa func `repeat` vezes e retorna (mediana_ms, p95_ms, consultas_por_chamada)."""
+    timings = []
+    with count_queries() as counter:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), percentile(timings, 0.95), counter.count / repeat
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _fetch_id(query, *params):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, *params)
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def create_response_types():
+    """Cria um tipo de múltipla escolha e um de texto exclusivos do benchmark. Retorna (radio_id, text_id)."""
+    tag = uuid.uuid4().hex[:8]
+    db.create_response_type(f"bench-radio-{tag}", ['Conforme', 'Não Conforme', 'Não se Aplica'], 'radio')
+    db.create_response_type(f"bench-texto-{tag}", [], 'text')
+    radio_id = _fetch_id("SELECT ID FROM TiposResposta WHERE Nome = ?", f"bench-radio-{tag}")
+    text_id = _fetch_id("SELECT ID FROM TiposResposta WHERE Nome = ?", f"bench-texto-{tag}")
+    return radio_id, text_id
+
+
+def get_or_create_sector():
+    name = 'Benchmark'
+    sector_id = _fetch_id("SELECT ID FROM Setores WHERE Nome = ?", name)
+    if sector_id is None:
+        db.create_sector(name)
+        sector_id = _fetch_id("SELECT ID FROM Setores WHERE Nome = ?", name)
+    return sector_id
+
+
+def create_checklist(n_items, response_type_ids, items_per_category=10):
+    """
+    Cria um checklist com `n_items` itens de verificação agrupados em categorias
+    de `items_per_category` itens. Retorna o ID do checklist.
+    """
+    title = f"bench-{n_items}-{uuid.uuid4().hex[:8]}"
+    components = []
+    for start in range(0, n_items, items_per_category):
+        count = min(items_per_category, n_items - start)
+        components.append({
+            'text': f"Categoria {start // items_per_category + 1}", 'type': 'CATEGORIA',
+            'sub_items': [{'text': f"Item {start + i + 1}", 'response_type_ids': list(response_type_ids)} for i in range(count)],
+        })
+    if not db.create_flexible_checklist(title, get_or_create_sector(), components):
+        raise RuntimeError("Falha ao criar o checklist de benchmark.")
+    return _fetch_id("SELECT ID FROM Checklists WHERE Titulo = ?", title)
+
+
+def build_answers(checklist, radio_id, text_id, photo_every=0):
+    """
+    Gera respostas para todos os itens de verificação de um checklist montado.
+    Com photo_every=N, a cada N itens a resposta de texto é trocada por duas fotos.
+    """
+    answers = {}
+    items = [item for category in checklist['Componentes'] for item in category['children']]
+    for position, item in enumerate(items):
+        item_id = item['data'].ID
+        text_value = f"valor {item_id}"
+        if photo_every and position % photo_every == 0:
+            text_value = [f"bench_{item_id}_a.jpg", f"bench_{item_id}_b.jpg"]
+        answers[item_id] = {
+            'responses': {radio_id: 'Conforme', text_id: text_value},
+            'observation': 'observação de benchmark',
+        }
+    return answers
+
+
+def create_submission(checklist_id, answers, user_id):
+    """Grava uma submissão ativa e retorna seu ID."""
+    participants = {'worker_name': 'Benchmark', 'area_manager_name': 'Benchmark'}
+    submission_id = db.save_flexible_checklist_response(checklist_id, user_id, answers, participants)
+    if not submission_id:
+        raise RuntimeError("Falha ao gravar a submissão de benchmark.")
+    return submission_id
+
+
+def get_or_create_user():
+    name = 'bench.colaborador'
+    user_id = _fetch_id("SELECT ID FROM Usuarios WHERE NomeUsuario = ?", name)
+    if user_id is None:
+        db.create_user(name, 'x', 'COLABORADOR')
+        user_id = _fetch_id("SELECT ID FROM Usuarios WHERE NomeUsuario = ?", name)
+    return user_id
+
+
+def get_or_create_coordinator(collaborator_id):
+    """Coordenador do setor de benchmark, definido também como coordenador do colaborador informado."""
+    name = 'bench.coordenador'
+    coordinator_id = _fetch_id("SELECT ID FROM Usuarios WHERE NomeUsuario = ?", name)
+    if coordinator_id is None:
+        db.create_user(name, 'x', 'COORDENADOR')
+        coordinator_id = _fetch_id("SELECT ID FROM Usuarios WHERE NomeUsuario = ?", name)
+        db.update_coordinator_sectors(coordinator_id, [get_or_create_sector()])
+    collaborator = db.get_user_by_id(collaborator_id)
+    if collaborator.CoordenadorID != coordinator_id:
+        db.update_user_info(collaborator_id, collaborator.NomeUsuario, collaborator.Papel, coordinator_id)
+    return coordinator_id
+
+
+def cleanup(checklist_ids=(), response_type_ids=()):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    for checklist_id in checklist_ids:
+        cursor.execute("UPDATE Submissoes SET SubstituidaPorID = NULL WHERE ChecklistID = ?", checklist_id)
+        cursor.execute("DELETE FROM Submissoes WHERE ChecklistID = ?", checklist_id)
+        cursor.execute("DELETE FROM ResumoConformidadeDiario WHERE ChecklistID = ?", checklist_id)
+    conn.commit()
+    conn.close()
+    for checklist_id in checklist_ids: db.delete_checklist(checklist_id)
+    for rt_id in response_type_ids: db.delete_response_type(rt_id)
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print('  '.join(str(v).rjust(w) for v, w in zip(row, widths)))
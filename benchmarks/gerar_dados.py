@@ -0,0 +1,316 @@
+# benchmarks/gerar_dados.py
+# Preenche o banco com dados sintéticos no formato dos de produção, para reproduzir problemas
+# de escala: setores, coordenadores, colaboradores, tipos de resposta com opções, checklists
+# (categorias com itens de verificação) e anos de submissões com respostas, fotos e cadeias de
+# versões (cada edição arquiva a versão anterior e a liga à nova por SubstituidaPorID).
+# A mesma semente gera os mesmos dados (com datas relativas ao dia da execução); num banco
+# vazio, também os mesmos IDs.
+#   python benchmarks/gerar_dados.py                               (~1 milhão de respostas)
+#   python benchmarks/gerar_dados.py --submissoes 200000           (~10 milhões de respostas)
+#   CHECKLIST_DB_BACKEND=sqlite python benchmarks/gerar_dados.py   (banco local, ver backends.py)
+# O cadastro usa as funções de database.py. Submissões, respostas e fotos são gravadas em lote
+# (executemany, com IDs atribuídos aqui): não rode com a aplicação gravando no mesmo banco.
+# No SQL Server, aplique antes as migrações (python manutencao.py migrar).
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import common  # noqa: F401  (coloca a raiz do projeto no sys.path)
+import auth
+import database as db
+
+# (nome, tipo de entrada, [(opção, é conforme)], peso como resposta principal de um item)
+RESPONSE_TYPES = [
+    ('Conformidade', 'radio', [('Conforme', True), ('Não Conforme', False), ('Não se Aplica', False)], 7),
+    ('Sim/Não', 'radio', [('Sim', True), ('Não', False), ('N/A', False)], 2),
+    ('Estado de Conservação', 'radio', [('Bom', True), ('Regular', False), ('Ruim', False)], 1),
+    ('Texto Livre', 'text', [], 0),
+    ('Descrição', 'textarea', [], 0),
+    ('Data', 'date', [], 0),
+    ('Foto', 'file', [], 0),
+]
+EXTRA_INPUTS = ('text', 'textarea', 'date')
+
+FIRST_NAMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elaine', 'Fábio', 'Gabriela', 'Hugo', 'Isabela', 'João',
+               'Karina', 'Lucas', 'Marina', 'Nelson', 'Otávio', 'Patrícia', 'Rafael', 'Sandra', 'Tiago', 'Vanessa']
+LAST_NAMES = ['Silva', 'Souza', 'Oliveira', 'Santos', 'Pereira', 'Lima', 'Costa', 'Ferreira', 'Almeida', 'Ribeiro']
+SECTORS = ['Manutenção', 'Garagem', 'Tráfego', 'Almoxarifado', 'Lavagem', 'Funilaria', 'Elétrica', 'Pneus',
+           'Abastecimento', 'Administrativo', 'Segurança', 'Limpeza']
+TOPICS = ['EPI', 'Extintores', 'Ferramentas', 'Sinalização', 'Organização', 'Documentação', 'Iluminação',
+          'Resíduos', 'Veículos', 'Instalações', 'Máquinas', 'Ergonomia']
+TEXTS = ['Sem observações', 'Verificado no local', 'Aguardando peça', 'Corrigido na hora', 'Encaminhado ao setor']
+OBSERVATIONS = ['Item com desgaste', 'Necessita reposição', 'Orientado o colaborador', 'Reincidente', 'Registrado em foto']
+
+# Colunas gravadas em lote, com o ID atribuído pelo gerador na primeira posição
+SUBMISSION_COLUMNS = ('ID', 'ChecklistID', 'UsuarioID', 'DataSubmissao', 'NomeTrabalhadorAuditado',
+                      'NomeResponsavelArea', 'Status', 'SubstituidaPorID')
+ANSWER_COLUMNS = ('ID', 'SubmissaoID', 'ComponenteID', 'TipoRespostaID', 'Resposta', 'Observacao')
+PHOTO_COLUMNS = ('ID', 'RespostaID', 'CaminhoFoto')
+
+
+def _fetch_all(query, *params):
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute(query, *params)
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+# --- Cadastro (pelas funções de database.py) ---
+def create_response_types(tag):
+    """
+    Cria os tipos de resposta e marca as opções conformes.
+    Retorna {ID: (tipo de entrada, (conformes, não conformes, neutras), peso)}.
+    """
+    types = {}
+    for name, input_type, options, weight in RESPONSE_TYPES:
+        full_name = f"{name} [{tag}]"
+        db.create_response_type(full_name, [text for text, _ in options], input_type)
+        type_id = _fetch_all("SELECT ID FROM TiposResposta WHERE Nome = ?", full_name)[-1].ID
+        if options:
+            db.update_response_type(type_id, full_name, [{'text': text, 'is_conforme': ok} for text, ok in options])
+        choices = ([text for text, ok in options if ok],
+                   [text for text, ok in options if not ok and text not in db.NEUTRAL_ANSWERS],
+                   [text for text, _ in options if text in db.NEUTRAL_ANSWERS])
+        types[type_id] = (input_type, choices, weight)
+    return types
+
+
+def create_people(rng, args, tag):
+    """Cria setores, coordenadores (com setores atribuídos) e colaboradores. Retorna (setores, colaboradores)."""
+    password_hash = auth.hash_password(tag)
+    sector_ids = []
+    for n in range(args.setores):
+        name = f"{SECTORS[n % len(SECTORS)]} {n // len(SECTORS) + 1} [{tag}]"
+        db.create_sector(name)
+        sector_ids.append(_fetch_all("SELECT ID FROM Setores WHERE Nome = ?", name)[-1].ID)
+
+    coordinators = {}
+    for n in range(args.coordenadores):
+        username = f"{tag}.coordenador{n + 1}"
+        db.create_user(username, password_hash, 'COORDENADOR')
+        coordinator_id = db.get_user_by_username(username).ID
+        # Todo setor tem um coordenador; alguns coordenadores acumulam setores de outros
+        sectors = set(sector_ids[n::args.coordenadores]) | set(rng.sample(sector_ids, min(len(sector_ids), rng.randint(0, 2))))
+        db.update_coordinator_sectors(coordinator_id, sorted(sectors))
+        coordinators[coordinator_id] = sorted(sectors)
+
+    collaborators = []
+    for n in range(args.colaboradores):
+        username = f"{tag}.colaborador{n + 1}"
+        coordinator_id = rng.choice(sorted(coordinators))
+        db.create_user(username, password_hash, 'COLABORADOR', coordinator_id)
+        # Cada colaborador tem o seu nível de conformidade, para os relatórios terem variação
+        collaborators.append({'id': db.get_user_by_username(username).ID, 'sectors': coordinators[coordinator_id],
+                              'level': rng.uniform(0.6, 0.97)})
+    return sector_ids, collaborators
+
+
+def create_checklists(rng, args, tag, sector_ids, response_types):
+    """
+    Cria os checklists (categorias com itens de verificação) e retorna, por setor, a lista
+    de checklists como [(checklist_id, [(componente, [(tipo_id, entrada, opções)])])].
+    """
+    main_types = [type_id for type_id, (_, _, weight) in response_types.items() if weight]
+    weights = [response_types[type_id][2] for type_id in main_types]
+    photo_type = next(type_id for type_id, (input_type, _, _) in response_types.items() if input_type == 'file')
+    extra_types = [type_id for type_id, (input_type, _, _) in response_types.items() if input_type in EXTRA_INPUTS]
+
+    by_sector = {}
+    for n in range(args.checklists):
+        sector_id = rng.choice(sector_ids)
+        title = f"Inspeção {n + 1} - {rng.choice(TOPICS)} [{tag}]"
+        components = []
+        for c in range(max(1, round(rng.gauss(args.categorias, args.categorias / 4)))):
+            sub_items = []
+            for i in range(rng.randint(max(1, args.itens // 2), max(1, args.itens * 3 // 2))):
+                type_ids = rng.choices(main_types, weights)
+                if rng.random() < args.fotos: type_ids.append(photo_type)
+                if rng.random() < 0.1: type_ids.append(rng.choice(extra_types))
+                sub_items.append({'text': f"{rng.choice(TOPICS)}: verificação {c + 1}.{i + 1}", 'response_type_ids': type_ids})
+            components.append({'text': f"{c + 1}. {rng.choice(TOPICS)}", 'type': 'CATEGORIA', 'sub_items': sub_items})
+        if not db.create_flexible_checklist(title, sector_id, components):
+            raise RuntimeError(f"Falha ao criar o checklist '{title}'.")
+        checklist_id = _fetch_all("SELECT ID FROM Checklists WHERE Titulo = ?", title)[-1].ID
+
+        fields = []
+        for category in db.get_flexible_checklist_for_filling(checklist_id)['Componentes']:
+            for item in category['children']:
+                fields.append((item['data'].ID, [(rt['details'].ID, rt['details'].TipoInput, response_types[rt['details'].ID][1])
+                                                  for rt in item['response_types']]))
+        by_sector.setdefault(sector_id, []).append((checklist_id, fields))
+    return by_sector
+
+
+# --- Submissões (em lote) ---
+def _answer(rng, input_type, options, level, when, user_id, component_id, type_id):
+    """Valor de uma resposta: texto, ou lista de fotos para campos de arquivo."""
+    if input_type == 'radio':
+        conforming, non_conforming, neutral = options
+        roll = rng.random()
+        if roll < 0.05 and neutral: return rng.choice(neutral)
+        return rng.choice(conforming) if roll < level else rng.choice(non_conforming)
+    if input_type == 'file':
+        return [f"{user_id}_{component_id}_{type_id}_{rng.getrandbits(32):08x}_foto.jpg" for _ in range(rng.randint(1, 3))]
+    if input_type == 'date':
+        return (when - timedelta(days=rng.randint(0, 90))).date().isoformat()
+    return rng.choice(TEXTS)
+
+
+def _fill(rng, fields, level, when, user_id, previous=None):
+    """
+    Respostas de uma submissão: [(componente, tipo, valor, observação)], com a observação só
+    na primeira resposta do componente, como em database._insert_answers_bulk. Com `previous`
+    (edição de uma versão anterior), cerca de 10% das respostas mudam e o resto é copiado.
+    """
+    if previous is not None:
+        return [(component_id, type_id, _answer(rng, input_type, options, level, when, user_id, component_id, type_id), observation)
+                if rng.random() < 0.1 else (component_id, type_id, value, observation)
+                for (component_id, type_id, value, observation), (input_type, options) in zip(previous, _flat_types(fields))]
+    answers = []
+    for component_id, types in fields:
+        observation = rng.choice(OBSERVATIONS) if rng.random() < 0.1 else None
+        for type_id, input_type, options in types:
+            answers.append((component_id, type_id, _answer(rng, input_type, options, level, when, user_id, component_id, type_id), observation))
+            observation = None
+    return answers
+
+
+def _flat_types(fields):
+    return [(input_type, options) for _, types in fields for _, input_type, options in types]
+
+
+def _next_ids(conn):
+    cursor = conn.cursor()
+    ids = {}
+    for table in ('Submissoes', 'Respostas', 'FotosResposta'):
+        cursor.execute(f"SELECT COALESCE(MAX(ID), 0) FROM {table}")
+        ids[table] = cursor.fetchone()[0] + 1
+    return ids
+
+
+def _insert_batch(conn, submissions, answers, photos):
+    cursor = conn.cursor()
+    cursor.fast_executemany = True  # pyodbc: envia todas as linhas de cada tabela numa só ida ao servidor
+    # As versões mais novas primeiro: SubstituidaPorID sempre aponta para uma linha já gravada
+    tables = (('Submissoes', SUBMISSION_COLUMNS, submissions[::-1]),
+              ('Respostas', ANSWER_COLUMNS, answers),
+              ('FotosResposta', PHOTO_COLUMNS, photos))
+    for table, columns, rows in tables:
+        if not rows: continue
+        cursor.execute(f"SET IDENTITY_INSERT {table} ON")
+        cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+        cursor.execute(f"SET IDENTITY_INSERT {table} OFF")
+    db._store_submission_scores(cursor, [row[0] for row in submissions])
+    conn.commit()
+
+
+def generate_submissions(rng, args, collaborators, checklists_by_sector):
+    """Grava as submissões em ordem cronológica, em transações de ~args.lote submissões. Retorna os totais."""
+    for person in collaborators:
+        person['checklists'] = [checklist for sector_id in person['sectors'] for checklist in checklists_by_sector.get(sector_id, [])]
+    people = [person for person in collaborators if person['checklists']]
+    if not people:
+        raise RuntimeError("Nenhum colaborador tem checklists nos setores do seu coordenador.")
+
+    # Instantes das submissões, entre 7h e 18h, distribuídos pelos últimos args.anos anos
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=round(365 * args.anos))
+    moments = sorted(rng.randrange(round(365 * args.anos)) * 86400 + 25200 + rng.random() * 39600 for _ in range(args.submissoes))
+    moments = [start + timedelta(seconds=int(seconds)) for seconds in moments]
+
+    conn = db.get_connection()
+    totals = {'submissoes': 0, 'respostas': 0, 'fotos': 0}
+    try:
+        next_id = _next_ids(conn)
+        submissions, answers, photos = [], [], []
+        position, started = 0, time.perf_counter()
+        while position < len(moments):
+            person = rng.choice(people)
+            checklist_id, fields = rng.choice(person['checklists'])
+            worker, manager = _person(rng), _person(rng)
+            versions = 1 + (rng.randint(1, 3) if rng.random() < args.edicoes else 0)
+            last_status = 'Rascunho' if rng.random() < args.rascunhos else 'Ativa'
+            values = None
+            for version in range(min(versions, len(moments) - position)):
+                submission_id, when = next_id['Submissoes'], moments[position]
+                next_id['Submissoes'] += 1
+                position += 1
+                is_last = version == versions - 1 or position == len(moments)
+                values = _fill(rng, fields, person['level'], when, person['id'], values)
+                submissions.append((submission_id, checklist_id, person['id'], when, worker, manager,
+                                    last_status if is_last else 'Arquivada', None if is_last else submission_id + 1))
+                for component_id, type_id, value, observation in values:
+                    answer_id = next_id['Respostas']
+                    next_id['Respostas'] += 1
+                    if isinstance(value, list):
+                        for photo in value:
+                            photos.append((next_id['FotosResposta'], answer_id, photo))
+                            next_id['FotosResposta'] += 1
+                        value = f"{len(value)} foto(s) anexada(s)"
+                    answers.append((answer_id, submission_id, component_id, type_id, value, observation))
+
+            if len(submissions) >= args.lote or position == len(moments):
+                _insert_batch(conn, submissions, answers, photos)
+                totals['submissoes'] += len(submissions)
+                totals['respostas'] += len(answers)
+                totals['fotos'] += len(photos)
+                submissions, answers, photos = [], [], []
+                elapsed = time.perf_counter() - started
+                print(f"  {totals['submissoes']}/{len(moments)} submissões, {totals['respostas']} respostas "
+                      f"({totals['respostas'] / elapsed:,.0f} respostas/s)")
+        return totals
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos no formato dos de produção.")
+    parser.add_argument('--semente', type=int, default=42, help="Semente do gerador; a mesma semente gera os mesmos dados (padrão: 42).")
+    parser.add_argument('--setores', type=int, default=12)
+    parser.add_argument('--coordenadores', type=int, default=6)
+    parser.add_argument('--colaboradores', type=int, default=80)
+    parser.add_argument('--checklists', type=int, default=40)
+    parser.add_argument('--categorias', type=int, default=5, help="Categorias por checklist, em média (padrão: 5).")
+    parser.add_argument('--itens', type=int, default=8, help="Itens de verificação por categoria, em média (padrão: 8).")
+    parser.add_argument('--fotos', type=float, default=0.15, help="Fração dos itens com campo de foto (padrão: 0.15).")
+    parser.add_argument('--submissoes', type=int, default=20000, help="Submissões gravadas, incluindo versões arquivadas (padrão: 20000).")
+    parser.add_argument('--anos', type=float, default=3, help="Anos de histórico (padrão: 3).")
+    parser.add_argument('--edicoes', type=float, default=0.1, help="Fração das submissões editadas depois de enviadas (padrão: 0.1).")
+    parser.add_argument('--rascunhos', type=float, default=0.03, help="Fração das submissões que ficam como rascunho (padrão: 0.03).")
+    parser.add_argument('--lote', type=int, default=1000, help="Submissões por transação (padrão: 1000).")
+    args = parser.parse_args()
+
+    rng = random.Random(args.semente)
+    tag = f"sint{args.semente}"
+    if db.get_user_by_username(f"{tag}.coordenador1"):
+        print(f"Os dados da semente {args.semente} já existem neste banco. Use outra semente.")
+        return
+
+    started = time.perf_counter()
+    print(f"--- Cadastro ({tag}) ---")
+    response_types = create_response_types(tag)
+    sector_ids, collaborators = create_people(rng, args, tag)
+    checklists = create_checklists(rng, args, tag, sector_ids, response_types)
+    print(f"  {len(sector_ids)} setores, {args.coordenadores} coordenadores, {len(collaborators)} colaboradores, "
+          f"{args.checklists} checklists, {len(response_types)} tipos de resposta")
+
+    print("--- Submissões ---")
+    totals = generate_submissions(rng, args, collaborators, checklists)
+    print("--- Resumo diário de conformidade ---")
+    print(f"  {db.rebuild_compliance_summary()} linhas")
+    print(f"Concluído em {time.perf_counter() - started:.1f} s: {totals['submissoes']} submissões, "
+          f"{totals['respostas']} respostas, {totals['fotos']} fotos.")
+
+
+if __name__ == '__main__':
+    main()
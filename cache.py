@@ -0,0 +1,71 @@
+# cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Cache LRU em memória, com limite de tamanho e tempo de vida por entrada.
+
+    Cada invalidação incrementa uma geração: um valor carregado do banco antes de
+    uma invalidação não é gravado no cache, evitando reintroduzir dados antigos
+    quando uma leitura concorre com uma escrita.
+    """
+
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_load(self, key, loader):
+        """Retorna o valor em cache ou chama loader() e guarda o resultado (se não for None)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self._misses += 1
+            generation = self._generation
+
+        value = loader()
+        if value is None: return value
+
+        with self._lock:
+            if generation == self._generation:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.max_entries:
+                    self._data.popitem(last=False)
+                    self._evictions += 1
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {'hits': self._hits, 'misses': self._misses,
+                    'hit_ratio': self._hits / lookups if lookups else 0.0,
+                    'size': len(self._data), 'max_entries': self.max_entries, 'ttl': self.ttl,
+                    'evictions': self._evictions, 'invalidations': self._invalidations}
@@ -1,4 +1,9 @@
 # config.py
+import os
+
+# Banco usado por database.py: 'sqlserver' (produção, DB_CONFIG) ou 'sqlite' (arquivo local,
+# SQLITE_CONFIG), para benchmarks e testes fora da rede. Pode ser trocado pela variável de ambiente.
+DB_BACKEND = os.environ.get('CHECKLIST_DB_BACKEND', 'sqlserver')
 
 DB_CONFIG = {
     'driver': '{ODBC Driver 18 for SQL Server}',
@@ -10,4 +15,85 @@ DB_CONFIG = {
     
     # ADICIONE ESTA LINHA:
     'Encrypt': 'no'
-}
\ No newline at end of file
+}
+
+SQLITE_CONFIG = {
+    'path': os.environ.get('CHECKLIST_SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'checklist_local.db')),
+    'busy_timeout': 10,  # segundos esperando o lock de escrita de outra conexão
+}
+
+# Pool de conexões usado por database.get_connection()
+DB_POOL_CONFIG = {
+    'max_size': 20,               # conexões abertas no máximo
+    'timeout': 10,                # segundos esperando uma conexão livre
+    'max_idle': 300,              # fecha conexões ociosas há mais de 5 minutos
+    'max_lifetime': 3600,         # recicla conexões com mais de 1 hora
+    'health_check_interval': 30,  # testa com 'SELECT 1' conexões paradas há mais de 30s
+    'thread_affinity': False,     # True: cada thread reaproveita a última conexão que usou
+}
+
+# Cache em memória da estrutura dos checklists (formulários de preenchimento e edição)
+CHECKLIST_CACHE_CONFIG = {
+    'max_entries': 256,  # checklists mantidos em memória
+    'ttl': 600,          # segundos até uma entrada expirar
+}
+
+# Cache em memória das listas dos filtros de /reports (checklists, usuários e perguntas), por coordenador
+REPORT_FILTERS_CACHE_CONFIG = {
+    'max_entries': 512,  # coordenadores mantidos em memória
+    'ttl': 300,          # segundos até uma entrada expirar
+}
+
+# Instrumentação das consultas (instrumentation.py)
+QUERY_LOG_CONFIG = {
+    'enabled': True,          # cronometra cada consulta e conta as consultas por requisição
+    'slow_query_ms': 500,     # consultas mais demoradas que isso vão para o log de consultas lentas
+    'slow_query_log': None,   # arquivo do log de consultas lentas (None: só o logger 'checklist.sql')
+    'request_header': True,   # envia o resumo no cabeçalho Server-Timing de cada resposta
+    'log_requests': False,    # registra uma linha por requisição com o número de consultas e o tempo no banco
+}
+
+# Endpoint /metrics (formato Prometheus). O coletor se identifica com o token, no cabeçalho
+# "Authorization: Bearer <token>" (no Prometheus: authorization.credentials). Sem token
+# configurado, só usuários logados leem /metrics. O endereço de origem sozinho não basta:
+# atrás de um proxy na mesma máquina, todas as requisições chegam de 127.0.0.1.
+METRICS_CONFIG = {
+    'enabled': True,
+    'token': os.environ.get('CHECKLIST_METRICS_TOKEN'),
+    'allowed_ips': [],   # se preenchida, o token também só vale a partir destes IPs
+}
+
+# Tratamento das fotos enviadas (images.py). Precisa do Pillow; sem ele as fotos são gravadas como chegam.
+IMAGE_CONFIG = {
+    'enabled': True,
+    'format': 'WEBP',            # formato gravado: 'WEBP' ou 'JPEG' (progressivo)
+    'quality': 80,               # qualidade da compressão (1-95)
+    'max_edge': 1600,            # maior lado da foto gravada, em pixels
+    'max_pixels': 50_000_000,    # imagens maiores são recusadas (proteção contra "bombas" de descompressão)
+    'variants': {                # miniaturas usadas pelas telas: nome -> (lado em pixels, recortar em quadrado)
+        'mini': (200, True),     # relatórios e cartões de item (40 e 100 px na tela)
+        'medio': (500, False),   # detalhes da submissão (até 250 px na tela)
+    },
+}
+
+# Processamento das fotos em segundo plano (photo_worker.py); a fila durável é a tabela FilaFotos
+PHOTO_WORKER_CONFIG = {
+    'workers': 2,            # threads de processamento (0: as fotos são processadas na própria requisição)
+    'queue_size': 200,       # jobs na fila em memória; os que não couberem esperam na tabela
+    'poll_interval': 30,     # segundos entre as varreduras da tabela (jobs represados, repetições, reinícios)
+    'max_attempts': 3,       # tentativas antes de um job ser marcado como 'Falhou'
+    'stale_after': 600,      # um job 'Processando' há mais tempo que isso (processo caiu) volta para a fila
+    'keep_days': 7,          # dias até os jobs concluídos serem apagados da tabela
+    'unreferenced_grace': 3600,  # segundos que um arquivo sem referências em FotosResposta espera antes de ser apagado
+}
+
+# Entrega das fotos (/uploads e /photo_variants). Os nomes gravados nunca mudam de conteúdo,
+# então o navegador guarda as fotos por 'max_age' segundos sem perguntar de novo ao servidor.
+# Com 'offload', o Flask só confere o login e o proxy da frente envia o arquivo:
+#   'x-accel-redirect' (nginx): location /_uploads/ { internal; alias /caminho/do/app/uploads/; }
+#   'x-sendfile' (Apache com mod_xsendfile, lighttpd)
+UPLOADS_CONFIG = {
+    'max_age': 365 * 24 * 3600,
+    'offload': None,              # None: o próprio Flask lê o arquivo
+    'accel_prefix': '/_uploads/', # location interna do nginx, no modo 'x-accel-redirect'
+}
@@ -1,17 +1,132 @@
 # database.py
-import pyodbc
-from config import DB_CONFIG
+from config import (DB_BACKEND, DB_CONFIG, SQLITE_CONFIG, DB_POOL_CONFIG, CHECKLIST_CACHE_CONFIG,
+                    REPORT_FILTERS_CACHE_CONFIG, QUERY_LOG_CONFIG)
+from pool import ConnectionPool, PoolTimeout
+from cache import TTLCache
+import backends
+import migrations
+import instrumentation
+
+# SQL Server (produção) ou SQLite (banco local); ver backends.py
+_backend = backends.get_backend(DB_BACKEND, DB_CONFIG, SQLITE_CONFIG)
+BACKEND = _backend.name
+
+# Pool único do processo: as funções abaixo continuam chamando get_connection()/conn.close(),
+# mas close() apenas devolve a conexão ao pool.
+_pool = ConnectionPool(_backend.connect, **DB_POOL_CONFIG)
+
+# Estrutura montada dos checklists, por ID. Invalidada pelas funções que alteram
+# checklists ou tipos de resposta. Os valores são compartilhados: não os altere.
+_checklist_cache = TTLCache(**CHECKLIST_CACHE_CONFIG)
+
+# Listas dos filtros de /reports, por coordenador. Invalidadas pelas funções que alteram
+# checklists, usuários ou os setores dos coordenadores. Os valores também são compartilhados.
+_report_filters_cache = TTLCache(**REPORT_FILTERS_CACHE_CONFIG)
+
+# Tempo, linhas e origem de cada consulta; ver instrumentation.py
+instrumentation.configure(**QUERY_LOG_CONFIG)
 
 # --- Funções de Conexão e de Usuário/Setor ---
 def get_connection():
     try:
-        conn_str = ';'.join([f'{k}={v}' for k, v in DB_CONFIG.items()])
-        conn = pyodbc.connect(conn_str)
-        return conn
-    except pyodbc.Error as ex:
+        return instrumentation.instrument_connection(_pool.acquire())
+    except _backend.Error as ex:
         sqlstate = ex.args[0]
         print(f"Erro de Conexão com o Banco de Dados: {sqlstate}")
         return None
+    except PoolTimeout as ex:
+        print(f"Erro de Conexão com o Banco de Dados: {ex}")
+        return None
+
+def get_pool_stats():
+    """Retorna os contadores do pool de conexões (abertas, ociosas, em uso, falhas...)."""
+    return _pool.stats()
+
+def get_checklist_cache_stats():
+    """Retorna acertos, faltas e ocupação do cache de estrutura dos checklists."""
+    return _checklist_cache.stats()
+
+def get_report_filters_cache_stats():
+    """Retorna acertos, faltas e ocupação do cache das listas de filtros dos relatórios."""
+    return _report_filters_cache.stats()
+
+def apply_migrations(target=None, log=print):
+    """Aplica as migrações de esquema pendentes (ver migrations.py). Retorna as versões aplicadas ou None em caso de erro."""
+    conn = get_connection()
+    if not conn: return None
+    try:
+        return migrations.migrate(conn, target, log, dialect=BACKEND)
+    except Exception as e:
+        print(f"Erro ao aplicar as migrações: {e}")
+        return None
+    finally:
+        conn.close()
+
+def check_schema():
+    """
+    Confere, na inicialização da aplicação, que não há migrações pendentes: as gravações e
+    consultas dependem das tabelas e colunas criadas por elas (placar, resumo diário, fila de
+    fotos...). Não altera o esquema; aplicar as migrações é um passo do operador
+    ('python manutencao.py migrar'). Levanta RuntimeError se o esquema estiver desatualizado.
+    """
+    conn = get_connection()
+    if not conn: raise RuntimeError("Não foi possível conectar ao banco para conferir o esquema.")
+    try:
+        pending = migrations.pending_migrations(conn, dialect=BACKEND)
+    except Exception as e:
+        raise RuntimeError(f"Não foi possível conferir o esquema do banco ({e}). Rode 'python manutencao.py migrar --status'.")
+    finally:
+        conn.close()
+    if pending:
+        versions = ', '.join(f"{version:03d}" for version, _, _ in pending)
+        raise RuntimeError(f"O banco tem migrações pendentes ({versions}). Rode 'python manutencao.py migrar' antes de iniciar a aplicação.")
+
+def get_migration_status():
+    """Lista (versão, descrição, data de aplicação ou None) de todas as migrações conhecidas."""
+    conn = get_connection()
+    if not conn: return None
+    try:
+        applied = migrations.applied_versions(conn, dialect=BACKEND)
+        return [(version, description, applied.get(version)) for version, description, _ in migrations.MIGRATIONS]
+    finally:
+        conn.close()
+
+def _fetch_page(cursor, select, from_, conditions, params, order_by, page, per_page, seek=None):
+    """
+    Conta o total de linhas e busca uma única página com OFFSET/FETCH, para que apenas
+    `per_page` linhas trafeguem do banco. Com `seek=(condição, parâmetros)` a página começa
+    logo após a chave informada (paginação por chave), sem percorrer as linhas anteriores.
+    Retorna (linhas, total).
+    """
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    cursor.execute(f"SELECT COUNT(*) FROM {from_}{where}", params)
+    total = cursor.fetchone()[0]
+
+    if seek:
+        seek_condition, seek_params = seek
+        where = f" WHERE {' AND '.join([*conditions, seek_condition])}"
+        params, offset = [*params, *seek_params], 0
+    else:
+        offset = (max(page, 1) - 1) * per_page
+    cursor.execute(f"SELECT {select} FROM {from_}{where} ORDER BY {order_by} OFFSET ? ROWS FETCH NEXT ? ROWS ONLY",
+                   [*params, offset, per_page])
+    return cursor.fetchall(), total
+
+# Chave de paginação das listas de submissões: (DataSubmissao, ID) decrescentes,
+# a partir do ID da última submissão exibida na página anterior.
+_SUBMISSION_SEEK = """(sub.DataSubmissao < (SELECT DataSubmissao FROM Submissoes WHERE ID = ?)
+    OR (sub.DataSubmissao = (SELECT DataSubmissao FROM Submissoes WHERE ID = ?) AND sub.ID < ?))"""
+
+def _submission_seek(cursor, after_id):
+    """
+    Paginação por chave a partir da submissão after_id, para _fetch_page. None (volta ao OFFSET
+    da página pedida) se não houver chave ou se a submissão foi apagada depois de a página
+    anterior ser exibida: sem ela, a condição não retornaria nenhuma linha.
+    """
+    if not after_id: return None
+    cursor.execute("SELECT ID FROM Submissoes WHERE ID = ?", after_id)
+    if not cursor.fetchone(): return None
+    return _SUBMISSION_SEEK, [after_id, after_id, after_id]
 
 def get_user_by_username(username):
     conn = get_connection()
@@ -31,8 +146,9 @@ def create_user(username, password_hash, role, coordinator_id=None):
         query = "INSERT INTO Usuarios (NomeUsuario, SenhaHash, Papel, CoordenadorID) VALUES (?, ?, ?, ?)"
         cursor.execute(query, username, password_hash, role, coordinator_id)
         conn.commit()
+        _report_filters_cache.clear()
         return True
-    except pyodbc.IntegrityError: return False
+    except _backend.IntegrityError: return False
     finally: conn.close()
     
 def get_user_by_id(user_id):
@@ -53,6 +169,8 @@ def update_user_info(user_id, username, role, coordinator_id):
         query = "UPDATE Usuarios SET NomeUsuario = ?, Papel = ?, CoordenadorID = ? WHERE ID = ?"
         cursor.execute(query, username, role, coordinator_id, user_id)
         conn.commit()
+        # O usuário pode ter saído da lista de um coordenador e entrado na de outro
+        _report_filters_cache.clear()
         return True
     except Exception as e:
         print(f"Erro ao atualizar usuário: {e}")
@@ -132,6 +250,7 @@ def update_coordinator_sectors(coordinator_id, sector_ids):
             for sector_id in sector_ids:
                 cursor.execute("INSERT INTO Coordenadores_Setores (UsuarioID, SetorID) VALUES (?, ?)", coordinator_id, sector_id)
         conn.commit()
+        _report_filters_cache.invalidate(int(coordinator_id))
         return True
     except Exception as e:
         conn.rollback()
@@ -147,7 +266,7 @@ def create_sector(sector_name):
         cursor.execute(query, sector_name)
         conn.commit()
         return True
-    except pyodbc.IntegrityError: return False
+    except _backend.IntegrityError: return False
     finally: conn.close()
 
 
@@ -185,6 +304,15 @@ def get_all_response_types():
     conn.close()
     return rows
 
+def get_response_types_page(page=1, per_page=10):
+    """Uma página dos tipos de resposta, ordenados por nome. Retorna (linhas, total)."""
+    conn = get_connection()
+    if not conn: return [], 0
+    cursor = conn.cursor()
+    rows, total = _fetch_page(cursor, "ID, Nome, TipoInput", "TiposResposta", [], [], "Nome, ID", page, per_page)
+    conn.close()
+    return rows, total
+
 def delete_response_type(response_type_id):
     """
     Apaga um tipo de resposta e todas as suas dependências (opções, associações
@@ -200,7 +328,11 @@ def delete_response_type(response_type_id):
 
         # Passo 1: Apagar as respostas JÁ ENVIADAS que usam este TipoRespostaID.
         # Esta é a dependência que estava causando o erro persistente.
-        cursor.execute("DELETE FROM Respostas WHERE TipoRespostaID = ?", response_type_id)
+        # O placar e o resumo diário das submissões afetadas são recalculados em seguida.
+        cursor.execute("SELECT DISTINCT SubmissaoID FROM Respostas WHERE TipoRespostaID = ?", response_type_id)
+        affected_ids = [row.SubmissaoID for row in cursor.fetchall()]
+        _rescore_submissions(cursor, affected_ids,
+                             lambda: cursor.execute("DELETE FROM Respostas WHERE TipoRespostaID = ?", response_type_id))
 
         # Passo 2: Apagar as associações na tabela 'Componente_TiposResposta'.
         # Isso desconecta o tipo de resposta dos modelos de checklist.
@@ -216,6 +348,8 @@ def delete_response_type(response_type_id):
 
         # Se todos os comandos foram bem-sucedidos, salva as alterações no banco.
         conn.commit()
+        # Tipos de resposta são compartilhados entre checklists: descarta o cache inteiro
+        _checklist_cache.clear()
         return True
     except Exception as e:
         # Se ocorrer qualquer erro, desfaz todas as alterações.
@@ -253,6 +387,8 @@ def create_flexible_checklist(title, sector_id, components_data):
                         for rt_id in sub_item['response_type_ids']:
                             cursor.execute("INSERT INTO Componente_TiposResposta (ComponenteID, TipoRespostaID) VALUES (?, ?)", sub_item_id, rt_id)
         conn.commit()
+        # Todos os coordenadores do setor passam a ver o checklist e as suas perguntas
+        _report_filters_cache.clear()
         return True
     except Exception as e:
         print(f"Erro ao criar checklist flexível: {e}")
@@ -315,6 +451,8 @@ def update_flexible_checklist(checklist_id, title, sector_id, components_data):
                             cursor.execute("INSERT INTO Componente_TiposResposta (ComponenteID, TipoRespostaID) VALUES (?, ?)", sub_item_id, rt_id)
         
         conn.commit()
+        _checklist_cache.invalidate(int(checklist_id))
+        _report_filters_cache.clear()
         return True, "Checklist atualizado com sucesso!"
     except Exception as e:
         print(f"Erro ao atualizar checklist: {e}")
@@ -345,7 +483,10 @@ def get_response_type_by_id(type_id):
     return {'details': response_type, 'options': options}
 
 def update_response_type(type_id, name, options):
-    """Atualiza um tipo de resposta (nome e opções)."""
+    """
+    Atualiza um tipo de resposta (nome e opções). O placar das submissões que usam o tipo
+    não é recalculado aqui (podem ser todas): veja rescore_submissions_with_type.
+    """
     conn = get_connection()
     if not conn: return False
     cursor = conn.cursor()
@@ -366,6 +507,7 @@ def update_response_type(type_id, name, options):
             )
         
         conn.commit()
+        _checklist_cache.clear()
         return True
     except Exception as e:
         print(f"Erro ao atualizar tipo de resposta: {e}")
@@ -375,44 +517,457 @@ def update_response_type(type_id, name, options):
         conn.close()
 
 def get_flexible_checklist_for_filling(checklist_id):
+    """Retorna a árvore de componentes de um checklist, servida do cache quando possível."""
+    return _checklist_cache.get_or_load(int(checklist_id), lambda: _load_flexible_checklist(checklist_id))
+
+def _load_flexible_checklist(checklist_id):
+    """
+    Monta a árvore de componentes de um checklist, com seus tipos de resposta e opções.
+    Usa um número fixo de consultas (cabeçalho, componentes, tipos, opções),
+    independente da quantidade de itens do checklist.
+    """
     conn = get_connection()
     if not conn: return None
-    cursor_title = conn.cursor()
-    cursor_title.execute("SELECT Titulo, SetorID FROM Checklists WHERE ID = ?", checklist_id)
-    checklist_row = cursor_title.fetchone()
-    if not checklist_row: return None
+    cursor = conn.cursor()
+    cursor.execute("SELECT Titulo, SetorID FROM Checklists WHERE ID = ?", checklist_id)
+    checklist_row = cursor.fetchone()
+    if not checklist_row:
+        conn.close()
+        return None
     checklist_data = {'ID': checklist_id, 'Titulo': checklist_row.Titulo, 'Componentes': []}
-    cursor_comps = conn.cursor()
+
     query_components = "SELECT ID, ParentID, TextoComponente, TipoComponente, Instrucao FROM ComponentesChecklist WHERE ChecklistID = ? ORDER BY Ordem, ParentID, ID"
-    cursor_comps.execute(query_components, checklist_id)
-    all_components = cursor_comps.fetchall()
+    cursor.execute(query_components, checklist_id)
+    all_components = cursor.fetchall()
+
+    # Tipos de resposta de TODOS os componentes do checklist numa única consulta
+    query_rt = """
+        SELECT ctr.ComponenteID, tr.ID, tr.Nome, tr.TipoInput
+        FROM Componente_TiposResposta ctr
+        JOIN ComponentesChecklist comp ON comp.ID = ctr.ComponenteID
+        JOIN TiposResposta tr ON tr.ID = ctr.TipoRespostaID
+        WHERE comp.ChecklistID = ?
+        ORDER BY ctr.ComponenteID, tr.ID
+    """
+    cursor.execute(query_rt, checklist_id)
+    all_response_types = cursor.fetchall()
+
+    # Opções de todos os tipos de múltipla escolha usados pelo checklist
+    query_options = """
+        SELECT op.TipoRespostaID, op.TextoOpcao
+        FROM OpcoesResposta op
+        JOIN TiposResposta tr ON tr.ID = op.TipoRespostaID
+        WHERE tr.TipoInput = 'radio'
+        AND op.TipoRespostaID IN (
+            SELECT ctr.TipoRespostaID
+            FROM Componente_TiposResposta ctr
+            JOIN ComponentesChecklist comp ON comp.ID = ctr.ComponenteID
+            WHERE comp.ChecklistID = ?
+        )
+        ORDER BY op.TipoRespostaID, op.ID
+    """
+    cursor.execute(query_options, checklist_id)
+    options_by_type = {}
+    for row in cursor.fetchall():
+        options_by_type.setdefault(row.TipoRespostaID, []).append(row.TextoOpcao)
+    conn.close()
+
+    response_types_by_component = {}
+    for rt in all_response_types:
+        response_types_by_component.setdefault(rt.ComponenteID, []).append(
+            {'details': rt, 'options': list(options_by_type.get(rt.ID, []))})
+
     component_map = {}
     for comp in all_components:
-        cursor_rt = conn.cursor()
-        query_rt = "SELECT tr.ID, tr.Nome, tr.TipoInput FROM TiposResposta tr JOIN Componente_TiposResposta ctr ON tr.ID = ctr.TipoRespostaID WHERE ctr.ComponenteID = ? ORDER BY tr.ID"
-        cursor_rt.execute(query_rt, comp.ID)
-        response_types = cursor_rt.fetchall()
-        response_types_with_options = []
-        for rt in response_types:
-            options = []
-            if rt.TipoInput == 'radio':
-                cursor_options = conn.cursor()
-                cursor_options.execute("SELECT TextoOpcao FROM OpcoesResposta WHERE TipoRespostaID = ?", rt.ID)
-                options = [row.TextoOpcao for row in cursor_options.fetchall()]
-            response_types_with_options.append({'details': rt, 'options': options})
-        component_map[comp.ID] = {'data': comp, 'children': [], 'response_types': response_types_with_options}
+        component_map[comp.ID] = {'data': comp, 'children': [], 'response_types': response_types_by_component.get(comp.ID, [])}
     structured_list = []
-    for comp_data in list(component_map.values()):
+    for comp_data in component_map.values():
         parent_id = comp_data['data'].ParentID
         if parent_id and parent_id in component_map:
             component_map[parent_id]['children'].append(comp_data)
         else:
             structured_list.append(comp_data)
     checklist_data['Componentes'] = structured_list
-    conn.close()
     return checklist_data
 
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+# Máximo de IDs por cláusula IN, para ficar abaixo do limite de 2100 parâmetros
+_IDS_PER_STATEMENT = 1000
+
+# --- Placar de Conformidade ---
+# Respostas neutras: não entram no cálculo de conformidade, só no total de "não se aplica"
+NEUTRAL_ANSWERS = ('Não se Aplica', 'N/A')
+
+# Somas do placar por submissão. Espera os aliases 'r' (Respostas) e 'op' (OpcoesResposta)
+# e recebe _SCORE_SUMS_PARAMS como parâmetros, nesta ordem.
+_NEUTRAL_PLACEHOLDERS = ', '.join('?' * len(NEUTRAL_ANSWERS))
+_SCORE_SUMS = f"""
+    SUM(CASE WHEN op.IsConforme IS NOT NULL AND r.Resposta NOT IN ({_NEUTRAL_PLACEHOLDERS}) THEN 1 ELSE 0 END) AS TotalAuditavel,
+    SUM(CASE WHEN op.IsConforme = 1 AND r.Resposta NOT IN ({_NEUTRAL_PLACEHOLDERS}) THEN 1 ELSE 0 END) AS TotalConforme,
+    SUM(CASE WHEN r.Resposta IN ({_NEUTRAL_PLACEHOLDERS}) THEN 1 ELSE 0 END) AS TotalNaoAplicavel
+"""
+_SCORE_SUMS_PARAMS = [*NEUTRAL_ANSWERS] * 3
+
+def _store_submission_scores(cursor, submission_ids):
+    """Recalcula e grava em Submissoes o placar de conformidade das submissões informadas."""
+    for chunk in _chunks(list(submission_ids), _IDS_PER_STATEMENT):
+        _store_submission_scores_chunk(cursor, chunk)
+
+def _store_submission_scores_chunk(cursor, submission_ids):
+    placeholders = ', '.join('?' * len(submission_ids))
+    cursor.execute(f"""
+        UPDATE Submissoes SET
+            TotalAuditavel = p.TotalAuditavel,
+            TotalConforme = p.TotalConforme,
+            TotalNaoConforme = p.TotalAuditavel - p.TotalConforme,
+            TotalNaoAplicavel = p.TotalNaoAplicavel,
+            PercentualConformidade = CASE WHEN p.TotalAuditavel > 0 THEN p.TotalConforme * 100.0 / p.TotalAuditavel
+                                          WHEN p.TotalNaoAplicavel > 0 THEN 100 END
+        FROM (
+            SELECT sub.ID AS SubmissaoID, {_SCORE_SUMS}
+            FROM Submissoes sub
+            LEFT JOIN Respostas r ON r.SubmissaoID = sub.ID
+            LEFT JOIN OpcoesResposta op ON op.TipoRespostaID = r.TipoRespostaID AND op.TextoOpcao = r.Resposta
+            WHERE sub.ID IN ({placeholders})
+            GROUP BY sub.ID
+        ) AS p
+        WHERE p.SubmissaoID = Submissoes.ID
+    """, [*_SCORE_SUMS_PARAMS, *submission_ids])
+
+# --- Resumo Diário de Conformidade ---
+# ResumoConformidadeDiario guarda, por dia × checklist × colaborador, a soma dos placares
+# das submissões ATIVAS. É mantido no mesmo commit de cada escrita: antes de alterar uma
+# submissão subtrai-se a contribuição dela (sign=-1) e, depois, soma-se a nova (sign=1).
+def _apply_summary_delta(cursor, submission_ids, sign):
+    """Soma (sign=1) ou subtrai (sign=-1) do resumo diário a contribuição das submissões ativas informadas."""
+    for chunk in _chunks(list(submission_ids), _IDS_PER_STATEMENT):
+        placeholders = ', '.join('?' * len(chunk))
+        delta = f"""
+            SELECT CAST(DataSubmissao AS DATE) AS Dia, ChecklistID, UsuarioID,
+                COUNT(*) * ? AS TotalSubmissoes,
+                COALESCE(SUM(TotalAuditavel), 0) * ? AS TotalAuditavel,
+                COALESCE(SUM(TotalConforme), 0) * ? AS TotalConforme,
+                COALESCE(SUM(TotalNaoConforme), 0) * ? AS TotalNaoConforme,
+                COALESCE(SUM(TotalNaoAplicavel), 0) * ? AS TotalNaoAplicavel
+            FROM Submissoes
+            WHERE ID IN ({placeholders}) AND Status = 'Ativa'
+            GROUP BY CAST(DataSubmissao AS DATE), ChecklistID, UsuarioID
+        """
+        if BACKEND == 'sqlite':
+            # Sem MERGE no SQLite: upsert e, em seguida, remove as linhas que zeraram
+            cursor.execute(f"""
+                INSERT INTO ResumoConformidadeDiario (Dia, ChecklistID, UsuarioID, TotalSubmissoes, TotalAuditavel, TotalConforme, TotalNaoConforme, TotalNaoAplicavel)
+                {delta}
+                ON CONFLICT (Dia, ChecklistID, UsuarioID) DO UPDATE SET
+                    TotalSubmissoes = TotalSubmissoes + excluded.TotalSubmissoes,
+                    TotalAuditavel = TotalAuditavel + excluded.TotalAuditavel,
+                    TotalConforme = TotalConforme + excluded.TotalConforme,
+                    TotalNaoConforme = TotalNaoConforme + excluded.TotalNaoConforme,
+                    TotalNaoAplicavel = TotalNaoAplicavel + excluded.TotalNaoAplicavel
+            """, [sign] * 5 + list(chunk))
+            cursor.execute("DELETE FROM ResumoConformidadeDiario WHERE TotalSubmissoes <= 0")
+            continue
+        cursor.execute(f"""
+            MERGE ResumoConformidadeDiario WITH (HOLDLOCK) AS destino
+            USING ({delta}) AS origem
+            ON destino.Dia = origem.Dia AND destino.ChecklistID = origem.ChecklistID AND destino.UsuarioID = origem.UsuarioID
+            WHEN MATCHED AND destino.TotalSubmissoes + origem.TotalSubmissoes <= 0 THEN DELETE
+            WHEN MATCHED THEN UPDATE SET
+                TotalSubmissoes = destino.TotalSubmissoes + origem.TotalSubmissoes,
+                TotalAuditavel = destino.TotalAuditavel + origem.TotalAuditavel,
+                TotalConforme = destino.TotalConforme + origem.TotalConforme,
+                TotalNaoConforme = destino.TotalNaoConforme + origem.TotalNaoConforme,
+                TotalNaoAplicavel = destino.TotalNaoAplicavel + origem.TotalNaoAplicavel
+            WHEN NOT MATCHED AND origem.TotalSubmissoes > 0 THEN
+                INSERT (Dia, ChecklistID, UsuarioID, TotalSubmissoes, TotalAuditavel, TotalConforme, TotalNaoConforme, TotalNaoAplicavel)
+                VALUES (origem.Dia, origem.ChecklistID, origem.UsuarioID, origem.TotalSubmissoes, origem.TotalAuditavel,
+                        origem.TotalConforme, origem.TotalNaoConforme, origem.TotalNaoAplicavel);
+        """, [sign] * 5 + list(chunk))
+
+def _rescore_submissions(cursor, submission_ids, change):
+    """
+    Executa `change()` (que altera respostas ou opções dessas submissões) mantendo o placar
+    gravado e o resumo diário coerentes: tira a contribuição antiga, aplica a alteração,
+    recalcula o placar e soma a nova contribuição.
+    """
+    _apply_summary_delta(cursor, submission_ids, -1)
+    change()
+    _store_submission_scores(cursor, submission_ids)
+    _apply_summary_delta(cursor, submission_ids, 1)
+
+def rebuild_compliance_summary():
+    """Recria todo o resumo diário a partir dos placares gravados em Submissoes. Retorna o número de linhas."""
+    conn = get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM ResumoConformidadeDiario")
+        cursor.execute("""
+            INSERT INTO ResumoConformidadeDiario (Dia, ChecklistID, UsuarioID, TotalSubmissoes, TotalAuditavel, TotalConforme, TotalNaoConforme, TotalNaoAplicavel)
+            SELECT CAST(DataSubmissao AS DATE), ChecklistID, UsuarioID, COUNT(*),
+                COALESCE(SUM(TotalAuditavel), 0), COALESCE(SUM(TotalConforme), 0),
+                COALESCE(SUM(TotalNaoConforme), 0), COALESCE(SUM(TotalNaoAplicavel), 0)
+            FROM Submissoes
+            WHERE Status = 'Ativa'
+            GROUP BY CAST(DataSubmissao AS DATE), ChecklistID, UsuarioID
+        """)
+        cursor.execute("SELECT COUNT(*) FROM ResumoConformidadeDiario")
+        count = cursor.fetchone()[0]
+        conn.commit()
+        return count
+    except Exception as e:
+        print(f"Erro ao reconstruir o resumo diário: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+# Colunas pelas quais a tendência pode ser agrupada: (ID, nome exibido)
+_TREND_GROUP_COLUMNS = {
+    'setor': ('st.ID', 'st.Nome'),
+    'checklist': ('c.ID', 'c.Titulo'),
+    'colaborador': ('u.ID', 'u.NomeUsuario'),
+}
+# Valores aceitos em group_by por get_compliance_trend
+TREND_GROUP_BY = tuple(_TREND_GROUP_COLUMNS)
+
+def get_compliance_trend(coordinator_id, start_date, end_date, group_by='setor'):
+    """
+    Série diária de conformidade dos setores do coordenador, agrupada por setor, checklist
+    ou colaborador (group_by, um de TREND_GROUP_BY). Lê apenas o resumo diário, nunca as respostas.
+    """
+    if group_by not in _TREND_GROUP_COLUMNS: raise ValueError(f"group_by desconhecido: {group_by!r}")
+    conn = get_connection()
+    if not conn: return []
+    cursor = conn.cursor()
+    group_id, group_name = _TREND_GROUP_COLUMNS[group_by]
+    query = f"""
+        SELECT rcd.Dia, {group_id} AS GrupoID, {group_name} AS Grupo,
+            SUM(rcd.TotalSubmissoes) AS TotalSubmissoes, SUM(rcd.TotalAuditavel) AS TotalAuditavel,
+            SUM(rcd.TotalConforme) AS TotalConforme, SUM(rcd.TotalNaoConforme) AS TotalNaoConforme,
+            SUM(rcd.TotalNaoAplicavel) AS TotalNaoAplicavel
+        FROM ResumoConformidadeDiario rcd
+        JOIN Checklists c ON c.ID = rcd.ChecklistID
+        JOIN Setores st ON st.ID = c.SetorID
+        JOIN Usuarios u ON u.ID = rcd.UsuarioID
+        WHERE c.SetorID IN (SELECT cs.SetorID FROM Coordenadores_Setores cs WHERE cs.UsuarioID = ?)
+        AND rcd.Dia >= ? AND rcd.Dia <= ?
+        GROUP BY rcd.Dia, {group_id}, {group_name}
+        ORDER BY rcd.Dia, {group_name}
+    """
+    cursor.execute(query, coordinator_id, start_date, end_date)
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+def score_from_submission(row):
+    """
+    Converte as colunas de placar gravadas numa linha de Submissoes para o placar usado pelas
+    telas ({'total', 'compliant', 'flagged', 'percentage', 'not_applicable'}). Retorna None se
+    não houver nada pontuável.
+    """
+    if row.PercentualConformidade is None: return None
+    return {'total': row.TotalAuditavel, 'compliant': row.TotalConforme, 'flagged': row.TotalNaoConforme,
+            'percentage': float(row.PercentualConformidade), 'not_applicable': row.TotalNaoAplicavel}
+
+def get_submission_score(submission_id):
+    """
+    Placar de uma submissão ainda sem placar gravado (anterior a 'backfill-placar'), calculado
+    com as mesmas regras das colunas gravadas. Mesmo formato de score_from_submission.
+    """
+    conn = get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {_SCORE_SUMS}
+        FROM Respostas r
+        LEFT JOIN OpcoesResposta op ON op.TipoRespostaID = r.TipoRespostaID AND op.TextoOpcao = r.Resposta
+        WHERE r.SubmissaoID = ?
+    """, [*_SCORE_SUMS_PARAMS, submission_id])
+    row = cursor.fetchone()
+    conn.close()
+    auditable, compliant, not_applicable = (row.TotalAuditavel or 0, row.TotalConforme or 0, row.TotalNaoAplicavel or 0)
+    if auditable > 0: percentage = compliant * 100.0 / auditable
+    elif not_applicable > 0: percentage = 100.0
+    else: return None
+    return {'total': auditable, 'compliant': compliant, 'flagged': auditable - compliant,
+            'percentage': percentage, 'not_applicable': not_applicable}
+
+def _rescore_in_batches(condition, params, batch_size):
+    """
+    Recalcula o placar gravado e o resumo diário das submissões que atendem a `condition`
+    (um trecho "AND ..." sobre Submissoes), em lotes de `batch_size`, cada um numa transação
+    própria: as gravações dos usuários só esperam um lote. Gera o total acumulado após cada lote.
+    """
+    conn = get_connection()
+    if not conn: return
+    cursor = conn.cursor()
+    last_id, processed = 0, 0
+    try:
+        while True:
+            cursor.execute(f"SELECT ID FROM Submissoes WHERE ID > ? {condition} ORDER BY ID OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY",
+                           last_id, *params, batch_size)
+            ids = [row.ID for row in cursor.fetchall()]
+            if not ids: break
+            # Tira a contribuição antiga do resumo e soma a nova: vale antes ou depois de reconstruir-resumo
+            _rescore_submissions(cursor, ids, lambda: None)
+            conn.commit()
+            last_id, processed = ids[-1], processed + len(ids)
+            yield processed
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def backfill_submission_scores(batch_size=500, only_missing=True):
+    """
+    Grava o placar das submissões existentes (e a sua parte no resumo diário), em lotes de
+    `batch_size` por transação. Com only_missing=True processa apenas as que ainda não têm
+    placar (pode ser retomado). Gera o total acumulado de submissões processadas após cada lote.
+    """
+    yield from _rescore_in_batches("AND TotalAuditavel IS NULL" if only_missing else "", [], batch_size)
+
+def rescore_submissions_with_type(type_id, batch_size=500):
+    """Recalcula, em lotes, o placar das submissões que usam o tipo de resposta (depois de update_response_type)."""
+    yield from _rescore_in_batches("AND ID IN (SELECT SubmissaoID FROM Respostas WHERE TipoRespostaID = ?)", [type_id], batch_size)
+
+# Limites do SQL Server por comando: 1000 linhas num VALUES e 2100 parâmetros
+_ANSWER_ROWS_PER_INSERT = 400   # 5 parâmetros por resposta
+_ANSWER_ROWS_PER_UPDATE = 600   # 3 parâmetros por resposta
+_PHOTO_ROWS_PER_INSERT = 1000   # 2 parâmetros por foto
+
+def _answer_rows(submission_id, answers):
+    """
+    Converte o dicionário de respostas do formulário nas linhas de Respostas e nas fotos de cada
+    resposta. A observação do componente vai só na primeira resposta dele.
+    Retorna ([(SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao)], {(componente, tipo): [fotos]}).
+    """
+    answer_rows, photos_by_answer = [], {}
+    for component_id, data in answers.items():
+        responses = data.get('responses', {})
+        observation = data.get('observation')
+        is_first_response = True
+        for rt_id, answer_value in responses.items():
+            obs_to_save = observation if is_first_response else None
+            if isinstance(answer_value, list):
+                photos_by_answer[(int(component_id), int(rt_id))] = answer_value
+                answer_value = f"{len(answer_value)} foto(s) anexada(s)"
+            answer_rows.append((submission_id, component_id, rt_id, answer_value, obs_to_save))
+            is_first_response = False
+    return answer_rows, photos_by_answer
+
+def _insert_answers_bulk(cursor, submission_id, answers):
+    """
+    Grava as respostas de uma submissão em lote: um INSERT multi-linha para todas as
+    Respostas (com OUTPUT dos IDs gerados) e outro para todas as FotosResposta.
+    O número de comandos não depende da quantidade de respostas (até 400 por lote).
+    """
+    _insert_answer_rows(cursor, *_answer_rows(submission_id, answers))
+
+def _insert_answer_rows(cursor, answer_rows, photos_by_answer):
+    photo_rows = []
+    for chunk in _chunks(answer_rows, _ANSWER_ROWS_PER_INSERT):
+        values = ', '.join(['(?, ?, ?, ?, ?)'] * len(chunk))
+        sql_answers = f"""
+            SET NOCOUNT ON;
+            INSERT INTO Respostas (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao)
+            OUTPUT INSERTED.ID, INSERTED.ComponenteID, INSERTED.TipoRespostaID
+            VALUES {values};
+        """
+        cursor.execute(sql_answers, [value for row in chunk for value in row])
+        # A ordem do OUTPUT não é garantida: associa as fotos pelo par (componente, tipo)
+        for row in cursor.fetchall():
+            for photo_path in photos_by_answer.get((row.ComponenteID, row.TipoRespostaID), []):
+                photo_rows.append((row.ID, photo_path))
+    _insert_photo_rows(cursor, photo_rows)
+
+def _insert_photo_rows(cursor, photo_rows):
+    for chunk in _chunks(photo_rows, _PHOTO_ROWS_PER_INSERT):
+        values = ', '.join(['(?, ?)'] * len(chunk))
+        cursor.execute(f"INSERT INTO FotosResposta (RespostaID, CaminhoFoto) VALUES {values}", [value for row in chunk for value in row])
+
+def _delete_by_ids(cursor, table, ids):
+    for chunk in _chunks(list(ids), _IDS_PER_STATEMENT):
+        cursor.execute(f"DELETE FROM {table} WHERE ID IN ({', '.join('?' * len(chunk))})", chunk)
+
+def _update_answers_diff(cursor, submission_id, answers, component_id=None):
+    """
+    Leva as respostas gravadas de uma submissão ao estado de `answers` alterando só o que mudou:
+    insere as respostas novas, atualiza as que mudaram de valor ou observação, apaga as que
+    saíram (as fotos vão junto, em cascata) e acerta as fotos das que continuam.
+    Numa edição típica (um campo alterado) são dois comandos: a leitura e um UPDATE.
+    Com component_id, considera apenas as respostas gravadas desse componente.
+    """
+    component_filter = "AND r.ComponenteID = ?" if component_id is not None else ""
+    cursor.execute(f"""
+        SELECT r.ID, r.ComponenteID, r.TipoRespostaID, r.Resposta, r.Observacao, f.ID AS FotoID, f.CaminhoFoto
+        FROM Respostas r
+        LEFT JOIN FotosResposta f ON f.RespostaID = r.ID
+        WHERE r.SubmissaoID = ? {component_filter}
+        ORDER BY r.ID, f.ID
+    """, submission_id, *([component_id] if component_id is not None else []))
+    # (componente, tipo) -> (ID, resposta, observação) gravados; fotos gravadas por ID de resposta
+    stored, photos, duplicated = {}, {}, set()
+    for answer_id, component_id, rt_id, value, observation, photo_id, photo_path in cursor.fetchall():
+        current = stored.setdefault((component_id, rt_id), (answer_id, value, observation))
+        if current[0] != answer_id: duplicated.add(answer_id)  # linhas repetidas de gravações antigas
+        elif photo_id is not None: photos.setdefault(answer_id, []).append((photo_id, photo_path))
+
+    answer_rows, photos_by_answer = _answer_rows(submission_id, answers)
+    new_rows, new_photos, changed, photo_rows, removed_photos = [], {}, [], [], []
+    for row in answer_rows:
+        key = (int(row[1]), int(row[2]))
+        current = stored.pop(key, None)
+        if current is None:
+            new_rows.append(row)
+            if key in photos_by_answer: new_photos[key] = photos_by_answer[key]
+            continue
+        answer_id, value, observation = current
+        if (value, observation) != (row[3], row[4]):
+            changed.append((answer_id, row[3], row[4]))
+        # Fotos: mantém as que continuam, apaga as que saíram e insere as novas
+        kept = list(photos_by_answer.get(key, []))
+        for photo_id, photo_path in photos.get(answer_id, []):
+            if photo_path in kept: kept.remove(photo_path)
+            else: removed_photos.append(photo_id)
+        photo_rows.extend((answer_id, photo_path) for photo_path in kept)
+
+    _delete_by_ids(cursor, 'Respostas', [answer_id for answer_id, _, _ in stored.values()] + sorted(duplicated))
+    for chunk in _chunks(changed, _ANSWER_ROWS_PER_UPDATE):
+        source = ' UNION ALL '.join(['SELECT ? AS ID, ? AS Resposta, ? AS Observacao'] + ['SELECT ?, ?, ?'] * (len(chunk) - 1))
+        cursor.execute(f"""
+            UPDATE Respostas SET Resposta = v.Resposta, Observacao = v.Observacao
+            FROM ({source}) AS v
+            WHERE v.ID = Respostas.ID
+        """, [value for row in chunk for value in row])
+    _delete_by_ids(cursor, 'FotosResposta', removed_photos)
+    _insert_photo_rows(cursor, photo_rows)
+    _insert_answer_rows(cursor, new_rows, new_photos)
+
+def _copy_answers_sqlite(cursor, old_submission_id, new_submission_id):
+    """
+    Versão SQLite da cópia de respostas e fotos (sem MERGE ... OUTPUT). As respostas são
+    inseridas na ordem dos IDs antigos e o SQLite atribui IDs crescentes a um único escritor,
+    então a n-ésima resposta nova corresponde à n-ésima antiga.
+    """
+    cursor.execute("""
+        INSERT INTO Respostas (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao)
+        SELECT ?, ComponenteID, TipoRespostaID, Resposta, Observacao FROM Respostas WHERE SubmissaoID = ? ORDER BY ID
+    """, new_submission_id, old_submission_id)
+    cursor.execute("""
+        INSERT INTO FotosResposta (RespostaID, CaminhoFoto)
+        SELECT novo.ID, f.CaminhoFoto
+        FROM (SELECT ID, ROW_NUMBER() OVER (ORDER BY ID) AS N FROM Respostas WHERE SubmissaoID = ?) antigo
+        JOIN (SELECT ID, ROW_NUMBER() OVER (ORDER BY ID) AS N FROM Respostas WHERE SubmissaoID = ?) novo ON novo.N = antigo.N
+        JOIN FotosResposta f ON f.RespostaID = antigo.ID
+    """, old_submission_id, new_submission_id)
+
 def save_flexible_checklist_response(checklist_id, user_id, answers, participants, status='Ativa'):
+    """Grava uma submissão nova com as suas respostas. Retorna o ID dela, ou False em caso de erro."""
     conn = get_connection()
     if not conn: return False
     cursor = conn.cursor()
@@ -421,24 +976,11 @@ def save_flexible_checklist_response(checklist_id, user_id, answers, participant
         sql_batch = "SET NOCOUNT ON; INSERT INTO Submissoes (ChecklistID, UsuarioID, NomeTrabalhadorAuditado, NomeResponsavelArea, Status) VALUES (?, ?, ?, ?, ?); SELECT SCOPE_IDENTITY();"
         cursor.execute(sql_batch, checklist_id, user_id, participants['worker_name'], participants['area_manager_name'], status)
         submission_id = cursor.fetchone()[0]
-        for component_id, data in answers.items():
-            responses = data.get('responses', {})
-            observation = data.get('observation')
-            is_first_response = True
-            for rt_id, answer_value in responses.items():
-                obs_to_save = observation if is_first_response else None
-                sql_get_id = "SET NOCOUNT ON; INSERT INTO Respostas (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao) VALUES (?, ?, ?, ?, ?); SELECT SCOPE_IDENTITY();"
-                if isinstance(answer_value, list):
-                    placeholder_text = f"{len(answer_value)} foto(s) anexada(s)"
-                    cursor.execute(sql_get_id, submission_id, component_id, rt_id, placeholder_text, obs_to_save)
-                    resposta_id = cursor.fetchone()[0]
-                    for photo_path in answer_value:
-                        cursor.execute("INSERT INTO FotosResposta (RespostaID, CaminhoFoto) VALUES (?, ?)", resposta_id, photo_path)
-                else:
-                    cursor.execute(sql_get_id, submission_id, component_id, rt_id, answer_value, obs_to_save)
-                is_first_response = False
+        _insert_answers_bulk(cursor, submission_id, answers)
+        _store_submission_scores(cursor, [submission_id])
+        _apply_summary_delta(cursor, [submission_id], 1)
         conn.commit()
-        return True
+        return int(submission_id)
     except Exception as e:
         print(f"Erro ao salvar respostas do checklist flexível: {e}")
         conn.rollback()
@@ -466,6 +1008,18 @@ def get_checklists_for_coordinator(coordinator_id):
     conn.close()
     return rows
 
+def get_checklists_for_coordinator_page(coordinator_id, page=1, per_page=10):
+    """Uma página dos checklists dos setores do coordenador. Retorna (linhas, total)."""
+    conn = get_connection()
+    if not conn: return [], 0
+    cursor = conn.cursor()
+    rows, total = _fetch_page(
+        cursor, "c.ID, c.Titulo, s.Nome as NomeSetor", "Checklists c JOIN Setores s ON c.SetorID = s.ID",
+        ["c.SetorID IN (SELECT cs.SetorID FROM Coordenadores_Setores cs WHERE cs.UsuarioID = ?)"], [coordinator_id],
+        "s.Nome, c.Titulo, c.ID", page, per_page)
+    conn.close()
+    return rows, total
+
 def delete_checklist(checklist_id):
     conn = get_connection()
     if not conn: return (False, "Falha na conexão com o banco de dados.")
@@ -477,6 +1031,8 @@ def delete_checklist(checklist_id):
             return (False, "Este checklist não pode ser apagado pois já possui respostas enviadas.")
         cursor.execute("DELETE FROM Checklists WHERE ID = ?", checklist_id)
         conn.commit()
+        _checklist_cache.invalidate(int(checklist_id))
+        _report_filters_cache.clear()
         return (True, "Checklist apagado com sucesso.")
     except Exception as e:
         conn.rollback()
@@ -501,6 +1057,23 @@ def get_submissions_for_collaborator(collaborator_id):
     conn.close()
     return rows
 
+def get_submissions_for_collaborator_page(collaborator_id, page=1, per_page=5, after_id=None):
+    """
+    Uma página do histórico (ativas e rascunhos) de um colaborador. Retorna (linhas, total).
+    Com `after_id`, busca as submissões seguintes à de ID informado (paginação por chave).
+    """
+    conn = get_connection()
+    if not conn: return [], 0
+    cursor = conn.cursor()
+    seek = _submission_seek(cursor, after_id)
+    rows, total = _fetch_page(
+        cursor, "sub.ID, chk.Titulo, sub.DataSubmissao, sub.Status",
+        "Submissoes sub JOIN Checklists chk ON sub.ChecklistID = chk.ID",
+        ["sub.UsuarioID = ?", "sub.Status IN ('Ativa', 'Rascunho')"], [collaborator_id],
+        "sub.DataSubmissao DESC, sub.ID DESC", page, per_page, seek)
+    conn.close()
+    return rows, total
+
 def delete_submission(submission_id):
     """Apaga uma submissão e suas respostas, cuidando do histórico de versionamento."""
     conn = get_connection()
@@ -510,13 +1083,19 @@ def delete_submission(submission_id):
         # Inicia a transação para garantir que ambas as operações funcionem
         conn.autocommit = False
 
+        # Retira a submissão apagada do resumo diário (se estava ativa)
+        _apply_summary_delta(cursor, [submission_id], -1)
+
         # 1. "Desarquiva" a versão anterior, se houver.
         #    Procura por uma submissão que foi substituída por esta que estamos apagando.
+        cursor.execute("SELECT ID FROM Submissoes WHERE SubstituidaPorID = ?", submission_id)
+        previous_ids = [row.ID for row in cursor.fetchall()]
         cursor.execute("""
             UPDATE Submissoes 
             SET Status = 'Ativa', SubstituidaPorID = NULL 
             WHERE SubstituidaPorID = ?
         """, submission_id)
+        _apply_summary_delta(cursor, previous_ids, 1)
 
         # 2. Agora, apaga a submissão desejada.
         #    A exclusão em cascata cuidará das respostas e fotos.
@@ -551,11 +1130,55 @@ def get_submissions_for_coordinator(coordinator_id):
     conn.close()
     return rows
 
+def _escape_like(text):
+    """Escapa os curingas do LIKE para que o termo seja buscado literalmente (use com ESCAPE '\\')."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('[', '\\[')
+
+def get_submissions_for_coordinator_page(coordinator_id, page=1, per_page=10, after_id=None, search=None, order='data'):
+    """
+    Uma página das submissões ATIVAS dos setores de um coordenador. Retorna (linhas, total).
+    Com `after_id`, busca as submissões seguintes à de ID informado (paginação por chave).
+    Com order='conformidade', ordena pelo placar gravado, do pior para o melhor (sem
+    paginação por chave); submissões sem itens pontuáveis vão para o fim.
+
+    Com `search`, filtra por ID exato (chave primária) ou por trecho do título do checklist
+    ou do nome do colaborador. O LIKE roda apenas nas tabelas pequenas (Checklists e
+    Usuarios); Submissoes é alcançada pelos IDs encontrados, sem varrer a tabela inteira.
+    """
+    conn = get_connection()
+    if not conn: return [], 0
+    cursor = conn.cursor()
+    conditions = ["chk.SetorID IN (SELECT cs.SetorID FROM Coordenadores_Setores cs WHERE cs.UsuarioID = ?)", "sub.Status = 'Ativa'"]
+    params = [coordinator_id]
+    if search:
+        pattern = f"%{_escape_like(search)}%"
+        search_conditions = [
+            "sub.ChecklistID IN (SELECT ID FROM Checklists WHERE Titulo LIKE ? ESCAPE '\\')",
+            "sub.UsuarioID IN (SELECT ID FROM Usuarios WHERE NomeUsuario LIKE ? ESCAPE '\\')",
+        ]
+        search_params = [pattern, pattern]
+        if search.isdigit() and len(search) <= 9:
+            search_conditions.insert(0, "sub.ID = ?")
+            search_params.insert(0, int(search))
+        conditions.append(f"({' OR '.join(search_conditions)})")
+        params.extend(search_params)
+    if order == 'conformidade':
+        order_by, seek = "CASE WHEN sub.PercentualConformidade IS NULL THEN 1 ELSE 0 END, sub.PercentualConformidade, sub.ID DESC", None
+    else:
+        order_by = "sub.DataSubmissao DESC, sub.ID DESC"
+        seek = _submission_seek(cursor, after_id)
+    rows, total = _fetch_page(
+        cursor, "sub.ID, chk.Titulo, usr.NomeUsuario, sub.DataSubmissao, sub.PercentualConformidade",
+        "Submissoes sub JOIN Usuarios usr ON sub.UsuarioID = usr.ID JOIN Checklists chk ON sub.ChecklistID = chk.ID",
+        conditions, params, order_by, page, per_page, seek)
+    conn.close()
+    return rows, total
+
 def get_submission_details(submission_id):
     conn = get_connection()
     if not conn: return None
     cursor = conn.cursor()
-    query_header = "SELECT s.ID, chk.ID as ChecklistID, chk.Titulo, u.NomeUsuario, u.ID as UsuarioID, s.DataSubmissao, s.NomeTrabalhadorAuditado, s.NomeResponsavelArea FROM Submissoes s JOIN Checklists chk ON s.ChecklistID = chk.ID JOIN Usuarios u ON s.UsuarioID = u.ID WHERE s.ID = ?"
+    query_header = "SELECT s.ID, chk.ID as ChecklistID, chk.Titulo, u.NomeUsuario, u.ID as UsuarioID, s.DataSubmissao, s.NomeTrabalhadorAuditado, s.NomeResponsavelArea, s.TotalAuditavel, s.TotalConforme, s.TotalNaoConforme, s.TotalNaoAplicavel, s.PercentualConformidade FROM Submissoes s JOIN Checklists chk ON s.ChecklistID = chk.ID JOIN Usuarios u ON s.UsuarioID = u.ID WHERE s.ID = ?"
     cursor.execute(query_header, submission_id)
     header = cursor.fetchone()
     if not header:
@@ -587,39 +1210,48 @@ def get_submission_details(submission_id):
     conn.close()
     return {'header': header, 'details': structured_list}
 
-def get_filtered_submissions(coordinator_id, checklist_id=None, user_id=None, start_date=None, end_date=None, question=None, answer=None):
-    """Busca submissões filtradas, retornando uma lista de dicionários."""
-    conn = get_connection()
-    if not conn: return []
-    cursor = conn.cursor()
-
-    query = """
-        SELECT 
-            s.ID as SubmissaoID, s.DataSubmissao, c.Titulo as ChecklistTitulo, 
-            u.NomeUsuario, comp.TextoComponente, tr.Nome AS TipoRespostaNome, 
-            r.Resposta, r.Observacao, op.IsConforme,
-            (SELECT STRING_AGG(fr.CaminhoFoto, ',') FROM FotosResposta fr WHERE fr.RespostaID = r.ID) as CaminhosFotos
-        FROM Submissoes s
+_FILTERED_SUBMISSIONS_COLUMNS = """
+    s.ID as SubmissaoID, s.DataSubmissao, c.Titulo as ChecklistTitulo, 
+    u.NomeUsuario, comp.TextoComponente, tr.Nome AS TipoRespostaNome, 
+    r.Resposta, r.Observacao, op.IsConforme,
+    (SELECT STRING_AGG(fr.CaminhoFoto, ',') FROM FotosResposta fr WHERE fr.RespostaID = r.ID) as CaminhosFotos
+"""
+_FILTERED_SUBMISSIONS_ORDER = "s.DataSubmissao DESC, u.NomeUsuario, comp.Ordem, r.ID"
+
+def _filtered_submissions_source(coordinator_id, checklist_id=None, user_id=None, start_date=None, end_date=None, question=None, answer=None):
+    """Monta o FROM, as condições e os parâmetros do relatório filtrado de respostas."""
+    from_ = """
+        Submissoes s
         JOIN Checklists c ON s.ChecklistID = c.ID
         JOIN Usuarios u ON s.UsuarioID = u.ID
         JOIN Respostas r ON r.SubmissaoID = s.ID
-        -- CORREÇÃO AQUI: Corrigido o erro de digitação no nome da coluna
         JOIN ComponentesChecklist comp ON r.ComponenteID = comp.ID
         LEFT JOIN TiposResposta tr ON r.TipoRespostaID = tr.ID
         LEFT JOIN OpcoesResposta op ON tr.ID = op.TipoRespostaID AND r.Resposta = op.TextoOpcao
-        WHERE u.CoordenadorID = ?
     """
-    params = [coordinator_id]
+    conditions, params = ["u.CoordenadorID = ?"], [coordinator_id]
+
+    if checklist_id: conditions.append("s.ChecklistID = ?"); params.append(checklist_id)
+    if user_id: conditions.append("s.UsuarioID = ?"); params.append(user_id)
+    if start_date: conditions.append("s.DataSubmissao >= ?"); params.append(start_date)
+    if end_date: conditions.append("s.DataSubmissao < DATEADD(day, 1, ?)"); params.append(end_date)
+    if question: conditions.append("comp.TextoComponente = ?"); params.append(question)
+    if answer: conditions.append("r.Resposta LIKE ?"); params.append(f"%{answer}%")
+    return from_, conditions, params
+
+def _build_filtered_submissions_query(coordinator_id, **filters):
+    """Monta a consulta (e os parâmetros) do relatório filtrado de respostas."""
+    from_, conditions, params = _filtered_submissions_source(coordinator_id, **filters)
+    query = f"SELECT {_FILTERED_SUBMISSIONS_COLUMNS} FROM {from_} WHERE {' AND '.join(conditions)} ORDER BY {_FILTERED_SUBMISSIONS_ORDER}"
+    return query, params
 
-    if checklist_id: query += " AND s.ChecklistID = ?"; params.append(checklist_id)
-    if user_id: query += " AND s.UsuarioID = ?"; params.append(user_id)
-    if start_date: query += " AND s.DataSubmissao >= ?"; params.append(start_date)
-    if end_date: query += " AND s.DataSubmissao < DATEADD(day, 1, ?)"; params.append(end_date)
-    if question: query += " AND comp.TextoComponente = ?"; params.append(question)
-    if answer: query += " AND r.Resposta LIKE ?"; params.append(f"%{answer}%")
-    
-    query += " ORDER BY s.DataSubmissao DESC, u.NomeUsuario, comp.Ordem"
-    
+def get_filtered_submissions(coordinator_id, checklist_id=None, user_id=None, start_date=None, end_date=None, question=None, answer=None):
+    """Busca submissões filtradas, retornando uma lista de dicionários."""
+    conn = get_connection()
+    if not conn: return []
+    cursor = conn.cursor()
+
+    query, params = _build_filtered_submissions_query(coordinator_id, checklist_id=checklist_id, user_id=user_id, start_date=start_date, end_date=end_date, question=question, answer=answer)
     cursor.execute(query, params)
     
     columns = [column[0] for column in cursor.description]
@@ -628,6 +1260,71 @@ def get_filtered_submissions(coordinator_id, checklist_id=None, user_id=None, st
     conn.close()
     return results
 
+def get_filtered_submissions_page(coordinator_id, page=1, per_page=100, **filters):
+    """Uma página do relatório filtrado, como lista de dicionários. Retorna (linhas, total)."""
+    conn = get_connection()
+    if not conn: return [], 0
+    cursor = conn.cursor()
+    from_, conditions, params = _filtered_submissions_source(coordinator_id, **filters)
+    rows, total = _fetch_page(cursor, _FILTERED_SUBMISSIONS_COLUMNS, from_, conditions, params, _FILTERED_SUBMISSIONS_ORDER, page, per_page)
+    columns = [column[0] for column in cursor.description]
+    results = [dict(zip(columns, row)) for row in rows]
+    conn.close()
+    return results, total
+
+def get_submission_scores(coordinator_id, **filters):
+    """
+    Placar de conformidade de cada submissão que atende aos filtros do relatório, agregado
+    no próprio banco a partir de OpcoesResposta.IsConforme. Retorna {SubmissaoID: placar},
+    no mesmo formato de score_from_submission; submissões sem itens pontuáveis ficam de fora.
+    """
+    conn = get_connection()
+    if not conn: return {}
+    cursor = conn.cursor()
+    from_, conditions, params = _filtered_submissions_source(coordinator_id, **filters)
+    query = f"""
+        SELECT SubmissaoID, TotalAuditavel, TotalConforme, TotalNaoAplicavel,
+            CASE WHEN TotalAuditavel = 0 THEN 100.0 ELSE TotalConforme * 100.0 / TotalAuditavel END AS Percentual
+        FROM (
+            SELECT s.ID AS SubmissaoID, {_SCORE_SUMS}
+            FROM {from_}
+            WHERE {' AND '.join(conditions)}
+            GROUP BY s.ID
+        ) placar
+        WHERE TotalAuditavel > 0 OR TotalNaoAplicavel > 0
+    """
+    cursor.execute(query, [*_SCORE_SUMS_PARAMS, *params])
+    scores = {}
+    for row in cursor.fetchall():
+        scores[row.SubmissaoID] = {
+            'total': row.TotalAuditavel, 'compliant': row.TotalConforme,
+            'flagged': row.TotalAuditavel - row.TotalConforme,
+            'percentage': float(row.Percentual), 'not_applicable': row.TotalNaoAplicavel,
+        }
+    conn.close()
+    return scores
+
+def iter_filtered_submissions(coordinator_id, checklist_id=None, user_id=None, start_date=None, end_date=None, question=None, answer=None, batch_size=1000):
+    """
+    Versão em fluxo de get_filtered_submissions para exportações: lê o resultado em lotes
+    de `batch_size` com fetchmany e gera um dicionário por linha, sem materializar a lista.
+    A conexão fica emprestada até o gerador terminar ou ser fechado.
+    """
+    conn = get_connection()
+    if not conn: return
+    try:
+        cursor = conn.cursor()
+        query, params = _build_filtered_submissions_query(coordinator_id, checklist_id=checklist_id, user_id=user_id, start_date=start_date, end_date=end_date, question=question, answer=answer)
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows: break
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        conn.close()
+
 def get_all_distinct_questions(coordinator_id):
     """Busca todos os textos de perguntas/itens únicos dos checklists de um coordenador."""
     conn = get_connection()
@@ -646,6 +1343,17 @@ def get_all_distinct_questions(coordinator_id):
     conn.close()
     return rows
 
+def get_report_filter_options(coordinator_id):
+    """
+    Listas dos filtros da tela de relatórios: {'checklists', 'users', 'questions'}.
+    Ficam em cache por coordenador; rodar um relatório custa só a consulta do relatório.
+    """
+    def load():
+        return {'checklists': get_checklists_for_coordinator(coordinator_id),
+                'users': get_manageable_users(coordinator_id),
+                'questions': get_all_distinct_questions(coordinator_id)}
+    return _report_filters_cache.get_or_load(int(coordinator_id), load)
+
 def get_checklist_for_editing(checklist_id):
     """Busca um checklist e seus componentes para o formulário de edição."""
     # Reutiliza a função de preenchimento, pois a estrutura de dados é a mesma.
@@ -669,23 +1377,37 @@ def replicate_submission_for_editing(old_submission_id, user_id):
         cursor.execute(sql_insert_new, original_sub.ChecklistID, user_id) # O autor da nova versão é o usuário logado
         new_submission_id = cursor.fetchone()[0]
 
-        # 2. Arquiva a submissão original, ligando-a à nova
+        # 2. Arquiva a submissão original, ligando-a à nova (e a retira do resumo diário)
+        _apply_summary_delta(cursor, [old_submission_id], -1)
         cursor.execute("UPDATE Submissoes SET Status = 'Arquivada', SubstituidaPorID = ? WHERE ID = ?", new_submission_id, old_submission_id)
 
-        # 3. Copia todas as respostas da submissão antiga para a nova
-        cursor.execute("SELECT ComponenteID, TipoRespostaID, Resposta, Observacao FROM Respostas WHERE SubmissaoID = ?", old_submission_id)
-        original_answers = cursor.fetchall()
-        
-        for answer in original_answers:
-            sql_copy_answer = "SET NOCOUNT ON; INSERT INTO Respostas (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao) VALUES (?, ?, ?, ?, ?); SELECT SCOPE_IDENTITY();"
-            cursor.execute(sql_copy_answer, new_submission_id, answer.ComponenteID, answer.TipoRespostaID, answer.Resposta, answer.Observacao)
-            new_answer_id = cursor.fetchone()[0]
-
-            # 4. Se a resposta original tinha fotos, copia as fotos para a nova resposta
-            cursor.execute("SELECT CaminhoFoto FROM FotosResposta WHERE RespostaID = (SELECT ID FROM Respostas WHERE SubmissaoID = ? AND ComponenteID = ? AND TipoRespostaID = ?)", old_submission_id, answer.ComponenteID, answer.TipoRespostaID)
-            original_photos = cursor.fetchall()
-            for photo in original_photos:
-                cursor.execute("INSERT INTO FotosResposta (RespostaID, CaminhoFoto) VALUES (?, ?)", new_answer_id, photo.CaminhoFoto)
+        # 3. Copia todas as respostas e, em seguida, todas as fotos, num único comando.
+        #    Usa MERGE em vez de INSERT ... SELECT porque só o OUTPUT do MERGE enxerga as
+        #    colunas da origem, o que permite mapear o ID antigo de cada resposta para o novo.
+        sql_copy_answers = """
+            SET NOCOUNT ON;
+            DECLARE @mapa TABLE (IDAntigo INT PRIMARY KEY, IDNovo INT NOT NULL);
+
+            MERGE INTO Respostas AS destino
+            USING (SELECT ID, ComponenteID, TipoRespostaID, Resposta, Observacao FROM Respostas WHERE SubmissaoID = ?) AS origem
+            ON 1 = 0
+            WHEN NOT MATCHED THEN
+                INSERT (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao)
+                VALUES (?, origem.ComponenteID, origem.TipoRespostaID, origem.Resposta, origem.Observacao)
+            OUTPUT origem.ID, INSERTED.ID INTO @mapa (IDAntigo, IDNovo);
+
+            -- 4. Copia as fotos das respostas originais para as respostas novas correspondentes
+            INSERT INTO FotosResposta (RespostaID, CaminhoFoto)
+            SELECT m.IDNovo, f.CaminhoFoto
+            FROM FotosResposta f
+            JOIN @mapa m ON m.IDAntigo = f.RespostaID;
+        """
+        if BACKEND == 'sqlite':
+            _copy_answers_sqlite(cursor, old_submission_id, new_submission_id)
+        else:
+            cursor.execute(sql_copy_answers, old_submission_id, new_submission_id)
+        _store_submission_scores(cursor, [new_submission_id])
+        _apply_summary_delta(cursor, [new_submission_id], 1)
 
         conn.commit()
         return new_submission_id
@@ -712,18 +1434,14 @@ def get_submission_for_resubmit(submission_id):
     """Busca os dados de uma submissão para preencher o formulário de reenvio/edição."""
     conn = get_connection()
     if not conn: return None, None
-
-    # Primeiro, busca a estrutura do checklist
     cursor = conn.cursor()
     cursor.execute("SELECT ChecklistID FROM Submissoes WHERE ID = ?", submission_id)
     checklist_id_row = cursor.fetchone()
     if not checklist_id_row:
         conn.close()
         return None, None
-    
-    checklist_structure = get_flexible_checklist_for_filling(checklist_id_row.ChecklistID)
 
-    # Depois, busca as respostas existentes para esta submissão
+    # Busca as respostas existentes para esta submissão
     cursor.execute("""
         SELECT r.ComponenteID, r.TipoRespostaID, r.Resposta 
         FROM Respostas r 
@@ -734,82 +1452,303 @@ def get_submission_for_resubmit(submission_id):
     for row in cursor.fetchall():
         if row.ComponenteID not in existing_answers:
             existing_answers[row.ComponenteID] = {}
-        existing_answers[row.ComponenteID][row.TipoRespostaID] = row.Resposta
-
+        # Armazena a resposta, usando o TipoRespostaID como chave
+        if row.TipoRespostaID:
+            existing_answers[row.ComponenteID][row.TipoRespostaID] = row.Resposta
     conn.close()
+
+    # A estrutura do checklist vem depois de devolver a conexão: sem cache, ela usa outra do pool
+    checklist_structure = get_flexible_checklist_for_filling(checklist_id_row.ChecklistID)
     return checklist_structure, existing_answers
 
+def update_submission_answers(submission_id, user_id, answers, participants, status='Ativa'):
+    conn = get_connection()
+    if not conn: return False
+    cursor = conn.cursor()
+    try:
+        def apply_changes():
+            # ATUALIZAMOS AGORA TAMBÉM O 'Status' NA QUERY
+            cursor.execute("UPDATE Submissoes SET UsuarioID = ?, NomeTrabalhadorAuditado = ?, NomeResponsavelArea = ?, Status = ? WHERE ID = ?", 
+                           user_id, participants['worker_name'], participants['area_manager_name'], status, submission_id)
+            # Grava só as respostas que mudaram, em vez de apagar e reinserir todas
+            _update_answers_diff(cursor, submission_id, answers)
+
+        _rescore_submissions(cursor, [submission_id], apply_changes)
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Erro ao atualizar respostas: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
 
-def get_submission_for_resubmit(submission_id):
-    """Busca os dados de uma submissão para preencher o formulário de reenvio/edição."""
+# --- Autosave de Rascunhos ---
+def get_draft_submission(submission_id, user_id):
+    """Retorna (ID, ChecklistID) da submissão se ela for um rascunho do usuário; senão None."""
     conn = get_connection()
-    if not conn: return None, None
+    if not conn: return None
+    cursor = conn.cursor()
+    cursor.execute("SELECT ID, ChecklistID FROM Submissoes WHERE ID = ? AND UsuarioID = ? AND Status = 'Rascunho'", submission_id, user_id)
+    row = cursor.fetchone()
+    conn.close()
+    return row
 
-    # Primeiro, busca a estrutura do checklist
+def save_draft_component(submission_id, user_id, component_id, responses, observation=None):
+    """
+    Grava as respostas de um único componente num rascunho do usuário (autosave).
+    `responses` ({tipo_id: valor}) substitui só os tipos enviados; os demais, inclusive as
+    fotos, ficam como estão. Com observation=None a observação gravada é mantida.
+    Retorna True, False em caso de erro, ou None se a submissão não for um rascunho do usuário.
+    """
+    conn = get_connection()
+    if not conn: return False
     cursor = conn.cursor()
-    cursor.execute("SELECT ChecklistID FROM Submissoes WHERE ID = ?", submission_id)
-    checklist_id_row = cursor.fetchone()
-    if not checklist_id_row:
+    try:
+        # O filtro por Status vale dentro da transação: um rascunho finalizado enquanto isso não é alterado
+        cursor.execute("UPDATE Submissoes SET Status = Status WHERE ID = ? AND UsuarioID = ? AND Status = 'Rascunho'", submission_id, user_id)
+        if cursor.rowcount != 1:
+            conn.rollback()
+            return None
+
+        cursor.execute("""
+            SELECT r.TipoRespostaID, r.Resposta, r.Observacao, f.CaminhoFoto
+            FROM Respostas r
+            LEFT JOIN FotosResposta f ON f.RespostaID = r.ID
+            WHERE r.SubmissaoID = ? AND r.ComponenteID = ?
+            ORDER BY r.ID, f.ID
+        """, submission_id, component_id)
+        merged, stored_observation = {}, None
+        for position, (rt_id, value, row_observation, photo_path) in enumerate(cursor.fetchall()):
+            if position == 0: stored_observation = row_observation
+            if photo_path is not None: merged.setdefault(rt_id, []).append(photo_path)
+            else: merged.setdefault(rt_id, value)
+        merged.update({int(rt_id): value for rt_id, value in responses.items()})
+        component = {'responses': merged, 'observation': stored_observation if observation is None else observation}
+
+        _update_answers_diff(cursor, submission_id, {int(component_id): component}, int(component_id))
+        # Rascunhos não entram no resumo diário: basta recalcular o placar gravado
+        _store_submission_scores(cursor, [submission_id])
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Erro no autosave do rascunho: {e}")
+        conn.rollback()
+        return False
+    finally:
         conn.close()
-        return None, None
-    
-    checklist_structure = get_flexible_checklist_for_filling(checklist_id_row.ChecklistID)
 
-    # Depois, busca as respostas existentes para esta submissão
-    cursor.execute("""
-        SELECT r.ComponenteID, r.TipoRespostaID, r.Resposta 
-        FROM Respostas r 
-        WHERE r.SubmissaoID = ?
-    """, submission_id)
-    
-    existing_answers = {}
-    for row in cursor.fetchall():
-        if row.ComponenteID not in existing_answers:
-            existing_answers[row.ComponenteID] = {}
-        # Armazena a resposta, usando o TipoRespostaID como chave
-        if row.TipoRespostaID:
-            existing_answers[row.ComponenteID][row.TipoRespostaID] = row.Resposta
+# --- Fila de processamento das fotos (ver photo_worker.py) ---
+def enqueue_photo_job(final_name, received):
+    """Registra uma foto recebida para processamento em segundo plano. Retorna o ID do job (None em caso de erro)."""
+    conn = get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO FilaFotos (CaminhoFoto, CaminhoRecebido) OUTPUT INSERTED.ID VALUES (?, ?)", final_name, received)
+        job_id = cursor.fetchone()[0]
+        conn.commit()
+        return int(job_id)
+    except Exception as e:
+        print(f"Erro ao registrar a foto na fila: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
 
-    conn.close()
-    return checklist_structure, existing_answers
+def claim_photo_job(job_id):
+    """
+    Passa um job 'Pendente' para 'Processando' e retorna a linha (ID, CaminhoFoto, CaminhoRecebido,
+    Tentativas), já com a tentativa contada. None se o job não está pendente (outro worker o pegou).
+    """
+    conn = get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE FilaFotos SET Status = 'Processando', Tentativas = Tentativas + 1, AtualizadoEm = GETDATE()
+            WHERE ID = ? AND Status = 'Pendente'
+        """, job_id)
+        if cursor.rowcount != 1:
+            conn.rollback()
+            return None
+        cursor.execute("SELECT ID, CaminhoFoto, CaminhoRecebido, Tentativas FROM FilaFotos WHERE ID = ?", job_id)
+        job = cursor.fetchone()
+        conn.commit()
+        return job
+    except Exception as e:
+        print(f"Erro ao reservar o job de foto {job_id}: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
 
-def update_submission_answers(submission_id, user_id, answers, participants, status='Ativa'):
+def finish_photo_job(job_id, status, digest=None, error=None):
+    """Grava o resultado de um job: 'Concluida' (com o hash da foto), 'Pendente' (tentar de novo) ou 'Falhou'."""
     conn = get_connection()
     if not conn: return False
     cursor = conn.cursor()
     try:
-        cursor.execute("DELETE FROM Respostas WHERE SubmissaoID = ?", submission_id)
-
-        # ATUALIZAMOS AGORA TAMBÉM O 'Status' NA QUERY
-        cursor.execute("UPDATE Submissoes SET UsuarioID = ?, NomeTrabalhadorAuditado = ?, NomeResponsavelArea = ?, Status = ? WHERE ID = ?", 
-                       user_id, participants['worker_name'], participants['area_manager_name'], status, submission_id)
+        cursor.execute("UPDATE FilaFotos SET Status = ?, Hash = ?, Erro = ?, AtualizadoEm = GETDATE() WHERE ID = ?",
+                       status, digest, error, job_id)
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Erro ao finalizar o job de foto {job_id}: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
 
-        for component_id, data in answers.items():
-            responses = data.get('responses', {})
-            observation = data.get('observation')
-            is_first_response = True
+def sweep_photo_jobs(limit, stale_before, purge_before):
+    """
+    Manutenção da fila, feita pela varredura de photo_worker: devolve para 'Pendente' os jobs
+    'Processando' desde antes de stale_before (o processo caiu no meio), apaga os concluídos
+    antes de purge_before e retorna os IDs de até `limit` jobs pendentes, os mais antigos primeiro.
+    """
+    conn = get_connection()
+    if not conn: return []
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE FilaFotos SET Status = 'Pendente' WHERE Status = 'Processando' AND AtualizadoEm < ?", stale_before)
+        cursor.execute("DELETE FROM FilaFotos WHERE Status = 'Concluida' AND AtualizadoEm < ?", purge_before)
+        conn.commit()
+        if limit <= 0: return []
+        cursor.execute(f"SELECT TOP {int(limit)} ID FROM FilaFotos WHERE Status = 'Pendente' ORDER BY ID")
+        return [row.ID for row in cursor.fetchall()]
+    except Exception as e:
+        print(f"Erro na varredura da fila de fotos: {e}")
+        conn.rollback()
+        return []
+    finally:
+        conn.close()
 
-            for rt_id, answer_value in responses.items():
-                obs_to_save = observation if is_first_response else None
-                sql_get_id = "SET NOCOUNT ON; INSERT INTO Respostas (SubmissaoID, ComponenteID, TipoRespostaID, Resposta, Observacao) VALUES (?, ?, ?, ?, ?); SELECT SCOPE_IDENTITY();"
-                
-                if isinstance(answer_value, list):
-                    placeholder_text = f"{len(answer_value)} foto(s) anexada(s)"
-                    cursor.execute(sql_get_id, submission_id, component_id, rt_id, placeholder_text, obs_to_save)
-                    resposta_id = cursor.fetchone()[0]
-                    
-                    for photo_path in answer_value:
-                        cursor.execute("INSERT INTO FotosResposta (RespostaID, CaminhoFoto) VALUES (?, ?)", resposta_id, photo_path)
-                else:
-                    cursor.execute(sql_get_id, submission_id, component_id, rt_id, answer_value, obs_to_save)
-                
-                is_first_response = False
+def take_unreferenced_photos(unreferenced_before, delete, limit=500):
+    """
+    Retira de ArquivosFotos até `limit` fotos sem nenhuma referência em FotosResposta desde antes
+    de unreferenced_before, chamando delete(nome) para apagar cada arquivo antes do commit (um
+    envio que vá reaproveitar uma delas espera, em touch_photo_file, e depois já não a encontra).
+    Retorna os nomes retirados.
+    """
+    conn = get_connection()
+    if not conn: return []
+    cursor = conn.cursor()
+    try:
+        # Trava as linhas candidatas antes de lê-las: uma foto que ganhe referência nova (um envio
+        # do mesmo conteúdo) espera o fim desta transação e não perde o arquivo
+        cursor.execute("UPDATE ArquivosFotos SET Referencias = Referencias WHERE Referencias <= 0 AND AtualizadoEm < ?", unreferenced_before)
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return []
+        cursor.execute(f"SELECT TOP {int(limit)} CaminhoFoto FROM ArquivosFotos WHERE Referencias <= 0 AND AtualizadoEm < ?", unreferenced_before)
+        names = [row.CaminhoFoto for row in cursor.fetchall()]
+        for name in names:
+            delete(name)
+        for chunk in _chunks(names, _IDS_PER_STATEMENT):
+            cursor.execute(f"DELETE FROM ArquivosFotos WHERE Referencias <= 0 AND CaminhoFoto IN ({', '.join('?' * len(chunk))})", chunk)
+        conn.commit()
+        return names
+    except Exception as e:
+        print(f"Erro ao buscar as fotos sem referências: {e}")
+        conn.rollback()
+        return []
+    finally:
+        conn.close()
 
+def touch_photo_file(filename):
+    """
+    Renova ArquivosFotos.AtualizadoEm de uma foto já gravada que um envio vai reaproveitar
+    (criando a linha, ainda sem referências, se não houver), para a varredura de photo_worker
+    não apagá-la antes de a submissão ser gravada. Se uma varredura estiver apagando a foto,
+    espera ela terminar: depois disso, se o arquivo ainda existe, está protegido pela carência.
+    Retorna False em caso de erro.
+    """
+    conn = get_connection()
+    if not conn: return False
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE ArquivosFotos SET AtualizadoEm = GETDATE() WHERE CaminhoFoto = ?", filename)
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO ArquivosFotos (CaminhoFoto, Referencias) VALUES (?, 0)", filename)
         conn.commit()
         return True
+    except _backend.IntegrityError:
+        conn.rollback()
+        return True  # a linha acabou de ser criada por outra gravação (o gatilho de FotosResposta)
     except Exception as e:
-        print(f"Erro ao atualizar respostas: {e}")
+        print(f"Erro ao renovar a foto {filename}: {e}")
         conn.rollback()
         return False
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def get_photo_job(final_name):
+    """Job ainda não concluído de uma foto: (Status, CaminhoRecebido), ou None se ela já foi processada."""
+    conn = get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT TOP 1 Status, CaminhoRecebido FROM FilaFotos WHERE CaminhoFoto = ? AND Status <> 'Concluida' ORDER BY ID DESC", final_name)
+        return cursor.fetchone()
+    except Exception as e:
+        print(f"Erro ao consultar a fila de fotos: {e}")
+        return None
+    finally:
+        conn.close()
+
+def get_photo_names_in_use(photo_names, received_names=()):
+    """
+    Quais dos nomes informados (relativos à pasta de uploads) ainda estão em uso: fotos com
+    linha em ArquivosFotos (mantida pelos gatilhos de FotosResposta; as sem referências ficam
+    para a varredura de photo_worker) ou com job pendente em FilaFotos, e arquivos recebidos de
+    jobs ainda não concluídos. Retorna um set, ou None se não houver conexão.
+    """
+    conn = get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    in_use = set()
+    try:
+        for chunk in _chunks(list(dict.fromkeys(photo_names)), _IDS_PER_STATEMENT // 2):
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f"""
+                SELECT CaminhoFoto FROM ArquivosFotos WHERE CaminhoFoto IN ({placeholders})
+                UNION
+                SELECT CaminhoFoto FROM FilaFotos WHERE Status <> 'Concluida' AND CaminhoFoto IN ({placeholders})
+            """, [*chunk, *chunk])
+            in_use.update(row.CaminhoFoto for row in cursor.fetchall())
+        for chunk in _chunks(list(dict.fromkeys(received_names)), _IDS_PER_STATEMENT):
+            cursor.execute(f"""
+                SELECT CaminhoRecebido FROM FilaFotos
+                WHERE Status <> 'Concluida' AND CaminhoRecebido IN ({', '.join('?' * len(chunk))})
+            """, chunk)
+            in_use.update(row.CaminhoRecebido for row in cursor.fetchall())
+        return in_use
+    except Exception as e:
+        print(f"Erro ao consultar as fotos em uso: {e}")
+        return None
+    finally:
+        conn.close()
+
+def get_submission_photo_status(submission_id):
+    """Fotos da submissão que ainda não foram processadas, por situação: {'Pendente': 2, 'Falhou': 1}."""
+    conn = get_connection()
+    if not conn: return {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT q.Status, COUNT(*) AS Total
+            FROM FotosResposta f
+            JOIN Respostas r ON r.ID = f.RespostaID
+            JOIN FilaFotos q ON q.CaminhoFoto = f.CaminhoFoto
+            WHERE r.SubmissaoID = ? AND q.Status <> 'Concluida'
+            GROUP BY q.Status
+        """, submission_id)
+        return {row.Status: row.Total for row in cursor.fetchall()}
+    except Exception as e:
+        print(f"Erro ao consultar as fotos da submissão {submission_id} na fila: {e}")
+        return {}
+    finally:
+        conn.close()
+
+# Associa as consultas de cada função pública deste módulo ao nome dela (deve ficar no fim do arquivo)
+instrumentation.instrument_functions(globals())
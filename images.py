@@ -0,0 +1,229 @@
+# images.py
+# Tratamento das fotos enviadas. Cada upload é reduzido (config.IMAGE_CONFIG['max_edge']),
+# recomprimido em WebP ou JPEG progressivo e ganha miniaturas de tamanho fixo, que as telas
+# usam no lugar da foto inteira. As fotos são endereçadas pelo conteúdo: o nome é o SHA-256
+# do arquivo enviado, repartido em subpastas (ab/cd/abcd...), então o mesmo arquivo enviado
+# de novo (numa reedição, por exemplo) reaproveita a foto já gravada.
+#   uploads/_recebidas/<nome>                       arquivo como chegou, até ser processado
+#   uploads/ab/cd/<sha256>.webp                     foto gravada (o nome que fica em FotosResposta)
+#   uploads/_variantes/<variante>/ab/cd/<sha256>    miniaturas, uma pasta por variante
+# Fotos gravadas antes disso continuam na raiz de uploads/, com o nome antigo.
+# O Pillow está em requirements.txt; se faltar, as fotos ficam como chegaram e as telas recebem a foto original.
+import hashlib
+import os
+import shutil
+import threading
+
+from config import IMAGE_CONFIG
+
+try:
+    from PIL import Image, ImageOps  # pip install Pillow (requirements.txt)
+except ImportError:
+    Image = ImageOps = None
+
+RECEIVED_DIR = '_recebidas'
+VARIANTS_DIR = '_variantes'
+VARIANTS = IMAGE_CONFIG.get('variants', {})
+_EXTENSIONS = {'WEBP': '.webp', 'JPEG': '.jpg'}
+
+if Image is not None:
+    Image.MAX_IMAGE_PIXELS = IMAGE_CONFIG.get('max_pixels', Image.MAX_IMAGE_PIXELS)
+
+
+def enabled():
+    return Image is not None and IMAGE_CONFIG.get('enabled', True)
+
+
+def _format():
+    return IMAGE_CONFIG.get('format', 'WEBP').upper()
+
+
+def variant_name(filename, variant):
+    """Caminho da miniatura `variant` de uma foto, relativo à pasta de uploads."""
+    return f"{VARIANTS_DIR}/{variant}/{os.path.splitext(filename)[0]}{_EXTENSIONS[_format()]}"
+
+
+# Extensões que uma foto gravada pode ter: as permitidas no envio e as dos formatos de
+# _EXTENSIONS (as fotos antigas, na raiz de uploads/, podem tê-las em maiúsculas)
+_PHOTO_EXTENSIONS = ('.webp', '.jpg', '.jpeg', '.png', '.gif')
+
+
+def variant_sources(relative):
+    """
+    Nomes possíveis da foto de que uma miniatura (caminho relativo à pasta de uploads, dentro de
+    _variantes/) foi gerada: a miniatura troca a extensão da foto pela do formato configurado.
+    """
+    parts = relative.split('/')
+    if len(parts) < 3 or parts[0] != VARIANTS_DIR: return []
+    base = os.path.splitext('/'.join(parts[2:]))[0]
+    return [base + extension for extension in _PHOTO_EXTENSIONS] + [base + extension.upper() for extension in _PHOTO_EXTENSIONS]
+
+
+def _for_format(image, fmt):
+    """Converte o modo de cor para um que o formato grava (JPEG não tem transparência: o fundo fica branco)."""
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    if not has_alpha:
+        return image if image.mode == 'RGB' else image.convert('RGB')
+    image = image.convert('RGBA')
+    if fmt == 'WEBP':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _temporary(path):
+    # Um nome por thread: duas cópias do mesmo conteúdo podem ser processadas ao mesmo tempo
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+
+def _save(image, path):
+    """Grava a imagem no formato configurado, num arquivo temporário trocado no fim (leitores nunca veem meio arquivo)."""
+    fmt = _format()
+    image = _for_format(image, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = _temporary(path)
+    if fmt == 'JPEG':
+        image.save(temporary, 'JPEG', quality=IMAGE_CONFIG.get('quality', 80), optimize=True, progressive=True)
+    else:
+        image.save(temporary, 'WEBP', quality=IMAGE_CONFIG.get('quality', 80), method=4)
+    os.replace(temporary, path)
+
+
+def _open_reduced(path, size, crop=False):
+    """
+    Abre a imagem já na orientação do EXIF. JPEGs são decodificados direto numa escala menor
+    (bem mais rápido numa foto de 12 MP), mantendo o lado maior ≥ size (ou o menor, se crop).
+    """
+    with Image.open(path) as original:
+        animated = getattr(original, 'is_animated', False)
+        scale = (min if crop else max)(original.size) / size
+        if scale > 1:
+            original.draft(None, (int(original.width / scale), int(original.height / scale)))
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    return image, animated
+
+
+def _save_variant(image, path, size, crop):
+    if crop:
+        side = min(size, *image.size)  # sem ampliar imagens menores que a miniatura
+        thumbnail = ImageOps.fit(image, (side, side), Image.LANCZOS)
+    else:
+        thumbnail = image.copy()
+        thumbnail.thumbnail((size, size), Image.LANCZOS)
+    _save(thumbnail, path)
+
+
+def stored_name(digest, filename):
+    """
+    Nome com que uma foto fica gravada, a partir do SHA-256 do arquivo enviado: ab/cd/<hash>.<ext>.
+    A extensão segue o formato configurado (GIFs, e tudo quando não há Pillow, mantêm a original).
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if enabled() and extension != '.gif': extension = _EXTENSIONS[_format()]
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def save_received(file, path):
+    """Grava o arquivo enviado em path calculando o SHA-256 no caminho. Retorna (hash, bytes)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    with open(path, 'wb') as out:
+        for block in iter(lambda: file.stream.read(1024 * 1024), b''):
+            digest.update(block)
+            out.write(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+def store_received(folder, received, final_name):
+    """Move o arquivo recebido, sem processá-lo, para o nome final (sem o Pillow, ou se a imagem não pôde ser lida)."""
+    final_path = os.path.join(folder, final_name)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(os.path.join(folder, received), final_path)
+    return final_name
+
+
+def delete_photo(folder, filename):
+    """Apaga uma foto gravada e as suas miniaturas (as que existirem)."""
+    for relative in [filename, *(variant_name(filename, variant) for variant in VARIANTS)]:
+        try:
+            os.remove(os.path.join(folder, relative))
+        except FileNotFoundError:
+            pass
+
+
+def received_name(filename):
+    """Onde o arquivo enviado fica, como chegou, até ser processado (relativo à pasta de uploads)."""
+    return f"{RECEIVED_DIR}/{filename}"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def process_received(folder, received, final_name):
+    """
+    Processa o arquivo recebido (caminho relativo a folder) para folder/final_name: aplica a
+    orientação do EXIF, reduz, recomprime (sem os metadados, como o GPS), gera as miniaturas
+    e apaga o arquivo recebido. Retorna o SHA-256 da foto final. Levanta exceção se a imagem
+    não puder ser lida. Se a foto final já existe (o mesmo conteúdo foi enviado e processado
+    antes, ou a chamada é repetida), só descarta o arquivo recebido.
+    """
+    source, final_path = os.path.join(folder, received), os.path.join(folder, final_name)
+    if os.path.exists(final_path):
+        if os.path.exists(source): os.remove(source)
+        return _sha256(final_path)
+    max_edge = IMAGE_CONFIG.get('max_edge', 1600)
+    image, animated = _open_reduced(source, max_edge)
+    if animated or os.path.splitext(final_name)[1].lower() == '.gif':
+        # GIFs ficam como chegaram; as miniaturas usam o primeiro quadro
+        temporary = _temporary(final_path)
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, final_path)
+    else:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        _save(image, final_path)
+    for variant, (size, crop) in VARIANTS.items():
+        _save_variant(image, os.path.join(folder, variant_name(final_name, variant)), size, crop)
+    os.remove(source)
+    return _sha256(final_path)
+
+
+def process_upload(folder, received, final_name):
+    """
+    Processa na hora uma foto recebida (quando não há threads de fundo, ver photo_worker.py).
+    Retorna o nome gravado: final_name ou, se a imagem não puder ser lida, o arquivo como chegou.
+    """
+    try:
+        process_received(folder, received, final_name)
+        return final_name
+    except Exception as e:
+        print(f"Erro ao processar a foto {received}: {e}")
+        # Fica como chegou, com a extensão original no lugar da do formato configurado
+        return store_received(folder, received, os.path.splitext(final_name)[0] + os.path.splitext(received)[1].lower())
+
+
+def ensure_variant(folder, filename, variant):
+    """
+    Caminho (relativo a folder) da miniatura `variant` da foto, gerada agora se ainda não
+    existir (fotos enviadas antes das miniaturas). None se não houver como gerá-la.
+    """
+    if variant not in VARIANTS: return None
+    relative = variant_name(filename, variant)
+    if os.path.exists(os.path.join(folder, relative)): return relative
+    source = os.path.join(folder, filename)
+    if not enabled() or not os.path.exists(source): return None
+    size, crop = VARIANTS[variant]
+    try:
+        image, _ = _open_reduced(source, size, crop)
+        _save_variant(image, os.path.join(folder, relative), size, crop)
+        return relative
+    except Exception as e:
+        print(f"Erro ao gerar a miniatura {variant} de {filename}: {e}")
+        return None
@@ -0,0 +1,256 @@
+# instrumentation.py
+# Instrumentação das consultas ao banco: cada cursor.execute é cronometrado (execução + leitura
+# das linhas), associado a uma "impressão digital" do texto SQL, à função de database.py que o
+# originou e ao endpoint Flask da requisição em andamento. O custo por consulta é o de duas
+# leituras de relógio e algumas operações em dicionário; nada é compartilhado entre threads.
+import functools
+import hashlib
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger('checklist.sql')
+
+_local = threading.local()
+_settings = {'enabled': True, 'slow_query_ms': 500, 'log_requests': False}
+
+_SPACES = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_ROWS = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+
+
+def configure(enabled=True, slow_query_ms=500, slow_query_log=None, log_requests=False, **_):
+    """Aplica QUERY_LOG_CONFIG. Com slow_query_log, as consultas lentas também vão para esse arquivo."""
+    _settings.update(enabled=enabled, slow_query_ms=slow_query_ms, log_requests=log_requests)
+    if slow_query_log and not any(getattr(h, 'baseFilename', None) == os.path.abspath(slow_query_log) for h in logger.handlers):
+        os.makedirs(os.path.dirname(os.path.abspath(slow_query_log)), exist_ok=True)
+        handler = logging.FileHandler(slow_query_log, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+    if log_requests and logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+        if not logger.handlers: logger.addHandler(logging.StreamHandler())
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Normaliza o SQL (espaços, literais, listas de '?' de tamanho variável) e retorna
+    (hash curto, texto normalizado). Consultas que só diferem nos valores têm o mesmo hash.
+    """
+    text = _SPACES.sub(' ', sql).strip()
+    text = _LITERALS.sub('?', text)
+    text = _PLACEHOLDER_LISTS.sub('(?+)', text)
+    text = _REPEATED_ROWS.sub('(?+), ...', text)
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:12], text
+
+
+# --- Requisição em andamento ---
+class RequestStats:
+    __slots__ = ('endpoint', 'label', 'queries', 'seconds', 'fingerprints')
+
+    def __init__(self, endpoint, label):
+        self.endpoint, self.label = endpoint, label
+        self.queries, self.seconds, self.fingerprints = 0, 0.0, {}
+
+    @property
+    def milliseconds(self):
+        return self.seconds * 1000
+
+    def most_repeated(self):
+        """(impressão digital, vezes) da consulta mais repetida — um N+1 aparece aqui."""
+        if not self.fingerprints: return None, 0
+        return max(self.fingerprints.items(), key=lambda item: item[1])
+
+
+def start_request(endpoint, label=None):
+    _local.request = RequestStats(endpoint, label or endpoint)
+
+
+def finish_request():
+    """Encerra a contagem da requisição desta thread e a retorna (ou None se não havia)."""
+    stats = getattr(_local, 'request', None)
+    _local.request = None
+    if stats is not None and _settings['log_requests']:
+        repeated, times = stats.most_repeated()
+        logger.info("%s (%s): %d consultas, %.1f ms no banco%s", stats.label, stats.endpoint, stats.queries,
+                    stats.milliseconds, f", mais repetida {repeated} x{times}" if times > 1 else "")
+    return stats
+
+
+def _record(sql, seconds, rows):
+    fp, text = fingerprint(sql)
+    stats = getattr(_local, 'request', None)
+    if stats is not None:
+        stats.queries += 1
+        stats.seconds += seconds
+        stats.fingerprints[fp] = stats.fingerprints.get(fp, 0) + 1
+    if seconds * 1000 >= _settings['slow_query_ms']:
+        logger.warning("Consulta lenta: %.1f ms, %s linhas, endpoint=%s, função=%s, fp=%s: %s",
+                       seconds * 1000, rows, stats.endpoint if stats else '-',
+                       getattr(_local, 'function', None) or '-', fp, text[:500])
+
+
+# --- Cursores e conexões ---
+class InstrumentedCursor:
+    """
+    Repassa tudo ao cursor real. O tempo de uma consulta soma o execute e as leituras
+    (fetch*) das linhas dela; é registrado quando as linhas acabam, no próximo execute
+    ou quando a conexão é devolvida.
+    """
+    __slots__ = ('_cursor', '_sql', '_seconds', '_rows')
+
+    def __init__(self, cursor):
+        self._cursor, self._sql = cursor, None
+
+    def execute(self, sql, *params):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self._run(self._cursor.executemany, sql, (params,))
+
+    def _run(self, method, sql, params):
+        self.finish()
+        start = time.perf_counter()
+        try:
+            method(sql, *params)
+        except Exception:
+            _record(sql, time.perf_counter() - start, 0)
+            raise
+        self._sql, self._seconds, self._rows = sql, time.perf_counter() - start, 0
+        if self._cursor.description is None:
+            # Sem conjunto de resultados (INSERT/UPDATE/DELETE/DDL): já terminou
+            self._rows = self._cursor.rowcount
+            self.finish()
+        return self
+
+    def _fetched(self, start, rows, exhausted):
+        if self._sql is None: return
+        self._seconds += time.perf_counter() - start
+        self._rows += rows
+        if exhausted: self.finish()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(start, len(rows), not rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def fetchval(self):
+        start = time.perf_counter()
+        value = self._cursor.fetchval()
+        self._fetched(start, 1, True)
+        return value
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def finish(self):
+        """Registra a consulta pendente, se houver."""
+        if self._sql is None: return
+        sql, self._sql = self._sql, None
+        _record(sql, self._seconds, self._rows)
+
+    def close(self):
+        self.finish()
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name in InstrumentedCursor.__slots__: object.__setattr__(self, name, value)
+        else: setattr(self._cursor, name, value)
+
+
+class InstrumentedConnection:
+    """Conexão cujos cursores são instrumentados. close() registra o que ficou pendente."""
+
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_cursors', [])
+
+    def cursor(self):
+        cursor = InstrumentedCursor(self._conn.cursor())
+        self._cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        for cursor in self._cursors: cursor.finish()
+        self._cursors.clear()
+        self._conn.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # Permite 'conn.autocommit = False' como numa conexão pyodbc comum
+        setattr(self._conn, name, value)
+
+
+def instrument_connection(conn):
+    return InstrumentedConnection(conn) if _settings['enabled'] and conn is not None else conn
+
+
+# --- Funções de database.py ---
+def _enter(name):
+    # Vale a função mais externa: get_submission_details chamando um helper continua sendo get_submission_details
+    previous = getattr(_local, 'function', None)
+    if previous is None: _local.function = name
+    return previous
+
+
+def traced(func):
+    """Associa as consultas feitas durante func (inclusive geradores) ao nome dela."""
+    name = func.__name__
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            try:
+                while True:
+                    previous = _enter(name)
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        return
+                    finally:
+                        _local.function = previous
+                    yield item
+            finally:
+                gen.close()
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = _enter(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.function = previous
+    return wrapper
+
+
+def instrument_functions(namespace):
+    """Aplica traced() às funções públicas definidas no módulo dono de `namespace` (use globals())."""
+    if not _settings['enabled']: return
+    module = namespace['__name__']
+    for name, value in list(namespace.items()):
+        if not name.startswith('_') and inspect.isfunction(value) and value.__module__ == module:
+            namespace[name] = traced(value)
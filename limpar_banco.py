@@ -1,5 +1,14 @@
 # limpar_banco.py
+# Limpezas do banco e da pasta de uploads. Uso:
+#   python limpar_banco.py                          submissões sem nenhuma resposta
+#   python limpar_banco.py --fotos-orfas [--apagar] [--lote 1000] [--idade-minima 24] [--listar]
+import argparse
+import os
+import time
 import database as db
+import images
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 
 def limpar_submissoes_vazias():
     print("--- Iniciando Limpeza de Submissões Vazias ---")
@@ -47,5 +56,107 @@ def limpar_submissoes_vazias():
     finally:
         conn.close()
 
+def _arquivos_de_upload(pasta, relativo=''):
+    """Percorre a pasta de uploads sem listá-la inteira na memória: gera (caminho relativo com '/', DirEntry)."""
+    with os.scandir(os.path.join(pasta, relativo)) as entradas:
+        for entrada in entradas:
+            caminho = f"{relativo}/{entrada.name}" if relativo else entrada.name
+            if entrada.is_dir(follow_symlinks=False):
+                yield from _arquivos_de_upload(pasta, caminho)
+            elif entrada.is_file(follow_symlinks=False):
+                yield caminho, entrada
+
+def _orfas(lote):
+    """
+    Arquivos do lote [(caminho, DirEntry)] que nada no banco referencia. Uma miniatura só é órfã
+    se a foto de que ela foi gerada também for; um arquivo em _recebidas/, se não tiver job
+    pendente. Retorna None se o banco não respondeu (nesse caso nada deve ser apagado).
+    """
+    fotos, recebidas = [], []
+    for caminho, _ in lote:
+        if caminho.startswith(images.VARIANTS_DIR + '/'):
+            fotos.extend(images.variant_sources(caminho))
+        elif caminho.startswith(images.RECEIVED_DIR + '/'):
+            recebidas.append(caminho)
+        else:
+            fotos.append(caminho)
+    em_uso = db.get_photo_names_in_use(fotos, recebidas)
+    if em_uso is None: return None
+    orfas = []
+    for caminho, entrada in lote:
+        if caminho.startswith(images.VARIANTS_DIR + '/'):
+            usada = any(nome in em_uso for nome in images.variant_sources(caminho))
+        else:
+            usada = caminho in em_uso
+        if not usada: orfas.append((caminho, entrada))
+    return orfas
+
+def limpar_fotos_orfas(pasta=UPLOAD_FOLDER, apagar=False, tamanho_lote=1000, idade_minima_horas=24, listar=False):
+    """
+    Procura (e, com apagar=True, apaga) os arquivos de uploads/ que nenhuma foto do banco referencia:
+    os deixados por submissões excluídas, respostas reeditadas ou envios que falharam no meio.
+    A pasta é lida aos poucos e consultada no banco em lotes, sem carregar a lista inteira de
+    arquivos nem de fotos. Arquivos mais novos que idade_minima_horas são ignorados: podem ser
+    de um envio ainda em andamento, cuja resposta não foi gravada.
+    """
+    acao = "Removendo" if apagar else "Procurando (simulação, nada será apagado)"
+    print(f"--- {acao} fotos órfãs em {pasta} ---")
+    if not os.path.isdir(pasta):
+        print("Erro: a pasta de uploads não existe.")
+        return
+    limite = time.time() - idade_minima_horas * 3600
+    totais = {'verificados': 0, 'orfas': 0, 'bytes': 0, 'apagados': 0}
+
+    def processar(lote):
+        orfas = _orfas(lote)
+        if orfas is None:
+            print("Erro: Não foi possível consultar o banco de dados. Nenhum arquivo foi apagado.")
+            return False
+        for caminho, entrada in orfas:
+            tamanho = entrada.stat(follow_symlinks=False).st_size
+            totais['orfas'] += 1
+            totais['bytes'] += tamanho
+            if listar: print(f"  {caminho} ({tamanho / 1024:.0f} KB)")
+            if apagar:
+                try:
+                    os.remove(entrada.path)
+                    totais['apagados'] += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"  Erro ao apagar {caminho}: {e}")
+        print(f"  {totais['verificados']} arquivos verificados, {totais['orfas']} órfãos até agora...")
+        return True
+
+    lote = []
+    for caminho, entrada in _arquivos_de_upload(pasta):
+        if entrada.stat(follow_symlinks=False).st_mtime > limite: continue
+        totais['verificados'] += 1
+        lote.append((caminho, entrada))
+        if len(lote) >= tamanho_lote:
+            if not processar(lote): return
+            lote = []
+    if lote and not processar(lote): return
+
+    espaco = f"{totais['bytes'] / 1024 / 1024:.1f} MB"
+    if apagar:
+        print(f"Concluído! {totais['apagados']} de {totais['orfas']} arquivos órfãos apagados ({espaco} liberados).")
+    elif totais['orfas']:
+        print(f"{totais['orfas']} arquivos órfãos ({espaco}). Rode de novo com --apagar para removê-los.")
+    else:
+        print("A pasta de uploads está limpa! Nenhum arquivo órfão foi encontrado.")
+
 if __name__ == "__main__":
-    limpar_submissoes_vazias()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Limpezas do banco e da pasta de uploads.")
+    parser.add_argument('--fotos-orfas', action='store_true', help="Procura arquivos de uploads/ sem referência no banco.")
+    parser.add_argument('--apagar', action='store_true', help="Apaga os arquivos órfãos (sem isso, só lista e soma).")
+    parser.add_argument('--lote', type=int, default=1000, help="Arquivos consultados no banco por vez (padrão: 1000).")
+    parser.add_argument('--idade-minima', type=float, default=24,
+                        help="Ignora arquivos modificados há menos destas horas (padrão: 24).")
+    parser.add_argument('--listar', action='store_true', help="Mostra cada arquivo órfão encontrado.")
+    parser.add_argument('--pasta', default=UPLOAD_FOLDER, help="Pasta de uploads (padrão: uploads/ ao lado deste arquivo).")
+    args = parser.parse_args()
+    if args.fotos_orfas:
+        limpar_fotos_orfas(args.pasta, args.apagar, args.lote, args.idade_minima, args.listar)
+    else:
+        limpar_submissoes_vazias()
@@ -0,0 +1,243 @@
+# manutencao.py
+# Comandos de manutenção do banco. Uso:
+#   python manutencao.py backfill-placar [--lote 500] [--todas]
+#   python manutencao.py reconstruir-resumo
+#   python manutencao.py migrar [--ate N] [--status]
+#   python manutencao.py medir-consultas [--repeticoes 5] [--plano] [--salvar antes.json] [--comparar antes.json]
+# Numa instalação existente, a ordem é: migrar, backfill-placar. O backfill mantém o resumo
+# diário junto com o placar de cada submissão; reconstruir-resumo recria o resumo a partir
+# dos placares gravados, então só dá o resultado completo depois do backfill.
+import argparse
+import json
+import re
+import statistics
+import time
+from datetime import date, timedelta
+import backends
+import database as db
+
+def backfill_placar(args):
+    print("--- Gravando o placar de conformidade das submissões existentes ---")
+    if db.apply_migrations() is None:
+        print("Erro: não foi possível aplicar as migrações pendentes.")
+        return
+    processed = 0
+    for processed in db.backfill_submission_scores(batch_size=args.lote, only_missing=not args.todas):
+        print(f"  {processed} submissões processadas...")
+    print(f"Concluído! {processed} submissões atualizadas.")
+
+def reconstruir_resumo(args):
+    print("--- Reconstruindo o resumo diário de conformidade ---")
+    if db.apply_migrations() is None:
+        print("Erro: não foi possível aplicar as migrações pendentes.")
+        return
+    count = db.rebuild_compliance_summary()
+    if count is None:
+        print("Erro: a reconstrução falhou e foi desfeita.")
+        return
+    print(f"Concluído! {count} linhas (dia × checklist × colaborador) gravadas.")
+
+def migrar(args):
+    if args.status:
+        status = db.get_migration_status()
+        if status is None:
+            print("Erro: Não foi possível conectar ao banco de dados.")
+            return
+        for version, description, applied_at in status:
+            situation = applied_at.strftime('%d/%m/%Y %H:%M') if applied_at else 'pendente'
+            print(f"  {version:03d}  {situation:<16}  {description}")
+        return
+    print("--- Aplicando migrações de esquema ---")
+    applied = db.apply_migrations(target=args.ate)
+    if applied is None:
+        print("Erro: a migração falhou e foi desfeita; as seguintes não foram aplicadas.")
+    elif not applied:
+        print("O esquema já está atualizado.")
+    else:
+        print(f"Concluído! {len(applied)} migração(ões) aplicada(s).")
+
+# --- Medição das consultas ---
+class _RecordingCursor:
+    """Cursor que anota cada comando executado (texto e parâmetros) antes de repassá-lo."""
+    def __init__(self, cursor, statements):
+        self._cursor, self._statements = cursor, statements
+
+    def execute(self, sql, *params):
+        self._statements.append((sql, params))
+        return self._cursor.execute(sql, *params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _RecordingConnection:
+    def __init__(self, conn, statements):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_statements', statements)
+
+    def cursor(self):
+        return _RecordingCursor(self._conn.cursor(), self._statements)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+def _record_statements(func):
+    """Executa func() anotando os comandos SQL que ela envia ao banco."""
+    statements, original = [], db.get_connection
+    def recording_connection():
+        conn = original()
+        return _RecordingConnection(conn, statements) if conn else conn
+    db.get_connection = recording_connection
+    try:
+        func()
+    finally:
+        db.get_connection = original
+    return statements
+
+def _sample_ids():
+    """IDs reais (os de maior volume) para exercitar as consultas."""
+    conn = db.get_connection()
+    if not conn: return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT TOP 1 UsuarioID FROM Coordenadores_Setores GROUP BY UsuarioID ORDER BY COUNT(*) DESC")
+        coordinator = cursor.fetchone()
+        cursor.execute("SELECT TOP 1 UsuarioID FROM Submissoes GROUP BY UsuarioID ORDER BY COUNT(*) DESC")
+        collaborator = cursor.fetchone()
+        cursor.execute("SELECT TOP 1 ChecklistID FROM ComponentesChecklist GROUP BY ChecklistID ORDER BY COUNT(*) DESC")
+        checklist = cursor.fetchone()
+        cursor.execute("SELECT TOP 1 SubmissaoID FROM Respostas GROUP BY SubmissaoID ORDER BY COUNT(*) DESC")
+        submission = cursor.fetchone()
+    finally:
+        conn.close()
+    if not (coordinator and collaborator and checklist and submission): return None
+    return {'coordinator': coordinator[0], 'collaborator': collaborator[0], 'checklist': checklist[0], 'submission': submission[0]}
+
+def _hot_calls(ids):
+    """As funções de database.py que atendem às telas mais usadas."""
+    today = date.today()
+    coordinator = ids['coordinator']
+    return [
+        ('carregar_checklist', lambda: db._load_flexible_checklist(ids['checklist'])),
+        ('detalhes_submissao', lambda: db.get_submission_details(ids['submission'])),
+        ('reenvio_submissao', lambda: db.get_submission_for_resubmit(ids['submission'])),
+        ('historico_colaborador', lambda: db.get_submissions_for_collaborator_page(ids['collaborator'], 1, 5)),
+        ('respostas_coordenador', lambda: db.get_submissions_for_coordinator_page(coordinator, 1, 10)),
+        ('checklists_coordenador', lambda: db.get_checklists_for_coordinator_page(coordinator, 1, 10)),
+        ('equipe_coordenador', lambda: db.get_manageable_users(coordinator)),
+        ('relatorio_pagina', lambda: db.get_filtered_submissions_page(coordinator, 1, 100)),
+        ('relatorio_placar', lambda: db.get_submission_scores(coordinator)),
+        ('tendencia_anual', lambda: db.get_compliance_trend(coordinator, today - timedelta(days=365), today)),
+    ]
+
+_PLAN_OBJECT = re.compile(r"OBJECT:\(\[[^\]]+\]\.\[[^\]]+\]\.\[([^\]]+)\](?:\.\[([^\]]+)\])?")
+_SCAN_OPERATORS = ('Table Scan', 'Clustered Index Scan', 'Index Scan')
+
+def _explain_sqlite(cursor, statements):
+    # EXPLAIN QUERY PLAN não estima custo; as linhas 'SCAN ...' são as varreduras
+    scans = []
+    for sql, params in statements:
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')): continue
+        for text, count in backends.translate(sql):
+            rows = cursor.execute("EXPLAIN QUERY PLAN " + text, *params[:count]).fetchall()
+            params = params[count:]
+            scans.extend(row.detail[5:] for row in rows if row.detail.startswith('SCAN '))
+    return 0.0, sorted(set(scans))
+
+def _explain(cursor, statements):
+    """
+    Plano estimado (SET SHOWPLAN_ALL) das consultas de leitura anotadas.
+    Retorna (custo estimado somado, lista de 'Tabela.Índice' lidos por varredura).
+    """
+    if db.BACKEND == 'sqlite': return _explain_sqlite(cursor, statements)
+    cost, scans = 0.0, []
+    cursor.execute("SET SHOWPLAN_ALL ON")
+    try:
+        for sql, params in statements:
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')): continue
+            cursor.execute(sql, *params)
+            rows = cursor.fetchall()
+            cost += float(rows[0].TotalSubtreeCost or 0) if rows else 0.0
+            for row in rows:
+                match = _PLAN_OBJECT.search(row.Argument or '') if row.PhysicalOp in _SCAN_OPERATORS else None
+                if match: scans.append('.'.join(filter(None, match.groups())))
+    finally:
+        cursor.execute("SET SHOWPLAN_ALL OFF")
+    return cost, sorted(set(scans))
+
+def medir_consultas(args):
+    ids = _sample_ids()
+    if ids is None:
+        print("Erro: sem conexão ou sem dados suficientes (coordenador, submissões e checklists) para medir.")
+        return
+    print(f"--- Medindo as consultas principais ({args.repeticoes} repetições) com {ids} ---")
+    plan_conn = db.get_connection() if args.plano else None
+    results = {}
+    try:
+        for name, call in _hot_calls(ids):
+            statements = _record_statements(call)
+            timings = []
+            for _ in range(args.repeticoes):
+                start = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - start) * 1000)
+            result = {'ms': round(statistics.median(timings), 2), 'consultas': len(statements)}
+            if plan_conn:
+                try:
+                    result['custo'], result['varreduras'] = _explain(plan_conn.cursor(), statements)
+                except Exception as e:
+                    print(f"  Aviso: plano indisponível para {name}: {e}")
+            results[name] = result
+    finally:
+        if plan_conn: plan_conn.close()
+
+    baseline = {}
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print(f"\n{'Consulta':<24}{'ms':>10}{'antes':>10}{'variação':>10}{'SQLs':>6}{'custo':>10}")
+    for name, result in results.items():
+        before = baseline.get(name, {}).get('ms')
+        change = f"{(result['ms'] - before) / before * 100:+.0f}%" if before else '-'
+        cost = f"{result['custo']:.3f}" if 'custo' in result else '-'
+        print(f"{name:<24}{result['ms']:>10.2f}{before if before is not None else '-':>10}{change:>10}{result['consultas']:>6}{cost:>10}")
+        if result.get('varreduras'):
+            print(f"{'':<4}varreduras: {', '.join(result['varreduras'])}")
+
+    if args.salvar:
+        with open(args.salvar, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados salvos em {args.salvar}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Comandos de manutenção do banco de dados do checklist.")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    cmd = subparsers.add_parser('backfill-placar', help="Grava o placar de conformidade nas submissões que ainda não o têm.")
+    cmd.add_argument('--lote', type=int, default=500, help="Submissões por transação (padrão: 500).")
+    cmd.add_argument('--todas', action='store_true', help="Recalcula também as submissões que já têm placar.")
+    cmd.set_defaults(func=backfill_placar)
+
+    cmd = subparsers.add_parser('reconstruir-resumo', help="Recria o resumo diário de conformidade a partir das submissões ativas.")
+    cmd.set_defaults(func=reconstruir_resumo)
+
+    cmd = subparsers.add_parser('migrar', help="Aplica as migrações de esquema pendentes (colunas, tabelas e índices).")
+    cmd.add_argument('--ate', type=int, help="Aplica só até esta versão.")
+    cmd.add_argument('--status', action='store_true', help="Apenas lista as migrações aplicadas e pendentes.")
+    cmd.set_defaults(func=migrar)
+
+    cmd = subparsers.add_parser('medir-consultas', help="Mede tempo (e, opcionalmente, o plano) das consultas principais de database.py.")
+    cmd.add_argument('--repeticoes', type=int, default=5, help="Execuções de cada consulta; vale a mediana (padrão: 5).")
+    cmd.add_argument('--plano', action='store_true', help="Inclui o custo estimado e as varreduras de tabela do plano de execução.")
+    cmd.add_argument('--salvar', help="Grava os resultados num arquivo JSON (ex.: antes de migrar).")
+    cmd.add_argument('--comparar', help="Compara com um arquivo gravado por --salvar (ex.: depois de migrar).")
+    cmd.set_defaults(func=medir_consultas)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
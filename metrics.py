@@ -0,0 +1,129 @@
+# metrics.py
+# Métricas no formato texto do Prometheus, sem dependências externas.
+# Cada thread do servidor (waitress) escreve só no seu próprio "shard" de contadores, então
+# registrar uma métrica não disputa lock com as outras requisições. O lock é usado apenas
+# quando uma thread registra o seu shard pela primeira vez e quando /metrics lê os shards.
+import bisect
+import threading
+
+# Limites (em segundos) dos histogramas de latência
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shard:
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+class Registry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name, kind, help_text):
+        """Declara o tipo ('counter', 'gauge' ou 'histogram') e a descrição de uma métrica."""
+        self._help[name] = (kind, help_text)
+
+    def register_collector(self, collector):
+        """
+        collector() é chamado a cada leitura de /metrics e retorna [(nome, labels, valor)],
+        para valores que já são contados em outro lugar (pool de conexões, cache...).
+        """
+        self._collectors.append(collector)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock: self._shards.append(shard)
+        return shard
+
+    # --- Escrita (caminho quente: sem lock) ---
+    def inc(self, name, labels=(), value=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            # [contagem por faixa (a última é +Inf), soma, total]
+            entry = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    # --- Leitura ---
+    def _merged(self):
+        with self._lock: shards = list(self._shards)
+        counters, histograms = {}, {}
+        for shard in shards:
+            # list() de um dict é atômico no CPython, mesmo com a thread dona escrevendo nele
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, (bucket_counts, total, count) in list(shard.histograms.items()):
+                merged = histograms.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+                for i, c in enumerate(list(bucket_counts)): merged[0][i] += c
+                merged[1] += total
+                merged[2] += count
+        return counters, histograms
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)."""
+        counters, histograms = self._merged()
+        samples = {}
+        for (name, labels), value in sorted(counters.items()):
+            samples.setdefault(name, []).append((name, labels, value))
+        for (name, labels), (bucket_counts, total, count) in sorted(histograms.items()):
+            lines = samples.setdefault(name, [])
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += c
+                lines.append((f"{name}_bucket", labels + (('le', _format_bound(bound)),), cumulative))
+            lines.append((f"{name}_sum", labels, total))
+            lines.append((f"{name}_count", labels, count))
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                samples.setdefault(name, []).append((name, labels, value))
+
+        out = []
+        for name in sorted(samples):
+            if name in self._help:
+                kind, help_text = self._help[name]
+                out.append(f"# HELP {name} {help_text}")
+                out.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples[name]:
+                out.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(out) + '\n'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels: return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool): value = int(value)
+    if isinstance(value, float): return repr(value)
+    return str(value)
+
+
+# Registro único do processo
+registry = Registry()
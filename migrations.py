@@ -0,0 +1,286 @@
+# migrations.py
+# Migrações versionadas do esquema. Cada migração roda numa transação própria e é registrada
+# em SchemaMigrations; os comandos são idempotentes (IF NOT EXISTS), então aplicá-los sobre um
+# banco que já recebeu a alteração à mão não causa erro. Cada migração traz os comandos do
+# SQL Server e os do banco local SQLite (ver backends.py).
+from datetime import datetime
+
+
+def _index(name, table, definition):
+    """CREATE INDEX protegido por IF NOT EXISTS."""
+    return f"""
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}' AND object_id = OBJECT_ID('{table}'))
+            CREATE INDEX {name} ON {table} {definition}
+    """
+
+
+def _sqlite_index(name, table, definition):
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}"
+
+
+# Esquema base para o banco local SQLite (no SQL Server essas tabelas já existiam antes das migrações)
+_SQLITE_BASE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS Setores (ID INTEGER PRIMARY KEY, Nome TEXT NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS Usuarios (
+        ID INTEGER PRIMARY KEY, NomeUsuario TEXT NOT NULL UNIQUE, SenhaHash TEXT NOT NULL,
+        Papel TEXT NOT NULL, CoordenadorID INTEGER)""",
+    "CREATE TABLE IF NOT EXISTS Coordenadores_Setores (UsuarioID INTEGER NOT NULL, SetorID INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS Checklists (ID INTEGER PRIMARY KEY, Titulo TEXT NOT NULL, SetorID INTEGER)",
+    """CREATE TABLE IF NOT EXISTS ComponentesChecklist (
+        ID INTEGER PRIMARY KEY,
+        ChecklistID INTEGER NOT NULL REFERENCES Checklists (ID) ON DELETE CASCADE,
+        ParentID INTEGER REFERENCES ComponentesChecklist (ID) ON DELETE CASCADE,
+        TextoComponente TEXT, TipoComponente TEXT, Instrucao TEXT, Ordem INTEGER)""",
+    "CREATE TABLE IF NOT EXISTS TiposResposta (ID INTEGER PRIMARY KEY, Nome TEXT NOT NULL, TipoInput TEXT)",
+    """CREATE TABLE IF NOT EXISTS OpcoesResposta (
+        ID INTEGER PRIMARY KEY,
+        TipoRespostaID INTEGER NOT NULL REFERENCES TiposResposta (ID) ON DELETE CASCADE,
+        TextoOpcao TEXT NOT NULL, IsConforme INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS Componente_TiposResposta (
+        ComponenteID INTEGER NOT NULL REFERENCES ComponentesChecklist (ID) ON DELETE CASCADE,
+        TipoRespostaID INTEGER NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS Submissoes (
+        ID INTEGER PRIMARY KEY, ChecklistID INTEGER NOT NULL, UsuarioID INTEGER NOT NULL,
+        DataSubmissao TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+        NomeTrabalhadorAuditado TEXT, NomeResponsavelArea TEXT,
+        Status TEXT NOT NULL DEFAULT 'Ativa', SubstituidaPorID INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS Respostas (
+        ID INTEGER PRIMARY KEY,
+        SubmissaoID INTEGER NOT NULL REFERENCES Submissoes (ID) ON DELETE CASCADE,
+        ComponenteID INTEGER NOT NULL, TipoRespostaID INTEGER, Resposta TEXT, Observacao TEXT)""",
+    """CREATE TABLE IF NOT EXISTS FotosResposta (
+        ID INTEGER PRIMARY KEY,
+        RespostaID INTEGER NOT NULL REFERENCES Respostas (ID) ON DELETE CASCADE,
+        CaminhoFoto TEXT NOT NULL)""",
+]
+
+# (versão, descrição, {dialeto: comandos}); os dialetos são os de backends.py
+MIGRATIONS = [
+    (0, "Esquema base", {
+        'sqlserver': [],
+        'sqlite': _SQLITE_BASE_SCHEMA,
+    }),
+    (1, "Colunas de placar em Submissoes e índice por conformidade", {
+        'sqlserver': [
+            """
+            IF COL_LENGTH('Submissoes', 'PercentualConformidade') IS NULL
+                ALTER TABLE Submissoes ADD
+                    TotalAuditavel INT NULL, TotalConforme INT NULL, TotalNaoConforme INT NULL,
+                    TotalNaoAplicavel INT NULL, PercentualConformidade DECIMAL(5, 2) NULL
+            """,
+            _index('IX_Submissoes_Status_Percentual', 'Submissoes',
+                   "(Status, PercentualConformidade) INCLUDE (ChecklistID, UsuarioID, DataSubmissao)"),
+        ],
+        'sqlite': [
+            *(f"ALTER TABLE Submissoes ADD COLUMN {column} INTEGER"
+              for column in ['TotalAuditavel', 'TotalConforme', 'TotalNaoConforme', 'TotalNaoAplicavel']),
+            "ALTER TABLE Submissoes ADD COLUMN PercentualConformidade DECIMAL(5, 2)",
+            _sqlite_index('IX_Submissoes_Status_Percentual', 'Submissoes', "(Status, PercentualConformidade)"),
+        ],
+    }),
+    (2, "Tabela ResumoConformidadeDiario", {
+        'sqlserver': [
+            """
+            IF OBJECT_ID('ResumoConformidadeDiario', 'U') IS NULL
+                CREATE TABLE ResumoConformidadeDiario (
+                    Dia DATE NOT NULL,
+                    ChecklistID INT NOT NULL,
+                    UsuarioID INT NOT NULL,
+                    TotalSubmissoes INT NOT NULL,
+                    TotalAuditavel INT NOT NULL,
+                    TotalConforme INT NOT NULL,
+                    TotalNaoConforme INT NOT NULL,
+                    TotalNaoAplicavel INT NOT NULL,
+                    CONSTRAINT PK_ResumoConformidadeDiario PRIMARY KEY (Dia, ChecklistID, UsuarioID)
+                )
+            """,
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS ResumoConformidadeDiario (
+                Dia DATE NOT NULL, ChecklistID INTEGER NOT NULL, UsuarioID INTEGER NOT NULL,
+                TotalSubmissoes INTEGER NOT NULL, TotalAuditavel INTEGER NOT NULL, TotalConforme INTEGER NOT NULL,
+                TotalNaoConforme INTEGER NOT NULL, TotalNaoAplicavel INTEGER NOT NULL,
+                PRIMARY KEY (Dia, ChecklistID, UsuarioID))""",
+        ],
+    }),
+    (3, "Índices de cobertura para os caminhos de junção mais usados", {
+        'sqlserver': [
+            # Respostas de uma submissão (detalhes, relatórios, placar, replicação)
+            _index('IX_Respostas_SubmissaoID', 'Respostas', "(SubmissaoID) INCLUDE (ComponenteID, TipoRespostaID)"),
+            # Fotos de cada resposta (STRING_AGG dos relatórios, replicação)
+            _index('IX_FotosResposta_RespostaID', 'FotosResposta', "(RespostaID) INCLUDE (CaminhoFoto)"),
+            # Estrutura de um checklist, já na ordem de exibição
+            _index('IX_ComponentesChecklist_Checklist_Ordem', 'ComponentesChecklist',
+                   "(ChecklistID, Ordem) INCLUDE (ParentID, TipoComponente)"),
+            _index('IX_Componente_TiposResposta_ComponenteID', 'Componente_TiposResposta', "(ComponenteID) INCLUDE (TipoRespostaID)"),
+            # Histórico do colaborador, do mais recente para o mais antigo
+            _index('IX_Submissoes_Usuario_Data', 'Submissoes', "(UsuarioID, DataSubmissao DESC) INCLUDE (ChecklistID, Status)"),
+            # Versão anterior de uma submissão (desarquivar ao apagar); só as substituídas têm valor
+            _index('IX_Submissoes_SubstituidaPorID', 'Submissoes', "(SubstituidaPorID) WHERE SubstituidaPorID IS NOT NULL"),
+            _index('IX_Coordenadores_Setores_UsuarioID', 'Coordenadores_Setores', "(UsuarioID) INCLUDE (SetorID)"),
+            # Conformidade de uma resposta: TipoRespostaID + TextoOpcao. Se TextoOpcao for NVARCHAR(MAX)
+            # (COL_LENGTH = -1) ela não pode ser chave do índice e entra só como coluna incluída.
+            """
+            IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_OpcoesResposta_Tipo_Texto' AND object_id = OBJECT_ID('OpcoesResposta'))
+            BEGIN
+                IF COL_LENGTH('OpcoesResposta', 'TextoOpcao') BETWEEN 1 AND 1700
+                    EXEC('CREATE INDEX IX_OpcoesResposta_Tipo_Texto ON OpcoesResposta (TipoRespostaID, TextoOpcao) INCLUDE (IsConforme)')
+                ELSE
+                    EXEC('CREATE INDEX IX_OpcoesResposta_Tipo_Texto ON OpcoesResposta (TipoRespostaID) INCLUDE (TextoOpcao, IsConforme)')
+            END
+            """,
+        ],
+        # O SQLite não tem INCLUDE: as colunas incluídas entram no fim da chave
+        'sqlite': [
+            _sqlite_index('IX_Respostas_SubmissaoID', 'Respostas', "(SubmissaoID, ComponenteID, TipoRespostaID)"),
+            _sqlite_index('IX_FotosResposta_RespostaID', 'FotosResposta', "(RespostaID, CaminhoFoto)"),
+            _sqlite_index('IX_ComponentesChecklist_Checklist_Ordem', 'ComponentesChecklist', "(ChecklistID, Ordem)"),
+            _sqlite_index('IX_Componente_TiposResposta_ComponenteID', 'Componente_TiposResposta', "(ComponenteID, TipoRespostaID)"),
+            _sqlite_index('IX_Submissoes_Usuario_Data', 'Submissoes', "(UsuarioID, DataSubmissao DESC)"),
+            _sqlite_index('IX_Submissoes_SubstituidaPorID', 'Submissoes', "(SubstituidaPorID) WHERE SubstituidaPorID IS NOT NULL"),
+            _sqlite_index('IX_Coordenadores_Setores_UsuarioID', 'Coordenadores_Setores', "(UsuarioID, SetorID)"),
+            _sqlite_index('IX_OpcoesResposta_Tipo_Texto', 'OpcoesResposta', "(TipoRespostaID, TextoOpcao, IsConforme)"),
+        ],
+    }),
+    (4, "Tabela FilaFotos (processamento das fotos em segundo plano)", {
+        'sqlserver': [
+            """
+            IF OBJECT_ID('FilaFotos', 'U') IS NULL
+                CREATE TABLE FilaFotos (
+                    ID INT IDENTITY(1, 1) NOT NULL PRIMARY KEY,
+                    CaminhoFoto NVARCHAR(400) NOT NULL,      -- nome final, o mesmo de FotosResposta
+                    CaminhoRecebido NVARCHAR(400) NOT NULL,  -- arquivo como chegou, até ser processado
+                    Status NVARCHAR(20) NOT NULL DEFAULT 'Pendente',
+                    Tentativas INT NOT NULL DEFAULT 0,
+                    Hash CHAR(64) NULL,
+                    Erro NVARCHAR(1000) NULL,
+                    CriadoEm DATETIME NOT NULL DEFAULT GETDATE(),
+                    AtualizadoEm DATETIME NOT NULL DEFAULT GETDATE()
+                )
+            """,
+            _index('IX_FilaFotos_Status', 'FilaFotos', "(Status, AtualizadoEm)"),
+            _index('IX_FilaFotos_CaminhoFoto', 'FilaFotos', "(CaminhoFoto) INCLUDE (Status, CaminhoRecebido)"),
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS FilaFotos (
+                ID INTEGER PRIMARY KEY, CaminhoFoto TEXT NOT NULL, CaminhoRecebido TEXT NOT NULL,
+                Status TEXT NOT NULL DEFAULT 'Pendente', Tentativas INTEGER NOT NULL DEFAULT 0,
+                Hash TEXT, Erro TEXT,
+                CriadoEm TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+                AtualizadoEm TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')))""",
+            _sqlite_index('IX_FilaFotos_Status', 'FilaFotos', "(Status, AtualizadoEm)"),
+            _sqlite_index('IX_FilaFotos_CaminhoFoto', 'FilaFotos', "(CaminhoFoto, Status, CaminhoRecebido)"),
+        ],
+    }),
+    (5, "Tabela ArquivosFotos (referências de cada arquivo de foto) e gatilhos de FotosResposta", {
+        # Os gatilhos mantêm a contagem em qualquer caminho que grave ou apague fotos, inclusive
+        # as exclusões em cascata de Respostas e Submissoes
+        'sqlserver': [
+            """
+            IF OBJECT_ID('ArquivosFotos', 'U') IS NULL
+            BEGIN
+                CREATE TABLE ArquivosFotos (
+                    CaminhoFoto NVARCHAR(450) NOT NULL PRIMARY KEY,
+                    Referencias INT NOT NULL,
+                    AtualizadoEm DATETIME NOT NULL DEFAULT GETDATE()
+                );
+                INSERT INTO ArquivosFotos (CaminhoFoto, Referencias)
+                SELECT CaminhoFoto, COUNT(*) FROM FotosResposta GROUP BY CaminhoFoto;
+            END
+            """,
+            _index('IX_ArquivosFotos_SemReferencias', 'ArquivosFotos', "(AtualizadoEm) WHERE Referencias <= 0"),
+            """
+            IF OBJECT_ID('TR_FotosResposta_Referencias', 'TR') IS NULL
+                EXEC('
+                CREATE TRIGGER TR_FotosResposta_Referencias ON FotosResposta AFTER INSERT, UPDATE, DELETE AS
+                BEGIN
+                    SET NOCOUNT ON;
+                    MERGE ArquivosFotos AS a
+                    USING (
+                        SELECT CaminhoFoto, SUM(Delta) AS Delta
+                        FROM (SELECT CaminhoFoto, 1 AS Delta FROM inserted
+                              UNION ALL SELECT CaminhoFoto, -1 FROM deleted) AS mudancas
+                        GROUP BY CaminhoFoto
+                    ) AS d ON a.CaminhoFoto = d.CaminhoFoto
+                    WHEN MATCHED THEN UPDATE SET Referencias = a.Referencias + d.Delta, AtualizadoEm = GETDATE()
+                    WHEN NOT MATCHED THEN INSERT (CaminhoFoto, Referencias) VALUES (d.CaminhoFoto, d.Delta);
+                END')
+            """,
+        ],
+        'sqlite': [
+            """CREATE TABLE IF NOT EXISTS ArquivosFotos (
+                CaminhoFoto TEXT NOT NULL PRIMARY KEY, Referencias INTEGER NOT NULL,
+                AtualizadoEm TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')))""",
+            "INSERT OR IGNORE INTO ArquivosFotos (CaminhoFoto, Referencias) SELECT CaminhoFoto, COUNT(*) FROM FotosResposta GROUP BY CaminhoFoto",
+            _sqlite_index('IX_ArquivosFotos_SemReferencias', 'ArquivosFotos', "(AtualizadoEm) WHERE Referencias <= 0"),
+            """CREATE TRIGGER IF NOT EXISTS TR_FotosResposta_Referencias_Insert AFTER INSERT ON FotosResposta BEGIN
+                INSERT INTO ArquivosFotos (CaminhoFoto, Referencias) VALUES (NEW.CaminhoFoto, 1)
+                ON CONFLICT (CaminhoFoto) DO UPDATE SET Referencias = Referencias + 1, AtualizadoEm = datetime('now', 'localtime');
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS TR_FotosResposta_Referencias_Delete AFTER DELETE ON FotosResposta BEGIN
+                UPDATE ArquivosFotos SET Referencias = Referencias - 1, AtualizadoEm = datetime('now', 'localtime')
+                WHERE CaminhoFoto = OLD.CaminhoFoto;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS TR_FotosResposta_Referencias_Update AFTER UPDATE OF CaminhoFoto ON FotosResposta BEGIN
+                UPDATE ArquivosFotos SET Referencias = Referencias - 1, AtualizadoEm = datetime('now', 'localtime')
+                WHERE CaminhoFoto = OLD.CaminhoFoto;
+                INSERT INTO ArquivosFotos (CaminhoFoto, Referencias) VALUES (NEW.CaminhoFoto, 1)
+                ON CONFLICT (CaminhoFoto) DO UPDATE SET Referencias = Referencias + 1, AtualizadoEm = datetime('now', 'localtime');
+            END""",
+        ],
+    }),
+]
+
+_HISTORY_TABLE = {
+    'sqlserver': """
+        IF OBJECT_ID('SchemaMigrations', 'U') IS NULL
+            CREATE TABLE SchemaMigrations (
+                Versao INT NOT NULL PRIMARY KEY,
+                Descricao NVARCHAR(255) NOT NULL,
+                AplicadaEm DATETIME NOT NULL
+            )
+    """,
+    'sqlite': """
+        CREATE TABLE IF NOT EXISTS SchemaMigrations (
+            Versao INTEGER PRIMARY KEY, Descricao TEXT NOT NULL, AplicadaEm TIMESTAMP NOT NULL)
+    """,
+}
+
+
+def applied_versions(conn, dialect='sqlserver'):
+    """Retorna {versão: data em que foi aplicada}."""
+    cursor = conn.cursor()
+    cursor.execute(_HISTORY_TABLE[dialect])
+    conn.commit()
+    cursor.execute("SELECT Versao, AplicadaEm FROM SchemaMigrations")
+    return {row.Versao: row.AplicadaEm for row in cursor.fetchall()}
+
+
+def pending_migrations(conn, dialect='sqlserver'):
+    applied = applied_versions(conn, dialect)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def migrate(conn, target=None, log=print, dialect='sqlserver'):
+    """
+    Aplica, em ordem, as migrações pendentes até `target` (ou todas). Cada uma roda numa
+    transação própria; se falhar, é desfeita e as seguintes não são aplicadas.
+    Retorna a lista de versões aplicadas.
+    """
+    done = []
+    conn.autocommit = False
+    cursor = conn.cursor()
+    for version, description, statements in pending_migrations(conn, dialect):
+        if target is not None and version > target: break
+        log(f"  Aplicando {version:03d}: {description}...")
+        try:
+            for statement in statements[dialect]:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO SchemaMigrations (Versao, Descricao, AplicadaEm) VALUES (?, ?, ?)",
+                           version, description, datetime.now())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        done.append(version)
+    return done
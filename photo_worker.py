@@ -0,0 +1,114 @@
+# photo_worker.py
+# Processamento das fotos em segundo plano (config.PHOTO_WORKER_CONFIG). O upload só grava o
+# arquivo como chegou e registra um job em FilaFotos; um número fixo de threads reduz a foto,
+# gera as miniaturas e calcula o hash (images.process_received) fora da requisição, então o
+# tempo de envio não depende do tamanho das imagens.
+# A tabela é a fila durável; a fila em memória é só o atalho. Jobs que não couberam nela, que
+# falharam e ainda têm tentativas, ou que ficaram pela metade num processo que caiu, são pegos
+# pela varredura periódica da tabela. Cada job é reivindicado com um UPDATE condicional, então
+# vários processos podem dividir a mesma fila.
+# A varredura roda numa thread própria, mesmo sem as de processamento (sem o Pillow, ou com
+# workers = 0), porque também apaga os arquivos de fotos que ficaram sem referências (ArquivosFotos).
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import database as db
+import images
+
+
+class PhotoWorkerPool:
+    def __init__(self, folder, workers=2, queue_size=200, poll_interval=30, max_attempts=3, stale_after=600, keep_days=7,
+                 unreferenced_grace=3600):
+        self.folder = folder
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self.keep_days = keep_days
+        self.unreferenced_grace = unreferenced_grace
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._sweeper = None
+        self._stats = {'processed': 0, 'failed': 0, 'retried': 0, 'busy': 0, 'deleted_files': 0}
+
+    def start(self, process=True):
+        """Inicia a varredura e, com process=True, as threads que processam as fotos."""
+        with self._lock:
+            if self._sweeper: return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="fotos-varredura", daemon=True)
+            self._sweeper.start()
+            for number in range(self.workers if process else 0):
+                thread = threading.Thread(target=self._run, name=f"fotos-{number + 1}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, final_name, received):
+        """Registra o job na tabela e o entrega às threads. Retorna o ID do job, ou None se não foi possível registrá-lo."""
+        job_id = db.enqueue_photo_job(final_name, received)
+        if job_id: self._offer(job_id)
+        return job_id
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'queued': self._queue.qsize(), 'workers': len(self._threads)}
+
+    def _offer(self, job_id):
+        with self._lock:
+            if job_id in self._queued: return
+            try:
+                self._queue.put_nowait(job_id)
+            except queue.Full:
+                return  # continua 'Pendente' na tabela; a varredura o entrega depois
+            self._queued.add(job_id)
+
+    def _count(self, name, value=1):
+        with self._lock: self._stats[name] += value
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock: self._queued.discard(job_id)
+            try:
+                self._handle(job_id)
+            except Exception as e:
+                # Banco fora do ar, por exemplo: o job volta para a fila pela varredura (stale_after)
+                print(f"Erro no processamento da foto (job {job_id}): {e}")
+
+    def _handle(self, job_id):
+        job = db.claim_photo_job(job_id)
+        if not job: return  # outra thread (ou outro processo) já o pegou
+        self._count('busy')
+        try:
+            digest = images.process_received(self.folder, job.CaminhoRecebido, job.CaminhoFoto)
+        except Exception as e:
+            gave_up = job.Tentativas >= self.max_attempts
+            db.finish_photo_job(job_id, 'Falhou' if gave_up else 'Pendente', error=str(e)[:1000])
+            self._count('failed' if gave_up else 'retried')
+        else:
+            db.finish_photo_job(job_id, 'Concluida', digest=digest)
+            self._count('processed')
+        finally:
+            self._count('busy', -1)
+
+    def _sweep_loop(self):
+        while True:
+            self._sweep()
+            time.sleep(self.poll_interval)
+
+    def _sweep(self):
+        try:
+            now = datetime.now()
+            # Sem threads de processamento, os jobs pendentes ficam na tabela
+            free = self._queue.maxsize - self._queue.qsize() if self._threads else 0
+            for job_id in db.sweep_photo_jobs(free, now - timedelta(seconds=self.stale_after), now - timedelta(days=self.keep_days)):
+                self._offer(job_id)
+            # A carência protege um envio que reaproveitou a foto e ainda não gravou a submissão
+            unreferenced = db.take_unreferenced_photos(now - timedelta(seconds=self.unreferenced_grace),
+                                                       lambda filename: images.delete_photo(self.folder, filename))
+            self._count('deleted_files', len(unreferenced))
+        except Exception as e:
+            print(f"Erro na varredura da fila de fotos: {e}")
@@ -0,0 +1,226 @@
+# pool.py
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera configurado."""
+
+
+class _Entry:
+    __slots__ = ('raw', 'created_at', 'last_used', 'autocommit')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created_at = now
+        self.last_used = now
+        self.autocommit = getattr(raw, 'autocommit', False)
+
+
+class PooledConnection:
+    """
+    Envelopa uma conexão emprestada do pool. Tudo é repassado para a conexão real,
+    exceto close(), que devolve a conexão ao pool em vez de fechá-la.
+    """
+
+    def __init__(self, pool, entry):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_entry', entry)
+
+    def __getattr__(self, name):
+        entry = object.__getattribute__(self, '_entry')
+        if entry is None:
+            raise AttributeError("Conexão já devolvida ao pool.")
+        return getattr(entry.raw, name)
+
+    def __setattr__(self, name, value):
+        # Permite 'conn.autocommit = False' como numa conexão pyodbc comum
+        setattr(self._entry.raw, name, value)
+
+    def close(self):
+        entry = self._entry
+        if entry is None: return
+        object.__setattr__(self, '_entry', None)
+        self._pool._release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        # Rede de segurança para funções que esquecem de chamar close()
+        try: self.close()
+        except Exception: pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexões limitado e seguro para threads.
+
+    - max_size: número máximo de conexões abertas ao mesmo tempo.
+    - timeout: segundos que acquire() espera por uma conexão livre.
+    - max_idle: conexões ociosas há mais tempo que isso são fechadas.
+    - max_lifetime: conexões mais antigas que isso são recicladas ao serem devolvidas.
+    - health_check_interval: conexões paradas há mais tempo que isso são testadas
+      com um 'SELECT 1' antes de serem entregues.
+    - thread_affinity: cada thread tenta reaproveitar a última conexão que usou.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=10.0, max_idle=300, max_lifetime=3600,
+                 health_check_interval=30, thread_affinity=False, health_check_sql='SELECT 1'):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.thread_affinity = thread_affinity
+        self.health_check_sql = health_check_sql
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = deque()
+        self._local = threading.local()
+        self._open = 0
+        self._closed = False
+        self._stats = {'created': 0, 'reused': 0, 'closed': 0, 'failed': 0, 'waits': 0,
+                       'timeouts': 0, 'health_check_failures': 0, 'affinity_hits': 0}
+
+    # --- Empréstimo e devolução ---
+    def acquire(self):
+        while True:
+            entry = self._checkout()
+            if entry is None:
+                return PooledConnection(self, self._create())
+            if self._is_healthy(entry):
+                with self._lock: self._stats['reused'] += 1
+                return PooledConnection(self, entry)
+            self._discard(entry, failed_check=True)
+
+    def _checkout(self):
+        """Retorna uma entrada ociosa ou None quando há vaga para abrir uma nova conexão."""
+        deadline = time.monotonic() + self.timeout
+        expired = []
+        try:
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout("O pool de conexões foi encerrado.")
+                while True:
+                    expired.extend(self._evict_expired_locked())
+                    entry = self._pop_idle_locked()
+                    if entry is not None:
+                        return entry
+                    if self._open < self.max_size:
+                        self._open += 1
+                        return None
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"Nenhuma conexão livre após {self.timeout}s ({self.max_size} em uso).")
+                    self._stats['waits'] += 1
+                    self._available.wait(remaining)
+        finally:
+            for entry in expired: self._close_raw(entry)
+
+    def _pop_idle_locked(self):
+        if not self._idle: return None
+        if self.thread_affinity:
+            preferred = getattr(self._local, 'entry', None)
+            if preferred is not None and preferred in self._idle:
+                self._idle.remove(preferred)
+                self._stats['affinity_hits'] += 1
+                return preferred
+        # LIFO: a conexão usada mais recentemente é a que tem menos chance de ter caído
+        return self._idle.pop()
+
+    def _create(self):
+        try:
+            entry = _Entry(self._connect())
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._stats['failed'] += 1
+                self._available.notify()
+            raise
+        with self._lock: self._stats['created'] += 1
+        return entry
+
+    def _is_healthy(self, entry):
+        if time.monotonic() - entry.last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute(self.health_check_sql)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _release(self, entry):
+        try:
+            # Descarta qualquer transação deixada aberta e restaura o modo original
+            if not entry.raw.autocommit: entry.raw.rollback()
+            if entry.raw.autocommit != entry.autocommit: entry.raw.autocommit = entry.autocommit
+        except Exception:
+            self._discard(entry)
+            return
+        now = time.monotonic()
+        entry.last_used = now
+        with self._lock:
+            if not self._closed and now - entry.created_at < self.max_lifetime:
+                self._idle.append(entry)
+                if self.thread_affinity: self._local.entry = entry
+                self._available.notify()
+                return
+        self._discard(entry)
+
+    def _discard(self, entry, failed_check=False):
+        with self._lock:
+            self._open -= 1
+            if failed_check: self._stats['health_check_failures'] += 1
+            self._available.notify()
+        self._close_raw(entry)
+
+    # --- Manutenção ---
+    def _evict_expired_locked(self):
+        """Remove (sem fechar) as entradas ociosas vencidas; o chamador as fecha fora do lock."""
+        now = time.monotonic()
+        expired = []
+        # A ponta esquerda da fila guarda as conexões devolvidas há mais tempo
+        while self._idle and now - self._idle[0].last_used > self.max_idle:
+            expired.append(self._idle.popleft())
+        self._open -= len(expired)
+        return expired
+
+    def _close_raw(self, entry):
+        try: entry.raw.close()
+        except Exception: pass
+        with self._lock: self._stats['closed'] += 1
+
+    def evict_idle(self):
+        """Fecha as conexões ociosas além de max_idle. Retorna quantas foram fechadas."""
+        with self._lock:
+            expired = self._evict_expired_locked()
+        for entry in expired: self._close_raw(entry)
+        return len(expired)
+
+    def close_all(self):
+        """Fecha as conexões ociosas e impede novos empréstimos."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._available.notify_all()
+        for entry in idle: self._close_raw(entry)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({'max_size': self.max_size, 'open': self._open,
+                          'idle': len(self._idle), 'in_use': self._open - len(self._idle)})
+        return stats